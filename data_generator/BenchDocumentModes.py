@@ -0,0 +1,99 @@
+import pandas as pd
+from datetime import datetime, timedelta, UTC
+from argparse import ArgumentParser, Namespace
+from bson import encode
+from pymongo import MongoClient
+from pymongo.database import Database
+from pymongo.errors import CollectionInvalid
+from DataGen import row_to_dict
+
+# Fields the proxy keeps in lean documents, leaving the location to the sensor catalog
+LEAN_DOCUMENT_FIELDS: list[str] = ['sensor_name', 'time_recorded', 'metric']
+
+
+def build_documents(rows: list[pd.Series], hours: int) -> dict[str, list[dict]]:
+    # One full document per measurement per row, repeated for each hour like the generator sends them
+    documents: dict[str, list[dict]] = {}
+    start_time: datetime = datetime.now(UTC).replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours)
+    for hour in range(hours):
+        time_recorded: datetime = start_time + timedelta(hours=hour)
+        for row in rows:
+            for metric, metric_dict in row_to_dict(row, '').items():
+                documents.setdefault(metric, []).append({**metric_dict, 'time_recorded': time_recorded})
+
+    return documents
+
+
+def make_lean(documents: dict[str, list[dict]]) -> dict[str, list[dict]]:
+    return {
+        metric: [{field: document[field] for field in LEAN_DOCUMENT_FIELDS} for document in metric_documents]
+        for metric, metric_documents in documents.items()
+    }
+
+
+def count_insert_bytes(documents: dict[str, list[dict]]) -> int:
+    # BSON is what the proxy sends MongoDB for every insert
+    return sum(len(encode(document)) for metric_documents in documents.values() for document in metric_documents)
+
+
+def measure_storage(weather: Database, prefix: str, documents: dict[str, list[dict]]) -> dict[str, float]:
+    # Load the documents into throwaway time-series collections shaped like the proxy's
+    storage_size: int = 0
+    bucket_count: int = 0
+    bucket_bytes: int = 0
+    for metric, metric_documents in documents.items():
+        collection_name: str = f'{prefix}_{metric}'
+        weather.drop_collection(collection_name)
+        try:
+            weather.create_collection(
+                name=collection_name,
+                timeseries={'timeField': 'time_recorded', 'metaField': 'sensor_name', 'granularity': 'hours'}
+            )
+        except CollectionInvalid:
+            pass
+        weather[collection_name].insert_many([dict(document) for document in metric_documents], ordered=False)
+
+        collection_stats: dict = weather.command('collStats', collection_name)
+        storage_size += collection_stats['storageSize']
+        bucket_count += collection_stats['timeseries']['bucketCount']
+        bucket_bytes += collection_stats['timeseries']['bucketCount'] * collection_stats['timeseries']['avgBucketSize']
+        weather.drop_collection(collection_name)
+
+    return {
+        'storage_size': storage_size,
+        'bucket_count': bucket_count,
+        'avg_bucket_size': bucket_bytes / bucket_count if bucket_count > 0 else 0.0
+    }
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description='Compare full and lean measurement documents.')
+    parser.add_argument('--csv', default='zipcode_data_sorted.csv', help='Sensor data to build documents from.')
+    parser.add_argument('--sensors', type=int, default=100, help='Sensors to take from the data.')
+    parser.add_argument('--hours', type=int, default=24, help='Hourly readings per sensor.')
+    parser.add_argument('--mongo-uri', default='', help='MongoDB to measure storage in, left out to only count bytes.')
+    args: Namespace = parser.parse_args()
+
+    # Take the first reading of each sensor
+    sample_df: pd.DataFrame = pd.read_csv(args.csv).drop_duplicates('sensor_name').head(args.sensors)
+    full_documents: dict[str, list[dict]] = build_documents([row for _, row in sample_df.iterrows()], args.hours)
+    lean_documents: dict[str, list[dict]] = make_lean(full_documents)
+    document_count: int = sum(map(len, full_documents.values()))
+
+    print(f'{document_count} documents across {len(full_documents)} collections')
+    print(f'{"Mode":<6}{"Insert bytes":>14}{"Bytes/document":>16}')
+    for mode, documents in [('full', full_documents), ('lean', lean_documents)]:
+        insert_bytes: int = count_insert_bytes(documents)
+        print(f'{mode:<6}{insert_bytes:>14}{insert_bytes / document_count:>16.1f}')
+
+    # Storage and bucket sizes need a running MongoDB
+    if args.mongo_uri != '':
+        bench_client: MongoClient = MongoClient(args.mongo_uri)
+        print(f'{"Mode":<6}{"Storage bytes":>15}{"Buckets":>10}{"Avg bucket bytes":>18}')
+        for mode, documents in [('full', full_documents), ('lean', lean_documents)]:
+            storage: dict[str, float] = measure_storage(bench_client['weather'], f'bench_{mode}', documents)
+            print(
+                f'{mode:<6}{storage["storage_size"]:>15}{storage["bucket_count"]:>10}'
+                f'{storage["avg_bucket_size"]:>18.1f}'
+            )
+        bench_client.close()
@@ -0,0 +1,99 @@
+import pandas as pd
+from time import perf_counter
+from datetime import datetime, UTC
+from urllib.parse import urlencode, parse_qs
+from json import dumps as json_dumps, loads as json_loads
+from argparse import ArgumentParser, Namespace
+from msgpack import unpackb
+from DataGen import row_to_dict, rows_to_batch, SENSOR_COLUMNS
+
+
+def encode_form_readings(rows: list[pd.Series], time_recorded: str) -> list[bytes]:
+    # One form body per reading, as send_data posts them
+    form_bodies: list[bytes] = []
+    for row in rows:
+        for metric, metric_dict in row_to_dict(row, time_recorded).items():
+            form_bodies.append(urlencode({
+                'username': 'data_gen', 'password': '0' * 64, 'host': 'mongo-db', 'port': '27017',
+                'collection': metric, 'document': json_dumps(metric_dict)
+            }).encode())
+
+    return form_bodies
+
+
+def parse_form_readings(form_bodies: list[bytes]) -> int:
+    # Same steps as the proxy's /data_gen route
+    parsed_count: int = 0
+    for form_body in form_bodies:
+        form: dict[str, list[str]] = parse_qs(form_body.decode())
+        document: dict = json_loads(form['document'][0])
+        document['time_recorded'] = datetime.strptime(document['time_recorded'], '%Y-%m-%d %H:%M:%S')
+        document['time_recorded'] = document['time_recorded'].replace(tzinfo=UTC)
+        parsed_count += 1
+
+    return parsed_count
+
+
+def parse_batch_readings(batch_body: bytes) -> int:
+    # Same steps as the proxy's decode_reading_batch, which cannot be imported without the proxy's secrets and
+    # MongoDB settings, including grouping the documents by measurement
+    batch: dict = unpackb(batch_body)
+    sensors: list[dict] = [dict(zip(SENSOR_COLUMNS, sensor_row, strict=True)) for sensor_row in batch['sensors']]
+    measurements: list[str] = batch['measurements']
+    batch_documents: dict[str, list[dict]] = {measurement: [] for measurement in measurements}
+    for sensor_index, epoch_seconds, values in batch['readings']:
+        time_recorded: datetime = datetime.fromtimestamp(epoch_seconds, UTC)
+        sensor: dict = sensors[sensor_index]
+        for measurement, value in zip(measurements, values, strict=True):
+            if value is None:
+                continue
+            batch_documents[measurement].append({**sensor, 'time_recorded': time_recorded, 'metric': value})
+
+    return sum(len(documents) for documents in batch_documents.values())
+
+
+def time_parse(parse_function, payload, repeats: int) -> float:
+    # Keep the fastest run to leave out scheduler noise
+    best_seconds: float = float('inf')
+    for _ in range(repeats):
+        start_time: float = perf_counter()
+        parse_function(payload)
+        best_seconds = min(best_seconds, perf_counter() - start_time)
+
+    return best_seconds
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description='Compare the form and MessagePack ingest formats.')
+    parser.add_argument('--csv', default='zipcode_data_sorted.csv', help='Sensor data to encode.')
+    parser.add_argument('--rows', type=int, default=1000, help='Rows to encode, each holding every measurement.')
+    parser.add_argument('--batch-rows', type=int, default=100, help='Rows per MessagePack batch.')
+    parser.add_argument('--repeats', type=int, default=5, help='Parse runs to take the fastest of.')
+    args: Namespace = parser.parse_args()
+
+    sample_rows: list[pd.Series] = [row for _, row in pd.read_csv(args.csv).head(args.rows).iterrows()]
+    sample_time: datetime = datetime.now().replace(microsecond=0)
+
+    # Encode the sample both ways
+    form_bodies: list[bytes] = encode_form_readings(sample_rows, sample_time.strftime('%Y-%m-%d %H:%M:%S'))
+    epoch_seconds: int = int(sample_time.replace(tzinfo=UTC).timestamp())
+    batch_bodies: list[bytes] = [
+        rows_to_batch([(row, epoch_seconds) for row in sample_rows[start:start + args.batch_rows]])
+        for start in range(0, len(sample_rows), args.batch_rows)
+    ]
+
+    # Count readings from the parsers so both formats are compared on the readings they actually carry
+    form_readings: int = parse_form_readings(form_bodies)
+    batch_readings: int = sum(parse_batch_readings(batch_body) for batch_body in batch_bodies)
+    form_seconds: float = time_parse(parse_form_readings, form_bodies, args.repeats)
+    batch_seconds: float = sum(time_parse(parse_batch_readings, batch_body, args.repeats) for batch_body in batch_bodies)
+
+    print(f'{"Format":<10}{"Requests":>10}{"Readings":>10}{"Bytes/reading":>15}{"Parse us/reading":>18}')
+    print(
+        f'{"form":<10}{len(form_bodies):>10}{form_readings:>10}'
+        f'{sum(map(len, form_bodies)) / form_readings:>15.1f}{form_seconds / form_readings * 1e6:>18.2f}'
+    )
+    print(
+        f'{"msgpack":<10}{len(batch_bodies):>10}{batch_readings:>10}'
+        f'{sum(map(len, batch_bodies)) / batch_readings:>15.1f}{batch_seconds / batch_readings * 1e6:>18.2f}'
+    )
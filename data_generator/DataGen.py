@@ -2,11 +2,13 @@ import pandas as pd
 import numpy as np
 from time import sleep
 from os import getenv
-from requests import post, Response
+from requests import post, Response, Session
 from hashlib import sha256
 from typing import Union
-from datetime import datetime
+from datetime import datetime, UTC
 from json import dumps as json_dumps
+from msgpack import packb, unpackb
+from socket import socket, create_connection, MSG_WAITALL
 
 # Get core database environmental variables
 DB_HOST: str = getenv('DB_HOST')
@@ -16,19 +18,35 @@ DB_PASSWORD_FILE: str = getenv('DB_PASSWORD_FILE')
 PROXY_HOST: str = getenv('PROXY_HOST')
 PROXY_PORT: str = getenv('PROXY_PORT')
 
+# Get ingest environmental variables
+INGEST_FORMAT: str = getenv('INGEST_FORMAT', 'form')  # form, msgpack batches over HTTP, or stream over TCP
+INGEST_BATCH_ROWS: int = int(getenv('INGEST_BATCH_ROWS', '100'))
+STREAM_INGEST_PORT: str = getenv('STREAM_INGEST_PORT', '8078')
+STREAM_WINDOW_FRAMES: int = int(getenv('STREAM_WINDOW_FRAMES', '8'))  # Frames sent before waiting for an ack
+STORAGE_UNITS: str = getenv('STORAGE_UNITS', 'both')  # metric leaves out the units the proxy derives on read
+
+# Columns that describe the sensor rather than a measurement, in the order the proxy expects its sensor table
+ID_COLUMNS: list[str] = [
+    'sensor_name', 'time_recorded', 'latitude', 'longitude',
+    'city', 'county', 'state', 'zip_code'
+]
+SENSOR_COLUMNS: list[str] = ['sensor_name', 'latitude', 'longitude', 'city', 'county', 'state', 'zip_code']
+
+# Customary units the proxy can convert from their metric counterparts
+CUSTOMARY_COLUMNS: list[str] = ['precip_in', 'pressure_in', 'temp_f', 'wind_mph']
 
-def row_to_dict(row: pd.Series, time_recorded: str) -> dict:
-    # Define which columns to split out
-    id_cols: list[str] = [
-        'sensor_name', 'time_recorded', 'latitude', 'longitude',
-        'city', 'county', 'state', 'zip_code'
-    ]
 
-    # Everything else becomes metrics
-    metric_cols: list[str] = [col for col in row.index if col not in id_cols]
+def get_metric_columns(row: pd.Series) -> list[str]:
+    # Everything that does not describe the sensor becomes metrics, less the units the proxy derives
+    skipped_columns: list[str] = ID_COLUMNS + CUSTOMARY_COLUMNS if STORAGE_UNITS == 'metric' else ID_COLUMNS
+    return [col for col in row.index if col not in skipped_columns]
+
+
+def row_to_dict(row: pd.Series, time_recorded: str) -> dict:
+    metric_cols: list[str] = get_metric_columns(row)
 
     # Make base metadata dict
-    base_info: dict = row[id_cols].to_dict()
+    base_info: dict = row[ID_COLUMNS].to_dict()
 
     # Build the super-dictionary
     super_dict: dict = {}
@@ -70,10 +88,120 @@ def send_data(collection_name: str, document: dict):
     print(f'Response text: {response.content.decode()}')
 
 
+def to_python_value(value) -> Union[str, int, float, None]:
+    # Turn numpy types into python types and missing values into None
+    if isinstance(value, Union[np.float64, np.int64]):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+
+    return value
+
+
+def rows_to_batch(rows: list[tuple[pd.Series, int]]) -> bytes:
+    # Send each sensor's description once, then one row of values per reading
+    metric_cols: list[str] = get_metric_columns(rows[0][0])
+    sensor_indexes: dict[str, int] = {}
+    sensors: list[list] = []
+    readings: list[list] = []
+    for row, epoch_seconds in rows:
+        if row['sensor_name'] not in sensor_indexes:
+            sensor_indexes[row['sensor_name']] = len(sensors)
+            sensors.append([to_python_value(row[col]) for col in SENSOR_COLUMNS])
+
+        readings.append([
+            sensor_indexes[row['sensor_name']], epoch_seconds, [to_python_value(row[col]) for col in metric_cols]
+        ])
+
+    return packb({'sensors': sensors, 'measurements': metric_cols, 'readings': readings})
+
+
+def create_batch_session() -> Session:
+    # Authenticate once per connection instead of once per reading
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+    batch_session: Session = Session()
+    batch_session.auth = (DB_USER, hashed_data_gen_password)
+    batch_session.headers['Content-Type'] = 'application/msgpack'
+    return batch_session
+
+
+def send_batch(batch_session: Session, rows: list[tuple[pd.Series, int]]):
+    response: Response = batch_session.post(
+        f'http://{PROXY_HOST}:{PROXY_PORT}/data_gen/batch', data=rows_to_batch(rows), timeout=10
+    )
+    print(f'Response code: {response.status_code}')
+    print(f'Response text: {response.content.decode()}')
+
+
+def write_stream_frame(stream_socket: socket, frame_body: bytes):
+    # Prefix every frame with its length
+    stream_socket.sendall(len(frame_body).to_bytes(4, 'big') + frame_body)
+
+
+def read_stream_frame(stream_socket: socket) -> dict:
+    frame_header: bytes = stream_socket.recv(4, MSG_WAITALL)
+    if len(frame_header) < 4:
+        raise ConnectionError('Stream closed by the proxy.')
+    frame_body: bytes = stream_socket.recv(int.from_bytes(frame_header, 'big'), MSG_WAITALL)
+    return unpackb(frame_body)
+
+
+def open_stream() -> dict:
+    # Authenticate once for the life of the connection
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+    stream_socket: socket = create_connection((PROXY_HOST, int(STREAM_INGEST_PORT)), timeout=30)
+    write_stream_frame(stream_socket, packb({'username': DB_USER, 'password': hashed_data_gen_password}))
+
+    reply: dict = read_stream_frame(stream_socket)
+    if reply['status'] != 'Authenticated':
+        raise ConnectionError(f'Stream authentication failed: {reply["message"]}')
+
+    return {'socket': stream_socket, 'sent_frames': 0, 'acked_frames': 0}
+
+
+def wait_for_stream_acks(stream: dict, max_unacked_frames: int):
+    # Acks are cumulative, so the latest one covers every frame before it
+    while stream['sent_frames'] - stream['acked_frames'] > max_unacked_frames:
+        reply: dict = read_stream_frame(stream['socket'])
+        if reply['status'] != 'Ack':
+            raise ConnectionError(f'Stream stopped after {reply["frames"]} frames: {reply["message"]}')
+        stream['acked_frames'] = reply['frames']
+
+
+def send_stream_batch(stream: dict, rows: list[tuple[pd.Series, int]]):
+    write_stream_frame(stream['socket'], rows_to_batch(rows))
+    stream['sent_frames'] += 1
+
+    # Stop sending once the window is full until the proxy catches up
+    wait_for_stream_acks(stream, STREAM_WINDOW_FRAMES - 1)
+    print(f'Stream frames sent: {stream["sent_frames"]}, acknowledged: {stream["acked_frames"]}')
+
+
+def close_stream(stream: dict):
+    wait_for_stream_acks(stream, 0)
+    stream['socket'].close()
+
+
+def send_rows(batch_sender: Union[Session, dict], rows: list[tuple[pd.Series, int]]):
+    print(f'Sending a batch of {len(rows)} readings...')
+    if isinstance(batch_sender, Session):
+        send_batch(batch_sender, rows)
+    else:
+        send_stream_batch(batch_sender, rows)
+
+
 def read_in_data():
     data_df: pd.DataFrame = pd.read_csv('zipcode_data_sorted.csv')
     unique_sensors: np.ndarray = data_df["sensor_name"].unique()
 
+    # Rows waiting to be sent together in the batch or stream format
+    batch_sender: Union[Session, dict, None] = None
+    if INGEST_FORMAT == 'msgpack':
+        batch_sender = create_batch_session()
+    elif INGEST_FORMAT == 'stream':
+        batch_sender = open_stream()
+    batch_rows: list[tuple[pd.Series, int]] = []
+
     while True:
         for sensor_name in unique_sensors:
             # Create a timestamp for the round of sensor data
@@ -91,6 +219,15 @@ def read_in_data():
             popped_row: pd.Series = data_df.iloc[first_id]
             data_df = data_df.drop(first_id, axis=0).reset_index(drop=True)
 
+            # Hold the row for the next batch, sending once enough rows are waiting
+            if batch_sender is not None:
+                # The proxy reads form timestamps as UTC, so stamp batch rows the same way
+                batch_rows.append((popped_row, int(datetime.now().replace(tzinfo=UTC).timestamp())))
+                if len(batch_rows) >= INGEST_BATCH_ROWS:
+                    send_rows(batch_sender, batch_rows)
+                    batch_rows = []
+                continue
+
             # Turn it into a super-dictionary
             popped_row_set: dict[str, dict] = row_to_dict(popped_row, time_recorded)
 
@@ -102,10 +239,19 @@ def read_in_data():
             # Small delay
             sleep(0.01)
 
+        # Send what is left of the batch at the end of each round
+        if batch_sender is not None and len(batch_rows) > 0:
+            send_rows(batch_sender, batch_rows)
+            batch_rows = []
+
         # Break if there is no more data
         if len(data_df) <= 0:
             break
 
+    # Wait for the proxy to acknowledge the last frames
+    if isinstance(batch_sender, dict):
+        close_stream(batch_sender)
+
     print('All data has been sent.')
 
 
@@ -0,0 +1,129 @@
+from flask import Flask
+from pymongo.database import Database
+from importlib import import_module
+from types import ModuleType
+from argparse import ArgumentParser, Namespace
+from datetime import datetime, timedelta, UTC
+from os.path import getsize, exists
+from random import Random
+from statistics import median
+from time import perf_counter
+from typing import Callable
+from ProxyComponents import get_data_gen_client
+from ProxyComponents.Constants import SQLITE_PATH, DATA_GEN, HASHED_DATA_GEN_PASSWORD, PARTITION_HOSTS
+from ProxyComponents.Storage import STORAGE_BACKEND_MODULES
+
+# Measurement the bench writes and reads, in the unit it is stored in
+BENCH_MEASUREMENT: str = 'temp_c'
+
+
+def build_sensors(sensor_count: int) -> list[dict]:
+    # Bench sensors get zip codes no real sensor uses so they are easy to spot and remove
+    return [
+        {
+            'sensor_name': f'{99000 + index}_bench_{index}', 'latitude': 38.0 + index / 1000,
+            'longitude': -77.0 - index / 1000, 'city': f'Bench City {index % 20}',
+            'county': f'Bench County {index % 5}', 'state': 'VA', 'zip_code': str(99000 + index)
+        }
+        for index in range(sensor_count)
+    ]
+
+
+def build_readings(sensors: list[dict], hours: int) -> list[dict]:
+    # One reading per sensor per minute, shaped like the full documents the proxy stores
+    random_source: Random = Random(0)
+    start_time: datetime = datetime.now(UTC).replace(second=0, microsecond=0) - timedelta(hours=hours)
+    return [
+        {**sensor, 'time_recorded': start_time + timedelta(minutes=minute), 'metric': random_source.uniform(-10, 35)}
+        for minute in range(hours * 60) for sensor in sensors
+    ]
+
+
+def time_call(call: Callable[[], object], repeats: int) -> float:
+    # Median milliseconds over the repeats, which keeps one slow run from skewing the result
+    durations: list[float] = []
+    for _ in range(repeats):
+        call_start: float = perf_counter()
+        call()
+        durations.append((perf_counter() - call_start) * 1000)
+
+    return median(durations)
+
+
+def measure_collection(weather: Database) -> int:
+    collection_stats: dict = weather.command('collStats', BENCH_MEASUREMENT)
+    return collection_stats['storageSize'] + collection_stats['totalIndexSize']
+
+
+def measure_footprint(backend: str, storage: ModuleType) -> int:
+    if backend == 'sqlite':
+        return sum(getsize(path) for path in [SQLITE_PATH, f'{SQLITE_PATH}-wal'] if exists(path))
+    if backend == 'partitioned':
+        return sum(
+            measure_collection(storage.get_partition_client(partition, DATA_GEN, HASHED_DATA_GEN_PASSWORD)['weather'])
+            for partition in range(len(PARTITION_HOSTS))
+        )
+
+    return measure_collection(get_data_gen_client()['weather'])
+
+
+def run_bench(backend: str, sensors: list[dict], readings: list[dict], batch_size: int, repeats: int) -> dict:
+    storage: ModuleType = import_module(f'ProxyComponents.{STORAGE_BACKEND_MODULES[backend]}')
+    storage.create_storage()
+    for sensor in sensors:
+        storage.add_catalog_sensor(sensor)
+
+    # Insert in batches the size the ingest flushers write
+    insert_start: float = perf_counter()
+    for batch_start in range(0, len(readings), batch_size):
+        batch: list[dict] = [dict(reading) for reading in readings[batch_start:batch_start + batch_size]]
+        storage.insert_readings(BENCH_MEASUREMENT, batch)
+    insert_seconds: float = perf_counter() - insert_start
+
+    # Query the way the real-time and historical tabs do
+    sensor_names: list[str] = [sensor['sensor_name'] for sensor in sensors]
+    day_end: datetime = readings[-1]['time_recorded']
+    day_start: datetime = day_end - timedelta(days=1)
+    return {
+        'insert_per_second': len(readings) / insert_seconds,
+        'latest_all_ms': time_call(lambda: storage.get_latest_readings(BENCH_MEASUREMENT, sensor_names), repeats),
+        'latest_ten_ms': time_call(lambda: storage.get_latest_readings(BENCH_MEASUREMENT, sensor_names[:10]), repeats),
+        'day_one_ms': time_call(
+            lambda: storage.get_raw_readings(BENCH_MEASUREMENT, sensor_names[:1], day_start, day_end, ['city']),
+            repeats
+        ),
+        'day_all_ms': time_call(
+            lambda: storage.get_raw_readings(BENCH_MEASUREMENT, sensor_names, day_start, day_end, ['city']),
+            repeats
+        ),
+        'footprint_bytes': measure_footprint(backend, storage)
+    }
+
+
+if __name__ == '__main__':
+    # Run with the proxy's environment against scratch databases, since it writes bench sensors and readings
+    parser: ArgumentParser = ArgumentParser(description='Compare insert and query latency of the storage backends.')
+    parser.add_argument('--backends', nargs='+', default=['sqlite'], choices=list(STORAGE_BACKEND_MODULES))
+    parser.add_argument('--sensors', type=int, default=100, help='Sensors to write readings for.')
+    parser.add_argument('--hours', type=int, default=24, help='Hours of one minute readings per sensor.')
+    parser.add_argument('--batch-size', type=int, default=500, help='Readings written per insert.')
+    parser.add_argument('--repeats', type=int, default=5, help='Runs of each query to take the median of.')
+    args: Namespace = parser.parse_args()
+
+    bench_sensors: list[dict] = build_sensors(args.sensors)
+    bench_readings: list[dict] = build_readings(bench_sensors, args.hours)
+    print(f'{len(bench_readings)} {BENCH_MEASUREMENT} readings from {len(bench_sensors)} sensors')
+    print(
+        f'{"Backend":<12}{"Inserts/s":>11}{"Latest all ms":>15}{"Latest 10 ms":>14}{"Day 1 ms":>10}'
+        f'{"Day all ms":>12}{"Bytes":>12}'
+    )
+
+    # Reads go through the profiler, which keeps its state in the app context
+    with Flask(__name__).app_context():
+        for bench_backend in args.backends:
+            results: dict = run_bench(bench_backend, bench_sensors, bench_readings, args.batch_size, args.repeats)
+            print(
+                f'{bench_backend:<12}{results["insert_per_second"]:>11.0f}{results["latest_all_ms"]:>15.1f}'
+                f'{results["latest_ten_ms"]:>14.1f}{results["day_one_ms"]:>10.1f}{results["day_all_ms"]:>12.1f}'
+                f'{results["footprint_bytes"]:>12}'
+            )
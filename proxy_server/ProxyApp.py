@@ -1,29 +1,44 @@
 from pymongo import MongoClient
 from pymongo.database import Database, Collection
-from pymongo.errors import OperationFailure, CollectionInvalid, ConnectionFailure
-from pymongo.results import InsertOneResult
-from os import getenv
-from hashlib import sha256
-from flask import Flask, jsonify, request, Response
+from pymongo.errors import OperationFailure, ConnectionFailure, ExecutionTimeout
+from flask import Flask, jsonify, request, Response, g
+from werkzeug.datastructures import Authorization
+from msgpack import UnpackException
+from sqlite3 import Error as SQLiteError
 from waitress import serve
-from time import time
-from datetime import datetime, UTC
+from time import time, perf_counter
+from datetime import datetime, date, UTC
 from json import loads as json_loads
 from typing import Union
-
-# Get core database environmental variables
-DB_HOST: str = getenv('DB_HOST')
-DB_PORT: str = getenv('DB_PORT')
-DB_OWNER: str = getenv('DB_OWNER')
-DB_OWNER_PASSWORD_FILE: str = getenv('DB_OWNER_PASS_FILE')
-
-# Get the other usernames
-DATA_GEN: str = getenv('DATA_GEN')
-WEB_VIEW: str = getenv('WEB_VIEW')
-
-# Hash the passwords and save them to local file
-HASHED_DATA_GEN_PASSWORD: str = sha256(open(getenv('DATA_GEN_PASSWORD_FILE')).read().encode()).hexdigest().strip()
-HASHED_WEB_VIEW_PASSWORD: str = sha256(open(getenv('WEB_VIEW_PASSWORD_FILE')).read().encode()).hexdigest().strip()
+from argparse import ArgumentParser, Namespace
+from socket import socket
+from signal import signal, SIGTERM
+from atexit import register as register_exit
+from ProxyComponents import (
+    DB_HOST, DB_PORT, DB_OWNER, DB_OWNER_PASSWORD_FILE, DATA_GEN, WEB_VIEW, HASHED_DATA_GEN_PASSWORD,
+    HASHED_WEB_VIEW_PASSWORD, CUSTOMARY_MEASUREMENTS, METRIC_MEASUREMENTS, ALL_MEASUREMENTS, NON_NUMERIC_MEASUREMENTS,
+    ANOMALY_RESULT_LIMIT, migrate_sensor_catalog, warm_sensor_catalog, register_sensor, get_catalog_etag,
+    get_catalog_delta, get_sensor_catalog, get_data_gen_client, get_web_view_client, create_rollup_collections,
+    choose_rollup_tier, get_rollup_collection_name, build_rollup_pipeline, start_rollup_compaction, rebuild_rollups,
+    get_catalog_summary, increment_counter, observe_histogram, render_metrics, register_mongo_metrics, load_alert_rules,
+    create_alert_collection, warm_open_alerts, get_alerts, warm_detector_state, start_detector_snapshots,
+    get_detector_baselines, INGEST_MODE, INGEST_FLUSH_MS, IngestQueueFull, IngestTimeout, validate_document,
+    insert_document, start_ingest_flushers, insert_documents, MSGPACK_CONTENT_TYPE, decode_reading_batch,
+    validate_batch, process_new_readings, start_stream_ingest, PROXY_PORT, PROXY_WORKERS, start_catalog_refresh,
+    start_metric_snapshots, create_listen_socket, run_workers, PROFILE_HEADER, start_profile, mark_stage, run_aggregate,
+    finish_profile, RESTORED_COLLECTION_PREFIX, apply_retention, start_archiver, restore_archive, get_archive_boundary,
+    read_archived_measurements, is_derived_measurement, get_stored_measurement, invert_value, build_conversion_stages,
+    drop_derived_documents, migrate_storage_units, DOCUMENT_MODE, get_location_projection, join_sensor_locations,
+    sum_by_sensor_location, get_sensors_in_area, get_query_key, run_coalesced, WAITRESS_THREADS,
+    ADMISSION_RETRY_AFTER_SECONDS, estimate_query_cost, classify_query, admit_request, release_request, STORAGE_BACKEND,
+    get_storage, warm_hot_store, get_hot_readings, warm_window_aggregates, get_window_aggregates, SPATIAL_LEVEL_FIELDS,
+    SPATIAL_ROLLUP_LEVEL, SPATIAL_BUCKET_SECONDS, average_by_sensor_location, build_spatial_rollup_pipeline,
+    convert_value, get_sketch_percentiles, MONGO_CATALOG_BACKENDS, create_app_users, get_mongo_address,
+    get_client_options, drain_ingest_queues, exit_on_signal, check_new_reading, check_forwarded_reading,
+    start_leader_inbox, WINDOW_AGGREGATES_ENABLED
+)
+
+# Save the hashed passwords to local file
 with open('./hashed_passwords.txt', 'w') as hp_file:
     hp_file.writelines(
         [f'data_gen_password={HASHED_DATA_GEN_PASSWORD}\n', f'web_view_password={HASHED_WEB_VIEW_PASSWORD}\n']
@@ -33,62 +48,42 @@ with open('./hashed_passwords.txt', 'w') as hp_file:
 app = Flask(__name__)
 APP_START_TIME: float = time()
 
-# Dictionary to maintain sensors
-app_sensor_tracker: dict[int, list] = {}
-app_sensor_mod: int = 20  # Calculated by sqrt(n), where n is the number of entries expected in the equation x + n/x
-
-# List of sensor measurements
-CUSTOMARY_MEASUREMENTS: list[str] = [
-    'humidity_perc', 'precip_in', 'pressure_in', 'temp_f', 'uv_index_score', 'wind_degree', 'wind_dir', 'wind_mph'
-]
-METRIC_MEASUREMENTS: list[str] = [
-    'humidity_perc', 'precip_mm', 'pressure_mb', 'temp_c', 'uv_index_score', 'wind_degree', 'wind_dir', 'wind_kph'
-]
+# Time every MongoDB command sent by the clients created from here on
+register_mongo_metrics()
 
 
 def create_database() -> None:
     # Create owner connection
     db_owner_password: str = open(DB_OWNER_PASSWORD_FILE).read()
-    owner_conn_string: str = f'mongodb://{DB_OWNER}:{db_owner_password}@{DB_HOST}:{DB_PORT}/'
-    owner_client: MongoClient = MongoClient(owner_conn_string, connectTimeoutMS=3000)
+    owner_conn_string: str = f'mongodb://{DB_OWNER}:{db_owner_password}@{get_mongo_address()}/'
+    owner_client: MongoClient = MongoClient(owner_conn_string, connectTimeoutMS=3000, **get_client_options(DB_OWNER))
 
     # Create database object and try pinging it
     weather: Database = owner_client['weather']
 
-    # Create data gen user
-    try:
-        weather.command(
-            {'createUser': DATA_GEN, 'pwd': HASHED_DATA_GEN_PASSWORD, 'roles': [{'role': 'readWrite', 'db': 'weather'}]}
-        )
-    except OperationFailure:
-        print('Data Generation user already exists.')
+    # Create the data gen and web view users
+    create_app_users(weather)
 
-    # Create web view user
-    try:
-        weather.command(
-            {'createUser': WEB_VIEW, 'pwd': HASHED_WEB_VIEW_PASSWORD, 'roles': [{'role': 'read', 'db': 'weather'}]}
-        )
-    except OperationFailure:
-        print('Web View user already exists.')
-
-    # Create time-series collections
-    measurements = [
-        'humidity_perc', 'precip_in', 'precip_mm', 'pressure_in', 'pressure_mb', 'temp_c',
-        'temp_f', 'uv_index_score', 'wind_degree', 'wind_dir', 'wind_kph', 'wind_mph'
-    ]
-    for measurement in measurements:
-        try:
-            weather.create_collection(
-                name=measurement,
-                timeseries={
-                    'timeField': 'time_recorded',
-                    'metaField': 'sensor_name',
-                    'granularity': 'hours'
-                }
-            )
-            print(f'Time-series collection {measurement} created.')
-        except CollectionInvalid:
-            print(f'Time-series collection {measurement} already exists.')
+    # Create time-series collections, leaving out the units derived on read
+    get_storage().create_storage()
+
+    # Expire old readings from each collection the main server keeps them in
+    if STORAGE_BACKEND == 'mongo':
+        apply_retention(weather)
+
+    # Create rollup collections for historical queries
+    create_rollup_collections(weather)
+
+    # Create the alert collection and pick up alerts that are still open
+    create_alert_collection(weather)
+    warm_open_alerts(weather)
+
+    # Pick up the outlier detector baselines saved before the last stop
+    warm_detector_state(weather)
+
+    # Version the sensor catalog and load it into memory
+    migrate_sensor_catalog(weather)
+    warm_sensor_catalog()
 
     print('Database created!')
 
@@ -135,23 +130,69 @@ def status() -> tuple[Response, int]:
     return jsonify(status_info), 200
 
 
-def insert_into_sensor_tracker(sensor_name: str) -> bool:
-    # Get the zipcode for sorting
-    sensor_info: list[str] = sensor_name.split('_')
-    sensor_zipcode: int = int(sensor_info[0])
+@app.route('/metrics', methods=['GET'])
+def metrics() -> tuple[Response, int]:
+    catalog_summary: dict[str, int] = get_catalog_summary()
+    metrics_text: str = render_metrics({
+        'proxy_sensor_registry_size': catalog_summary['sensor_count'],
+        'proxy_sensor_catalog_version': catalog_summary['catalog_version']
+    })
+    return Response(metrics_text, mimetype='text/plain; version=0.0.4'), 200
+
+
+@app.before_request
+def start_request_metrics() -> None:
+    g.request_start_time = perf_counter()
+    increment_counter('proxy_requests_in_flight')
+
+
+def start_request_profile() -> None:
+    # Profile the request once its client is authenticated if it asked for it, timing from when the request arrived
+    if PROFILE_HEADER in request.headers:
+        start_profile(request.headers[PROFILE_HEADER], g.request_start_time)
+
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    # Label web app requests by purpose, reusing the JSON body Flask already parsed
+    route: str = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    purpose: str = ''
+    if route == '/web_app':
+        json_content: Union[dict, None] = request.get_json(force=True, silent=True)
+        if isinstance(json_content, dict):
+            purpose = str(json_content.get('purpose', ''))
+        if not purpose.isdigit():
+            purpose = 'invalid'
+
+    request_duration: float = perf_counter() - g.request_start_time
+    increment_counter(
+        'proxy_requests_total', (('route', route), ('purpose', purpose), ('status', str(response.status_code)))
+    )
+    observe_histogram('proxy_request_duration_seconds', (('route', route), ('purpose', purpose)), request_duration)
+    return response
 
-    # Sort the zipcode into
-    sensor_already_existed: bool = False
-    mod_location: int = sensor_zipcode % app_sensor_mod
-    if mod_location in app_sensor_tracker:
-        if sensor_name in app_sensor_tracker[mod_location]:
-            sensor_already_existed = True
-        else:
-            app_sensor_tracker[mod_location].append(sensor_name)
-    else:
-        app_sensor_tracker[mod_location] = [sensor_name]
 
-    return sensor_already_existed
+@app.after_request
+def finish_request_profile(response: Response) -> Response:
+    route: str = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    return finish_profile(response, route)
+
+
+@app.before_request
+def admit_ingest_request() -> Union[tuple[Response, int], None]:
+    # Ingest has a pool of its own, so heavy queries never hold the threads it needs
+    if request.path not in ['/data_gen', '/data_gen/batch'] or admit_request('ingest'):
+        return None
+
+    response: Response = jsonify({'status': 'Unavailable', 'message': 'Ingest is at its concurrency limit.'})
+    response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER_SECONDS)
+    return response, 503
+
+
+@app.teardown_request
+def finish_request_metrics(error: Union[BaseException, None]) -> None:
+    release_request()
+    increment_counter('proxy_requests_in_flight', amount=-1.0)
 
 
 @app.route('/data_gen', methods=['POST'])
@@ -184,86 +225,167 @@ def data_gen() -> tuple[Response, int]:
     if host != DB_HOST or port != DB_PORT:
         return jsonify({'status': 'Unauthorized', 'message': 'Invalid request: Invalid host or port.'}), 401
 
-    # Access database on behalf of data generator
+    start_request_profile()
+    mark_stage('auth')
+
+    # Verify the document before it can reach the database or the ingest queue
     try:
-        data_gen_conn_string: str = f'mongodb://{DATA_GEN}:{HASHED_DATA_GEN_PASSWORD}@{DB_HOST}:{DB_PORT}/weather'
-        data_gen_client: MongoClient = MongoClient(data_gen_conn_string, connectTimeoutMS=3000)
-    except (ConnectionFailure, OperationFailure):
-        msg: str = f'Authentication with MongoDB rejected.'
-        return jsonify({'status': 'Unauthorized', 'message': msg}), 403
+        validate_document(collection, document)
+    except KeyError as e:
+        return jsonify({'status': 'Error', 'message': f'Invalid request: Invalid document. {e}'}), 400
 
-    # Insert the document into the connection
+    # Customary readings are derived from the metric ones on read, so there is nothing to store
+    if is_derived_measurement(collection):
+        stored_measurement: str = get_stored_measurement(collection)
+        msg: str = f'Collection {collection} is derived from {stored_measurement}, so it was not stored.'
+        return jsonify({'status': 'Success', 'message': msg}), 200
+
+    mark_stage('validate')
+
+    # Insert the document now or hand it to the ingest queue, depending on the ingest mode
     try:
-        cur_collection: Collection = data_gen_client['weather'][collection]
-        insert_result: InsertOneResult = cur_collection.insert_one(document)
-    except OperationFailure:
+        document_id: Union[str, None] = insert_document(collection, document)
+    except IngestQueueFull as e:
+        response: Response = jsonify({'status': 'Unavailable', 'message': f'Ingest queue is full. {e}'})
+        response.headers['Retry-After'] = str(max(1, INGEST_FLUSH_MS // 1000))
+        return response, 503
+    except IngestTimeout as e:
+        return jsonify({'status': 'Error', 'message': f'Ingest flush timed out. {e}'}), 504
+    except ConnectionFailure as e:
+        response: Response = jsonify({'status': 'Unavailable', 'message': f'MongoDB could not be reached. {e}'})
+        response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER_SECONDS)
+        return response, 503
+    except (OperationFailure, SQLiteError):
         msg: str = f'Post request to do MongoDB insert operation with collection {collection} failed.'
         return jsonify({'status': 'Error', 'message': msg}), 400
 
+    mark_stage('insert')
+
     # Add a new sensor to a collection of sensors if it does not exist
-    exist_status: bool = insert_into_sensor_tracker(document['sensor_name'])
-    if not exist_status:
-        try:
-            sensor_collection: Collection = data_gen_client['weather']['sensors']
-            sensor_result = sensor_collection.find_one({'sensor_name': document['sensor_name']})
-            if sensor_result is None:
-                sensor_collection.insert_one({
-                    'sensor_name': document['sensor_name'],
-                    'latitude': document['latitude'],
-                    'longitude': document['longitude'],
-                    'city': document['city'],
-                    'county': document['county'],
-                    'state': document['state'],
-                    'zip_code': document['zip_code']
-                })
-            attempted_sensor_insert: bool = True
-        except OperationFailure:
-            msg: str = f'Post request to do MongoDB insert operation with collection sensors failed.'
-            return jsonify({'status': 'Error', 'message': msg}), 400
-    else:
-        sensor_result = None
-        attempted_sensor_insert: bool = False
+    try:
+        sensor_msg: str = register_sensor(document)
+    except (OperationFailure, SQLiteError):
+        msg: str = f'Post request to do MongoDB insert operation with collection sensors failed.'
+        return jsonify({'status': 'Error', 'message': msg}), 400
 
-    if not exist_status and sensor_result is None and attempted_sensor_insert:
-        sensor_msg: str = f'Sensor {document["sensor_name"]} has been added to local cache and database.'
-    elif not exist_status and sensor_result is not None and attempted_sensor_insert:
-        sensor_msg: str = f'Sensor {document["sensor_name"]} has been added to local cache but not database.'
-    else:
-        sensor_msg: str = f'Sensor {document["sensor_name"]} already exists in local cache.'
+    mark_stage('register')
+
+    # Check the reading against the alert rules and its baseline without failing the insert that already happened
+    try:
+        if STORAGE_BACKEND in MONGO_CATALOG_BACKENDS:
+            check_new_reading(collection, document)
+    except OperationFailure as e:
+        print(f'Alert rule evaluation for {document["sensor_name"]} failed. Reason: {e}')
+
+    mark_stage('rules')
+
+    # Return success, which only means the document was queued in async mode
+    if INGEST_MODE == 'async':
+        msg: str = (
+            f'Post request to do MongoDB insert operation accepted.\n'
+            f'Acknowledgement: Queued.\n'
+            f'Sensor Status: {sensor_msg}'
+        )
+        return jsonify({'status': 'Accepted', 'message': msg}), 202
 
-    # Return success
     msg: str = (
         f'Post request to do MongoDB insert operation succeeded.\n'
-        f'Acknowledgement: {insert_result.acknowledged}.\n'
-        f'Document ID: {insert_result.inserted_id}.\n'
+        f'Acknowledgement: {INGEST_MODE.capitalize()}.\n'
+        f'Document ID: {document_id if document_id is not None else "Batched"}.\n'
         f'Sensor Status: {sensor_msg}'
     )
     return jsonify({'status': 'Success', 'message': msg}), 201
 
 
-def get_latest_measurements(client: MongoClient, measurements: list[str], all_or_selected: str,
+@app.route('/data_gen/batch', methods=['POST'])
+def data_gen_batch() -> tuple[Response, int]:
+    # Verify the credentials a data generator sends once per connection in the authorization header
+    authorization: Union[Authorization, None] = request.authorization
+    if authorization is None or authorization.username != DATA_GEN or \
+            authorization.password != HASHED_DATA_GEN_PASSWORD:
+        msg: str = 'Invalid request: Invalid username or password for data generation API call.'
+        return jsonify({'status': 'Unauthorized', 'message': msg}), 401
+
+    start_request_profile()
+    mark_stage('auth')
+
+    if request.mimetype != MSGPACK_CONTENT_TYPE:
+        msg: str = f'Invalid request: Batches must be sent as {MSGPACK_CONTENT_TYPE}.'
+        return jsonify({'status': 'Error', 'message': msg}), 415
+
+    # Decode the batch into documents for each collection
+    try:
+        batch_documents: dict[str, list[dict]] = decode_reading_batch(request.get_data())
+    except (KeyError, IndexError, TypeError, ValueError, UnpackException) as e:
+        return jsonify({'status': 'Error', 'message': f'Invalid request: Invalid MessagePack batch. {e}'}), 400
+
+    mark_stage('decode')
+
+    # Verify every document before any of them can reach the database or the ingest queue
+    try:
+        validate_batch(batch_documents)
+    except KeyError as e:
+        return jsonify({'status': 'Error', 'message': f'Invalid request: Invalid document. {e}'}), 400
+
+    batch_documents = drop_derived_documents(batch_documents)
+    mark_stage('validate')
+
+    # Insert each collection's documents together
+    inserted_count: int = 0
+    for collection, documents in batch_documents.items():
+        if len(documents) == 0:
+            continue
+
+        try:
+            insert_documents(collection, documents)
+            inserted_count += len(documents)
+        except IngestQueueFull as e:
+            msg: str = f'Ingest queue is full after accepting {inserted_count} documents. {e}'
+            response: Response = jsonify({'status': 'Unavailable', 'message': msg})
+            response.headers['Retry-After'] = str(max(1, INGEST_FLUSH_MS // 1000))
+            return response, 503
+        except IngestTimeout as e:
+            msg: str = f'Ingest flush timed out after accepting {inserted_count} documents. {e}'
+            return jsonify({'status': 'Error', 'message': msg}), 504
+        except ConnectionFailure as e:
+            msg: str = f'MongoDB could not be reached after accepting {inserted_count} documents. {e}'
+            response: Response = jsonify({'status': 'Unavailable', 'message': msg})
+            response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER_SECONDS)
+            return response, 503
+        except (OperationFailure, SQLiteError):
+            msg: str = f'Batch insert operation with collection {collection} failed after {inserted_count} documents.'
+            return jsonify({'status': 'Error', 'message': msg}), 400
+
+    mark_stage('insert')
+
+    process_new_readings(batch_documents)
+    mark_stage('process')
+
+    # Return success, which only means the documents were queued in async mode
+    if INGEST_MODE == 'async':
+        return jsonify({'status': 'Accepted', 'message': f'Queued {inserted_count} documents.'}), 202
+
+    return jsonify({'status': 'Success', 'message': f'Inserted {inserted_count} documents.'}), 201
+
+
+def get_selected_sensors(all_or_selected: str, selected_sensors: list[str]) -> Union[list[str], None]:
+    # The storage backends take None for every sensor
+    if all_or_selected in ['All', 'Empty'] or 'Empty' in selected_sensors:
+        return None
+
+    return selected_sensors
+
+
+def get_latest_measurements(measurements: list[str], all_or_selected: str,
                             selected_sensors: list[str]) -> dict[str, list]:
     # Start measurement super dictionary
     latest_measurements: dict[str, list] = {}
 
     # Get a list of the latest measurement for each sensor for each measurement
     for measurement in measurements:
-        # Create the measurement pipeline based on filter settings
-        if all_or_selected in ['All', 'Empty'] or 'Empty' in selected_sensors:
-            measurement_pipeline: list = [
-                {'$sort': {'time_recorded': -1}},
-                {'$group': {'_id': '$sensor_name', 'latest_value': {'$first': '$metric'}}}
-            ]
-        else:
-            measurement_pipeline: list = [
-                {'$match': {'sensor_name': {'$in': selected_sensors}}},
-                {'$sort': {'time_recorded': -1}},
-                {'$group': {'_id': '$sensor_name', 'latest_value': {'$first': '$metric'}}}
-            ]
-
-        # Use aggregate pipeline to get the latest recorded value for each sensor
-        cur_collection: Collection = client['weather'][measurement]
-        latest_record: list[dict] = cur_collection.aggregate(measurement_pipeline, allowDiskUse=True).to_list()
+        latest_record: list[dict] = get_storage().get_latest_readings(
+            measurement, get_selected_sensors(all_or_selected, selected_sensors)
+        )
 
         # Save the list of results to super dictionary
         latest_measurements[measurement] = latest_record
@@ -271,39 +393,325 @@ def get_latest_measurements(client: MongoClient, measurements: list[str], all_or
     return latest_measurements
 
 
+def get_spatial_measurement(client: MongoClient, measurement: str, all_or_selected: str, selected_sensors: list[str],
+                            start_date_time: datetime, end_date_time: datetime, resolution_seconds: int,
+                            rollup_tier: Union[str, None], spatial_level: str) -> list[dict]:
+    stored_measurement: str = get_stored_measurement(measurement)
+    if rollup_tier is not None:
+        # Every sensor's location rollups already hold the whole answer, so the sensors' own are never read
+        if get_selected_sensors(all_or_selected, selected_sensors) is None and \
+                set(SPATIAL_LEVEL_FIELDS[spatial_level]) <= set(SPATIAL_LEVEL_FIELDS[SPATIAL_ROLLUP_LEVEL]):
+            measurement_pipeline: list = build_spatial_rollup_pipeline(
+                spatial_level, rollup_tier, start_date_time, end_date_time
+            )
+            measurement_pipeline += build_conversion_stages(measurement, ['metric', 'min', 'max'])
+            cur_collection: Collection = client['weather'][
+                get_rollup_collection_name(stored_measurement, rollup_tier, SPATIAL_ROLLUP_LEVEL)
+            ]
+            return run_aggregate(cur_collection, measurement_pipeline)
+
+        # Otherwise the selected sensors' rollups are added up per location
+        measurement_pipeline: list = build_rollup_pipeline(
+            measurement, all_or_selected, selected_sensors, rollup_tier, start_date_time, end_date_time,
+            {'sensor_name': 1}
+        )
+        measurement_pipeline += build_conversion_stages(measurement, ['metric', 'min', 'max'])
+        cur_collection: Collection = client['weather'][get_rollup_collection_name(stored_measurement, rollup_tier)]
+        return average_by_sensor_location(run_aggregate(cur_collection, measurement_pipeline), spatial_level, 0)
+
+    # Raw readings are summarized per sensor and time bucket by the storage backend, older ones read from Parquet
+    bucket_seconds: int = resolution_seconds if resolution_seconds > 0 else SPATIAL_BUCKET_SECONDS
+    sensor_records: list[dict] = []
+    hot_start_date_time: datetime = start_date_time
+    archive_boundary: Union[datetime, None] = get_archive_boundary(client, stored_measurement) \
+        if STORAGE_BACKEND == 'mongo' else None
+    if archive_boundary is not None and start_date_time < archive_boundary:
+        sensor_records = read_archived_measurements(
+            measurement, all_or_selected, selected_sensors, start_date_time, end_date_time, archive_boundary,
+            ['sensor_name']
+        )
+        hot_start_date_time = archive_boundary
+
+    if archive_boundary is None or end_date_time >= archive_boundary:
+        sensor_records += get_storage().get_bucketed_readings(
+            measurement, get_selected_sensors(all_or_selected, selected_sensors), hot_start_date_time, end_date_time,
+            bucket_seconds
+        )
+
+    return average_by_sensor_location(sensor_records, spatial_level, bucket_seconds)
+
+
+def get_percentile_measurement(client: MongoClient, measurement: str, all_or_selected: str,
+                               selected_sensors: list[str], start_date_time: datetime, end_date_time: datetime,
+                               resolution_seconds: int, rollup_tier: str, spatial_level: str,
+                               percentiles: list[float]) -> list[dict]:
+    # Every sensor's location sketches cover county and state views, otherwise the sensors' own are merged
+    stored_measurement: str = get_stored_measurement(measurement)
+    if get_selected_sensors(all_or_selected, selected_sensors) is None and \
+            set(SPATIAL_LEVEL_FIELDS[spatial_level]) <= set(SPATIAL_LEVEL_FIELDS[SPATIAL_ROLLUP_LEVEL]):
+        measurement_pipeline: list = build_spatial_rollup_pipeline(
+            SPATIAL_ROLLUP_LEVEL, rollup_tier, start_date_time, end_date_time, True
+        )
+        cur_collection: Collection = client['weather'][
+            get_rollup_collection_name(stored_measurement, rollup_tier, SPATIAL_ROLLUP_LEVEL)
+        ]
+    else:
+        measurement_pipeline: list = build_rollup_pipeline(
+            measurement, all_or_selected, selected_sensors, rollup_tier, start_date_time, end_date_time,
+            {'sensor_name': 1}, True
+        )
+        cur_collection: Collection = client['weather'][get_rollup_collection_name(stored_measurement, rollup_tier)]
+    measurement_pipeline += build_conversion_stages(measurement, ['metric', 'min', 'max'])
+
+    # Merge the sketches that fall in the same location and requested bucket, then read the percentiles off them
+    location_records: list[dict] = average_by_sensor_location(
+        run_aggregate(cur_collection, measurement_pipeline), spatial_level, resolution_seconds
+    )
+    for location_record in location_records:
+        percentile_values: list[Union[float, None]] = get_sketch_percentiles(
+            location_record.pop('sketch', {}), percentiles
+        )
+        location_record['percentiles'] = {
+            f'p{percentile:g}': convert_value(measurement, percentile_value)
+            for percentile, percentile_value in zip(percentiles, percentile_values)
+        }
+
+    return location_records
+
+
 def get_historical_measurements(client: MongoClient, measurements: list[str], all_or_selected: str,
                                 selected_sensors: list[str], start_date_time: datetime,
-                                end_date_time: datetime) -> dict[str, list]:
+                                end_date_time: datetime, resolution_seconds: int = 0,
+                                spatial_level: str = 'sensor',
+                                percentiles: Union[list[float], None] = None) -> dict[str, list]:
+    if spatial_level not in SPATIAL_LEVEL_FIELDS:
+        raise KeyError(f'Spatial level {spatial_level} is not one of {list(SPATIAL_LEVEL_FIELDS)}.')
+
     # Start measurement super dictionary
     historical_measurements: dict[str, list] = {}
 
+    # Use the coarsest rollup tier that still meets the requested resolution, which only MongoDB keeps
+    rollup_tier: Union[str, None] = choose_rollup_tier(resolution_seconds) if STORAGE_BACKEND == 'mongo' else None
+
+    # Percentiles come from the sketches kept with each rollup, so raw ranges are charted without them
+    if percentiles and any(percentile < 0 or percentile > 100 for percentile in percentiles):
+        raise ValueError(f'Percentiles {percentiles} must be between 0 and 100.')
+
     # Get a list of the latest measurement for each sensor for each measurement
     for measurement in measurements:
-        # Create the measurement pipeline based on filter settings
-        if all_or_selected in ['All', 'Empty'] or 'Empty' in selected_sensors:
-            measurement_pipeline: list = [
-                {'$match': {'time_recorded': {'$gte': start_date_time, '$lte': end_date_time}}},
-                {'$sort': {'time_recorded': -1}},
-                {'$project': {'_id': 0, 'city': 1, 'county': 1, 'time_recorded': 1, 'metric': 1}}
-            ]
+        # Numeric readings get percentile bands for each location and bucket when asked for
+        if percentiles and rollup_tier is not None and measurement not in NON_NUMERIC_MEASUREMENTS:
+            historical_measurements[measurement] = get_percentile_measurement(
+                client, measurement, all_or_selected, selected_sensors, start_date_time, end_date_time,
+                resolution_seconds, rollup_tier, spatial_level, percentiles
+            )
+            continue
+
+        # Numeric readings can be averaged per location and time bucket instead of sent per sensor
+        if spatial_level != 'sensor' and measurement not in NON_NUMERIC_MEASUREMENTS:
+            historical_measurements[measurement] = get_spatial_measurement(
+                client, measurement, all_or_selected, selected_sensors, start_date_time, end_date_time,
+                resolution_seconds, rollup_tier, spatial_level
+            )
+            continue
+
+        # Short raw ranges inside the hot store's window are read from memory
+        if rollup_tier is None:
+            hot_records: Union[list[dict], None] = get_hot_readings(
+                measurement, get_selected_sensors(all_or_selected, selected_sensors), start_date_time, end_date_time
+            )
+            if hot_records is not None:
+                historical_measurements[measurement] = hot_records
+                continue
+
+        # Raw readings older than the archive boundary are read from Parquet instead of MongoDB
+        archived_records: list[dict] = []
+        hot_start_date_time: datetime = start_date_time
+        stored_measurement: str = get_stored_measurement(measurement)
+        archive_boundary: Union[datetime, None] = get_archive_boundary(client, stored_measurement) \
+            if rollup_tier is None and STORAGE_BACKEND == 'mongo' else None
+        if archive_boundary is not None and start_date_time < archive_boundary:
+            archived_records = read_archived_measurements(
+                measurement, all_or_selected, selected_sensors, start_date_time, end_date_time, archive_boundary
+            )
+            hot_start_date_time = archive_boundary
+
+            # Skip MongoDB entirely when the whole range is archived
+            if end_date_time < archive_boundary:
+                historical_measurements[measurement] = archived_records
+                continue
+
+        # Read the rollup tier through its pipeline and raw readings through the storage backend
+        if rollup_tier is not None:
+            measurement_pipeline: list = build_rollup_pipeline(
+                measurement, all_or_selected, selected_sensors, rollup_tier, start_date_time, end_date_time
+            )
+            measurement_pipeline += build_conversion_stages(measurement, ['metric', 'min', 'max'])
+            cur_collection: Collection = client['weather'][get_rollup_collection_name(stored_measurement, rollup_tier)]
+            historical_records: list[dict] = run_aggregate(cur_collection, measurement_pipeline)
         else:
-            measurement_pipeline: list = [
-                {'$match': {
-                    'sensor_name': {'$in': selected_sensors},
-                    'time_recorded': {'$gte': start_date_time, '$lte': end_date_time}
-                }},
-                {'$sort': {'time_recorded': -1}},
-                {'$project': {'_id': 0, 'city': 1, 'county': 1, 'time_recorded': 1, 'metric': 1}}
+            historical_records: list[dict] = get_storage().get_raw_readings(
+                measurement, get_selected_sensors(all_or_selected, selected_sensors), hot_start_date_time,
+                end_date_time, list(get_location_projection())
+            )
+
+        # Both parts are newest first and the archived part is entirely older, so appending keeps time order
+        historical_measurements[measurement] = join_sensor_locations(historical_records + archived_records)
+
+    return historical_measurements
+
+
+def get_anomalous_measurements(client: MongoClient, thresholds: dict[str, dict], all_or_selected: str,
+                               selected_sensors: list[str], start_date_time: datetime,
+                               end_date_time: datetime) -> dict[str, dict]:
+    # Start anomaly super dictionaries
+    anomalous_readings: dict[str, list] = {}
+    anomaly_counts: dict[str, dict] = {}
+
+    # Only look for readings that fall outside each measurement's thresholds
+    for measurement, threshold in thresholds.items():
+        if measurement not in ALL_MEASUREMENTS or measurement in NON_NUMERIC_MEASUREMENTS:
+            raise KeyError(f'Measurement {measurement} does not support anomaly thresholds.')
+
+        # Create the match stage based on filter settings and thresholds, in the unit the readings are stored in
+        match_filter: dict = {
+            'time_recorded': {'$gte': start_date_time, '$lte': end_date_time},
+            '$or': [
+                {'metric': {'$lt': invert_value(measurement, threshold['min'])}},
+                {'metric': {'$gt': invert_value(measurement, threshold['max'])}}
             ]
+        }
+        if not (all_or_selected in ['All', 'Empty'] or 'Empty' in selected_sensors):
+            match_filter['sensor_name'] = {'$in': selected_sensors}
+
+        # Get the latest violating readings
+        cur_collection: Collection = client['weather'][get_stored_measurement(measurement)]
+        readings_pipeline: list = [
+            {'$match': match_filter},
+            {'$sort': {'time_recorded': -1}},
+            {'$limit': ANOMALY_RESULT_LIMIT},
+            {'$project': {'_id': 0, **get_location_projection(), 'time_recorded': 1, 'metric': 1}},
+            *build_conversion_stages(measurement, ['metric'])
+        ]
+        anomalous_readings[measurement] = join_sensor_locations(run_aggregate(cur_collection, readings_pipeline))
+
+        # Count every violating reading per city, going through each sensor for lean readings
+        counts_pipeline: list = [
+            {'$match': match_filter},
+            {'$group': {'_id': '$sensor_name' if DOCUMENT_MODE == 'lean' else '$city', 'count': {'$sum': 1}}}
+        ]
+        city_counts: list[dict] = run_aggregate(cur_collection, counts_pipeline)
+        if DOCUMENT_MODE == 'lean':
+            city_counts = sum_by_sensor_location(city_counts, 'city')
+        anomaly_counts[measurement] = {
+            'total': sum(city_count['count'] for city_count in city_counts),
+            'by_city': {city_count['_id']: city_count['count'] for city_count in city_counts}
+        }
+
+    return {'readings': anomalous_readings, 'counts': anomaly_counts}
+
+
+def run_web_app_query(purpose: int, filters: Union[dict, None], time_range: Union[dict, None],
+                      thresholds: Union[dict, None], alerts_since: Union[datetime, None],
+                      area: Union[dict, None]) -> tuple[bytes, int]:
+    # Alerts and sensor areas are only kept in MongoDB, and anomalies are only found in readings on the main server
+    if (STORAGE_BACKEND not in MONGO_CATALOG_BACKENDS and purpose in [4, 6]) or \
+            (STORAGE_BACKEND != 'mongo' and purpose == 3):
+        msg: str = f'Purpose {purpose} is not supported by the {STORAGE_BACKEND} storage backend the proxy is using.'
+        return jsonify({'status': 'Error', 'message': msg}).get_data(), 400
+
+    # Windows are only kept by a single worker, which the web app takes as a sign to stop asking for them
+    if purpose == 7 and not WINDOW_AGGREGATES_ENABLED:
+        msg: str = 'Sliding-window aggregates are only kept when the proxy runs a single worker.'
+        return jsonify({'status': 'Unsupported', 'message': msg}).get_data(), 501
+
+    # Access database on behalf of web viewer through the pool every request shares
+    if STORAGE_BACKEND in MONGO_CATALOG_BACKENDS:
+        web_view_client: Union[MongoClient, None] = get_web_view_client()
+    else:
+        web_view_client: Union[MongoClient, None] = None
 
-        # Use aggregate pipeline to get the latest recorded value for each sensor
-        cur_collection: Collection = client['weather'][measurement]
-        historical_records: list[dict] = cur_collection.aggregate(measurement_pipeline, allowDiskUse=True).to_list()
+    mark_stage('connect')
 
-        # Save the list of results to super dictionary
-        historical_measurements[measurement] = historical_records
+    # Complete the desired operation
+    operation_result: Union[dict, list] = {'I am': 'a teapot'}
+    try:
+        if purpose not in [0, 1, 2, 3, 4, 5, 6, 7]:  # Make sure the purpose is valid
+            raise KeyError(f'Purpose {purpose} is not a valid purpose setting.')
+        elif purpose == 1:  # Only do if the purpose is for real-time information retrieval
+            # Select the measurement system to use
+            if filters['metric_or_customary'] in ['Metric', 'Empty']:
+                cur_measurements: list[str] = METRIC_MEASUREMENTS
+            else:
+                cur_measurements: list[str] = CUSTOMARY_MEASUREMENTS
 
-    return historical_measurements
+            # Obtain real-time data
+            operation_result: Union[dict, list] = get_latest_measurements(
+                cur_measurements, filters['all_or_selected'], filters['selected_sensors']
+            )
+        elif purpose == 2:  # Only do if the purpose is for historical information retrieval
+            # Select the measurement system to use
+            if filters['metric_or_customary'] in ['Metric', 'Empty']:
+                cur_measurements: list[str] = METRIC_MEASUREMENTS
+            else:
+                cur_measurements: list[str] = CUSTOMARY_MEASUREMENTS
+
+            # Obtain historical data
+            operation_result: Union[dict, list] = get_historical_measurements(
+                web_view_client, cur_measurements, filters['all_or_selected'], filters['selected_sensors'],
+                time_range['start_date_time'], time_range['end_date_time'], time_range['resolution'],
+                time_range['spatial_level'], time_range['percentiles']
+            )
+        elif purpose == 3:  # Only do if the purpose is for anomaly information retrieval
+            operation_result: Union[dict, list] = get_anomalous_measurements(
+                web_view_client, thresholds, filters['all_or_selected'], filters['selected_sensors'],
+                time_range['start_date_time'], time_range['end_date_time']
+            )
+        elif purpose == 4:  # Only do if the purpose is for alert retrieval
+            operation_result: Union[dict, list] = get_alerts(web_view_client, alerts_since)
+        elif purpose == 5:  # Only do if the purpose is for statistical baseline retrieval
+            # Select the measurement system to use
+            if filters['metric_or_customary'] in ['Metric', 'Empty']:
+                cur_measurements: list[str] = METRIC_MEASUREMENTS
+            else:
+                cur_measurements: list[str] = CUSTOMARY_MEASUREMENTS
+
+            # Obtain baselines from the outlier detector
+            operation_result: Union[dict, list] = get_detector_baselines(
+                cur_measurements, filters['all_or_selected'], filters['selected_sensors']
+            )
+        elif purpose == 6:  # Only do if the purpose is for finding sensors in an area
+            operation_result: Union[dict, list] = get_sensors_in_area(web_view_client, area)
+        elif purpose == 7:  # Only do if the purpose is for sliding-window aggregate retrieval
+            # Select the measurement system to use
+            if filters['metric_or_customary'] in ['Metric', 'Empty']:
+                cur_measurements: list[str] = METRIC_MEASUREMENTS
+            else:
+                cur_measurements: list[str] = CUSTOMARY_MEASUREMENTS
+
+            # Obtain the aggregates kept in memory as readings arrive
+            operation_result: Union[dict, list] = get_window_aggregates(
+                cur_measurements, get_selected_sensors(filters['all_or_selected'], filters['selected_sensors'])
+            )
+    except ExecutionTimeout:
+        msg: str = f'Get request to do MongoDB select operation of category {purpose} ran out of time.'
+        return jsonify({'status': 'Unavailable', 'message': msg}).get_data(), 503
+    except (TypeError, ValueError, OperationFailure, SQLiteError) as e:
+        msg: str = f'Get request to do MongoDB select operation of category {purpose} failed. Reason: {e}'
+        return jsonify({'status': 'Error', 'message': msg}).get_data(), 400
+    except KeyError as e:
+        msg: str = (
+            f'Get request to do MongoDB select operation of category {purpose} failed. '
+            f'Invalid purpose for web viewer API call. {e}'
+        )
+        return jsonify({'status': 'Error', 'message': msg}).get_data(), 400
+
+    mark_stage('query')
+
+    msg: str = f'Get request to do MongoDB select operation of category {purpose} succeeded.'
+    web_app_response: Response = jsonify({'status': 'Success', 'message': msg, 'result': operation_result})
+    mark_stage('serialize')
+    return web_app_response.get_data(), 200
 
 
 @app.route('/web_app', methods=['GET'])
@@ -311,27 +719,61 @@ def web_app() -> tuple[Response, int]:
     # Access arg fields from the Get request
     try:
         json_content: dict = request.get_json(force=True)
-        purpose: int = int(json_content['purpose'])  # 0 for sensors, 1 for real time, 2 for historical
+        # 0 sensors, 1 real time, 2 historical, 3 anomaly, 4 alerts, 5 statistical baselines, 6 sensors in an area,
+        # 7 sliding-window aggregates
+        purpose: int = int(json_content['purpose'])
         username: str = json_content['username']
         password: str = json_content['password']
         host: str = json_content['host']
         port: str = json_content['port']
 
         # Get filters if desired
-        if purpose != 0:
+        if purpose not in [0, 6]:
             filters: Union[dict, None] = json_content['filters']
         else:
             filters: Union[dict, None] = None
 
+        # Get the version of the sensor catalog the client already has if it only wants changes
+        if purpose == 0 and 'catalog_version' in json_content:
+            catalog_version: Union[int, None] = int(json_content['catalog_version'])
+            catalog_epoch: str = str(json_content.get('catalog_epoch', ''))
+        else:
+            catalog_version: Union[int, None] = None
+            catalog_epoch: str = ''
+
         # Get time range if desired
-        if purpose == 2:
+        if purpose in [2, 3]:
             time_range: Union[dict, None] = json_content['time_range']
             time_range['start_date_time'] = datetime.strptime(time_range['start_date_time'], '%Y-%m-%d %H:%M:%S')
             time_range['start_date_time'] = time_range['start_date_time'].replace(tzinfo=UTC)
             time_range['end_date_time'] = datetime.strptime(time_range['end_date_time'], '%Y-%m-%d %H:%M:%S')
             time_range['end_date_time'] = time_range['end_date_time'].replace(tzinfo=UTC)
+            time_range['resolution'] = int(time_range.get('resolution', 0))  # Seconds per point, 0 for raw readings
+            time_range['spatial_level'] = str(time_range.get('spatial_level', 'sensor'))  # sensor, city, county, state
+            time_range['percentiles'] = [float(percentile) for percentile in time_range.get('percentiles', [])]
         else:
             time_range: Union[dict, None] = None
+
+        # Get anomaly thresholds if desired
+        if purpose == 3:
+            thresholds: Union[dict, None] = {
+                measurement: {'min': float(threshold['min']), 'max': float(threshold['max'])}
+                for measurement, threshold in json_content['thresholds'].items()
+            }
+        else:
+            thresholds: Union[dict, None] = None
+
+        # Get the time of the last alert update the client has seen
+        if purpose == 4 and json_content.get('alerts_since', None) is not None:
+            alerts_since: Union[datetime, None] = datetime.fromisoformat(json_content['alerts_since'])
+        else:
+            alerts_since: Union[datetime, None] = None
+
+        # Get the area to find sensors in
+        if purpose == 6:
+            area: Union[dict, None] = dict(json_content['area'])
+        else:
+            area: Union[dict, None] = None
     except KeyError as e:
         return jsonify({'status': 'Error', 'message': f'Invalid request: Missing Form Field. {e}'}), 400
     except (ValueError, SyntaxError) as e:
@@ -346,64 +788,154 @@ def web_app() -> tuple[Response, int]:
     if host != DB_HOST or port != DB_PORT:
         return jsonify({'status': 'Unauthorized', 'message': 'Invalid request: Invalid host or port.'}), 401
 
-    # Access database on behalf of web viewer
-    try:
-        web_view_conn_string: str = f'mongodb://{WEB_VIEW}:{HASHED_WEB_VIEW_PASSWORD}@{DB_HOST}:{DB_PORT}/weather'
-        web_view_client: MongoClient = MongoClient(web_view_conn_string, connectTimeoutMS=3000)
-    except (ConnectionFailure, OperationFailure):
-        msg: str = f'Authentication with MongoDB rejected.'
-        return jsonify({'status': 'Unauthorized', 'message': msg}), 403
+    start_request_profile()
+    mark_stage('auth')
 
-    # Complete the desired operation
-    operation_result: Union[dict, list] = {'I am': 'a teapot'}
-    try:
-        if purpose not in [0, 1, 2]:  # Make sure the purpose is valid
-            raise KeyError(f'Purpose {purpose} is not a valid purpose setting.')
-        elif purpose == 0:  # Only do if the purpose is for sensor information retrieval
-            cur_collection: Collection = web_view_client['weather']['sensors']
-            operation_result: Union[dict, list] = cur_collection.find().to_list()
-            for document in operation_result:
-                document['_id'] = str(document['_id'])
-        elif purpose == 1:  # Only do if the purpose is for real-time information retrieval
-            # Select the measurement system to use
-            if filters['metric_or_customary'] in ['Metric', 'Empty']:
-                cur_measurements: list[str] = METRIC_MEASUREMENTS
-            else:
-                cur_measurements: list[str] = CUSTOMARY_MEASUREMENTS
+    # Serve the sensor catalog from memory, only sending what the client does not have yet
+    if purpose == 0:
+        catalog_etag: str = get_catalog_etag()
+        if request.headers.get('If-None-Match') == catalog_etag:
+            increment_counter('proxy_cache_requests_total', (('cache', 'sensor_catalog'), ('result', 'hit')))
+            return Response(status=304, headers={'ETag': catalog_etag}), 304
 
-            # Obtain real-time data
-            operation_result: Union[dict, list] = get_latest_measurements(
-                web_view_client, cur_measurements, filters['all_or_selected'], filters['selected_sensors']
-            )
-        elif purpose == 2:  # Only do if the purpose is for historical information retrieval
-            # Select the measurement system to use
-            if filters['metric_or_customary'] in ['Metric', 'Empty']:
-                cur_measurements: list[str] = METRIC_MEASUREMENTS
-            else:
-                cur_measurements: list[str] = CUSTOMARY_MEASUREMENTS
-
-            # Obtain historical data
-            operation_result: Union[dict, list] = get_historical_measurements(
-                web_view_client, cur_measurements, filters['all_or_selected'], filters['selected_sensors'],
-                time_range['start_date_time'], time_range['end_date_time']
-            )
-    except (TypeError, OperationFailure) as e:
-        msg: str = f'Get request to do MongoDB select operation of category {purpose} failed. Reason: {e}'
-        return jsonify({'status': 'Error', 'message': msg}), 400
-    except KeyError as e:
-        msg: str = (
-            f'Get request to do MongoDB select operation of category {purpose} failed. '
-            f'Invalid purpose for web viewer API call. {e}'
+        if catalog_version is None:
+            operation_result: Union[dict, list] = get_sensor_catalog()
+            catalog_result: str = 'miss'
+        else:
+            operation_result: Union[dict, list] = get_catalog_delta(catalog_version, catalog_epoch)
+            catalog_result: str = 'miss' if operation_result['full'] else 'delta'
+        increment_counter('proxy_cache_requests_total', (('cache', 'sensor_catalog'), ('result', catalog_result)))
+        mark_stage('catalog')
+
+        msg: str = f'Get request to do MongoDB select operation of category {purpose} succeeded.'
+        catalog_response: Response = jsonify({'status': 'Success', 'message': msg, 'result': operation_result})
+        catalog_response.headers['ETag'] = catalog_etag
+        mark_stage('serialize')
+        return catalog_response, 200
+
+    # Heavy queries get a small pool of their own, judged by how many documents they are likely to read
+    try:
+        admission_pool: str = classify_query(estimate_query_cost(purpose, filters, time_range, thresholds))
+    except (KeyError, TypeError):
+        admission_pool: str = 'query'  # Malformed filters are rejected by the query itself
+
+    # Turn the query away quickly when its pool is full, before it can run or wait on an identical query, so every
+    # request holding a thread also holds a slot
+    if not admit_request(admission_pool):
+        msg: str = f'The proxy is already running as many {admission_pool} queries as it allows. Try again shortly.'
+        busy_response: Response = jsonify({'status': 'Busy', 'message': msg})
+        busy_response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER_SECONDS)
+        return busy_response, 429
+
+    mark_stage('admit')
+
+    # Identical queries that arrive together share one execution, except profiled ones that measure their own
+    if PROFILE_HEADER in request.headers:
+        response_body, status_code = run_web_app_query(purpose, filters, time_range, thresholds, alerts_since, area)
+    else:
+        query_key: str = get_query_key(purpose, {
+            'filters': filters, 'time_range': time_range, 'thresholds': thresholds, 'alerts_since': alerts_since,
+            'area': area
+        })
+        response_body, status_code = run_coalesced(
+            query_key, purpose,
+            lambda: run_web_app_query(purpose, filters, time_range, thresholds, alerts_since, area)
         )
-        return jsonify({'status': 'Error', 'message': msg}), 400
 
-    msg: str = f'Get request to do MongoDB select operation of category {purpose} succeeded.'
-    return jsonify({'status': 'Success', 'message': msg, 'result': operation_result}), 200
+    # Tell clients turned away for load when to try again
+    web_app_response: Response = Response(response_body, status=status_code, mimetype='application/json')
+    if status_code in [429, 503]:
+        web_app_response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER_SECONDS)
+    return web_app_response, status_code
+
+
+def start_background_jobs(is_leader: bool) -> None:
+    # Every worker flushes its own ingest queue and keeps its catalog and detector baselines in sync
+    start_ingest_flushers()
+    start_catalog_refresh()
+    start_metric_snapshots()
+    if STORAGE_BACKEND in MONGO_CATALOG_BACKENDS:
+        start_detector_snapshots(is_leader)
+
+    # Only one worker checks readings against open alerts and baselines, listens for streams and keeps the rollups
+    # and archive of the main server up to date
+    if is_leader:
+        start_leader_inbox(check_forwarded_reading)
+        start_stream_ingest()
+        if STORAGE_BACKEND == 'mongo':
+            start_rollup_compaction()
+            start_archiver()
+
+
+def run_worker(worker_index: int, listen_socket: socket) -> None:
+    # A restarted leader picks up the alerts and baselines its predecessor left instead of the parent's from startup
+    if worker_index == 0 and STORAGE_BACKEND in MONGO_CATALOG_BACKENDS:
+        weather: Database = get_data_gen_client()['weather']
+        warm_open_alerts(weather)
+        warm_detector_state(weather)
+
+    start_background_jobs(worker_index == 0)
+    try:
+        serve(app, sockets=[listen_socket], threads=WAITRESS_THREADS)
+    finally:
+        drain_ingest_queues()
 
 
 if __name__ == "__main__":
-    # Create the database
-    create_database()
+    # Get the command to run, serving the app by default
+    arg_parser: ArgumentParser = ArgumentParser(description='Database proxy server for the IoT weather app.')
+    arg_parser.add_argument(
+        'command', nargs='?', default='serve', choices=['serve', 'rebuild-rollups', 'restore-archive', 'migrate-units']
+    )
+    arg_parser.add_argument('--measurement', choices=ALL_MEASUREMENTS, help='Measurement to restore from the archive.')
+    arg_parser.add_argument('--start', type=date.fromisoformat, help='First day to restore, as YYYY-MM-DD.')
+    arg_parser.add_argument('--end', type=date.fromisoformat, help='Last day to restore, as YYYY-MM-DD.')
+    arg_parser.add_argument(
+        '--force', action='store_true', help='Drop customary collections even if their metric ones hold fewer readings.'
+    )
+    args: Namespace = arg_parser.parse_args()
 
-    # Run the flask app
-    serve(app, host='0.0.0.0', port=8079)
+    # Rollups, the archive and customary collections only exist on the main MongoDB server
+    if args.command != 'serve' and STORAGE_BACKEND != 'mongo':
+        arg_parser.error(f'{args.command} needs the mongo storage backend.')
+
+    # Create the database and load the alert rules, or only the local tables and catalog without MongoDB
+    load_alert_rules()
+    if STORAGE_BACKEND in MONGO_CATALOG_BACKENDS:
+        create_database()
+    else:
+        get_storage().create_storage()
+        warm_sensor_catalog()
+
+    if args.command == 'rebuild-rollups':
+        # Recompute every rollup from the raw readings
+        rebuild_rollups(get_data_gen_client())
+    elif args.command == 'restore-archive':
+        # Load archived readings into their own collection for ad hoc queries
+        if args.measurement is None or args.start is None or args.end is None:
+            arg_parser.error('restore-archive needs --measurement, --start and --end.')
+
+        restore_start: datetime = datetime.combine(args.start, datetime.min.time(), tzinfo=UTC)
+        restore_end: datetime = datetime.combine(args.end, datetime.max.time(), tzinfo=UTC)
+        restored_count: int = restore_archive(get_data_gen_client(), args.measurement, restore_start, restore_end)
+        restored_name: str = f'{RESTORED_COLLECTION_PREFIX}{args.measurement}'
+        print(f'Restored {restored_count} {args.measurement} readings into {restored_name}.')
+    elif args.command == 'migrate-units':
+        # Drop the customary collections that are now derived from the metric ones
+        migrate_storage_units(get_data_gen_client(), args.force)
+    elif PROXY_WORKERS > 1:
+        # Fork workers that share one listening socket
+        run_workers(create_listen_socket(PROXY_PORT), run_worker)
+    else:
+        # Fill the hot store and the windows before serving, since ingest only keeps them complete from then on
+        with app.app_context():
+            warm_hot_store()
+            warm_window_aggregates()
+
+        # Flush the ingest queue when the proxy is stopped, which SIGTERM does through SystemExit
+        register_exit(drain_ingest_queues)
+        signal(SIGTERM, exit_on_signal)
+
+        # Run the flask app
+        start_background_jobs(True)
+        serve(app, host='0.0.0.0', port=PROXY_PORT, threads=WAITRESS_THREADS)
@@ -0,0 +1,76 @@
+from flask import g
+from threading import BoundedSemaphore
+from time import perf_counter
+from typing import Union
+from .Constants import (METRIC_MEASUREMENTS, ADMISSION_INGEST_CONCURRENCY, ADMISSION_QUERY_CONCURRENCY,
+                        ADMISSION_HEAVY_CONCURRENCY, ADMISSION_WAIT_MS, ADMISSION_HEAVY_COST,
+                        ADMISSION_READING_INTERVAL_SECONDS, QUERY_MAX_TIME_MS, HEAVY_QUERY_MAX_TIME_MS)
+from .Metrics import increment_counter
+from .SensorCatalog import get_catalog_summary
+
+# Separate pools so heavy queries can never take the threads that ingest and light queries need
+app_admission_pools: dict[str, BoundedSemaphore] = {
+    'ingest': BoundedSemaphore(ADMISSION_INGEST_CONCURRENCY),
+    'query': BoundedSemaphore(ADMISSION_QUERY_CONCURRENCY),
+    'heavy': BoundedSemaphore(ADMISSION_HEAVY_CONCURRENCY)
+}
+
+# Most time each pool's requests may spend in MongoDB aggregations
+POOL_MAX_TIME_MS: dict[str, int] = {'query': QUERY_MAX_TIME_MS, 'heavy': HEAVY_QUERY_MAX_TIME_MS}
+
+
+def estimate_query_cost(purpose: int, filters: Union[dict, None], time_range: Union[dict, None],
+                        thresholds: Union[dict, None]) -> float:
+    # Catalog, alert, baseline and area requests are served from memory or small collections
+    if purpose not in [1, 2, 3]:
+        return 0.0
+
+    # Documents read are roughly sensors times measurements times readings per sensor in the range
+    if filters['all_or_selected'] in ['All', 'Empty'] or 'Empty' in filters['selected_sensors']:
+        sensor_count: int = max(get_catalog_summary()['sensor_count'], 1)
+    else:
+        sensor_count: int = len(filters['selected_sensors'])
+    measurement_count: int = len(thresholds) if purpose == 3 else len(METRIC_MEASUREMENTS)
+    if purpose == 1:
+        return float(sensor_count * measurement_count)
+
+    # Rollups hold one point per bucket instead of every reading
+    span_seconds: float = (time_range['end_date_time'] - time_range['start_date_time']).total_seconds()
+    step_seconds: int = max(time_range.get('resolution', 0), ADMISSION_READING_INTERVAL_SECONDS)
+    return sensor_count * measurement_count * max(span_seconds / step_seconds, 1.0)
+
+
+def classify_query(query_cost: float) -> str:
+    return 'heavy' if query_cost >= ADMISSION_HEAVY_COST else 'query'
+
+
+def admit_request(pool: str) -> bool:
+    # Wait briefly for a slot, then turn the request away instead of letting it queue for a thread
+    if not app_admission_pools[pool].acquire(timeout=ADMISSION_WAIT_MS / 1000):
+        increment_counter('proxy_admission_rejected_total', (('pool', pool),))
+        return False
+
+    increment_counter('proxy_admission_in_use', (('pool', pool),))
+    g.admission_pool = pool
+    if pool in POOL_MAX_TIME_MS:
+        g.query_deadline = perf_counter() + POOL_MAX_TIME_MS[pool] / 1000
+
+    return True
+
+
+def release_request() -> None:
+    pool: Union[str, None] = g.pop('admission_pool', None)
+    if pool is None:
+        return
+
+    app_admission_pools[pool].release()
+    increment_counter('proxy_admission_in_use', (('pool', pool),), -1.0)
+
+
+def get_remaining_time_ms() -> Union[int, None]:
+    # Every aggregation of a request shares the request's deadline
+    query_deadline: Union[float, None] = g.get('query_deadline', None)
+    if query_deadline is None:
+        return None
+
+    return max(int((query_deadline - perf_counter()) * 1000), 1)
@@ -0,0 +1,180 @@
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.database import Database, Collection
+from pymongo.errors import CollectionInvalid
+from pymongo.results import UpdateResult
+from threading import Lock
+from datetime import datetime, UTC
+from json import load as json_load
+from typing import Union
+from .Constants import (ALERT_COLLECTION, ALERT_RULES_FILE, ALERT_HYSTERESIS_FRACTION, ALERT_RESULT_LIMIT,
+                        DEFAULT_ALERT_RULES)
+from .Metrics import increment_counter
+
+# Threshold rules per measurement, with the band a reading must return to before an alert clears
+app_alert_rules: dict[str, dict[str, float]] = {}
+
+# Open alerts keyed by sensor, measurement and rule so each reading is checked in constant time
+app_open_alerts: dict[tuple[str, str, str], dict] = {}
+app_open_alerts_lock: Lock = Lock()
+
+
+def load_alert_rules() -> None:
+    # Start from the dashboard defaults and apply any configured overrides
+    configured_rules: dict[str, dict[str, float]] = dict(DEFAULT_ALERT_RULES)
+    if ALERT_RULES_FILE != '':
+        with open(ALERT_RULES_FILE) as rules_file:
+            configured_rules.update(json_load(rules_file))
+
+    # Precompute the clearing band so a sustained breach only raises one alert
+    app_alert_rules.clear()
+    for measurement, rule in configured_rules.items():
+        hysteresis: float = (float(rule['max']) - float(rule['min'])) * ALERT_HYSTERESIS_FRACTION
+        app_alert_rules[measurement] = {
+            'min': float(rule['min']),
+            'max': float(rule['max']),
+            'clear_min': float(rule['min']) + hysteresis,
+            'clear_max': float(rule['max']) - hysteresis
+        }
+
+    print(f'Loaded alert rules for {len(app_alert_rules)} measurements.')
+
+
+def create_alert_collection(weather: Database) -> None:
+    try:
+        weather.create_collection(name=ALERT_COLLECTION)
+        print(f'Alert collection {ALERT_COLLECTION} created.')
+    except CollectionInvalid:
+        print(f'Alert collection {ALERT_COLLECTION} already exists.')
+
+    alert_collection: Collection = weather[ALERT_COLLECTION]
+    alert_collection.create_index([('updated_at', DESCENDING)])
+    alert_collection.create_index([('sensor_name', ASCENDING), ('measurement', ASCENDING), ('cleared_at', ASCENDING)])
+
+
+def warm_open_alerts(weather: Database) -> None:
+    # Pick up alerts that were still open when the proxy last stopped
+    open_alerts: list[dict] = weather[ALERT_COLLECTION].find({'cleared_at': None}).to_list()
+    with app_open_alerts_lock:
+        app_open_alerts.clear()
+        for alert in open_alerts:
+            app_open_alerts[(alert['sensor_name'], alert['measurement'], alert['rule'])] = {
+                'alert_id': alert['_id'], 'breach_count': alert['breach_count'], 'peak_value': alert['peak_value']
+            }
+
+    print(f'Loaded {len(open_alerts)} open alerts.')
+
+
+def raise_alert(client: MongoClient, document: dict, measurement: str, rule_name: str, alert_fields: dict) -> None:
+    alert_key: dict = {
+        'sensor_name': document['sensor_name'], 'measurement': measurement, 'rule': rule_name, 'cleared_at': None
+    }
+    alert: dict = {
+        **alert_fields,
+        'value': document['metric'],
+        'peak_value': document['metric'],
+        'breach_count': 1,
+        'city': document.get('city', None),
+        'county': document.get('county', None),
+        'raised_at': document['time_recorded'],
+        'updated_at': datetime.now(UTC)
+    }
+
+    # Only insert if no other worker already has this alert open, in which case that alert is reused
+    alert_collection: Collection = client['weather'][ALERT_COLLECTION]
+    update_result: UpdateResult = alert_collection.update_one(alert_key, {'$setOnInsert': alert}, upsert=True)
+    if update_result.upserted_id is None:
+        open_alert: dict = alert_collection.find_one(alert_key)
+        app_open_alerts[(document['sensor_name'], measurement, rule_name)] = {
+            'alert_id': open_alert['_id'], 'breach_count': open_alert['breach_count'] + 1,
+            'peak_value': open_alert['peak_value']
+        }
+        return
+
+    app_open_alerts[(document['sensor_name'], measurement, rule_name)] = {
+        'alert_id': update_result.upserted_id, 'breach_count': 1, 'peak_value': document['metric']
+    }
+    increment_counter('proxy_alerts_total', (('measurement', measurement), ('rule', rule_name), ('event', 'raised')))
+
+
+def extend_alert(open_alert: dict, value: float, below: bool) -> None:
+    # A sustained breach only updates the local summary, which is written when the alert clears
+    open_alert['breach_count'] += 1
+    if below:
+        open_alert['peak_value'] = min(open_alert['peak_value'], value)
+    else:
+        open_alert['peak_value'] = max(open_alert['peak_value'], value)
+
+
+def clear_alert(client: MongoClient, document: dict, measurement: str, rule_name: str) -> None:
+    open_alert: dict = app_open_alerts.pop((document['sensor_name'], measurement, rule_name))
+    client['weather'][ALERT_COLLECTION].update_one(
+        {'_id': open_alert['alert_id'], 'cleared_at': None},  # Another worker may have cleared it already
+        {'$set': {
+            'cleared_at': document['time_recorded'],
+            'breach_count': open_alert['breach_count'],
+            'peak_value': open_alert['peak_value'],
+            'updated_at': datetime.now(UTC)
+        }}
+    )
+    increment_counter('proxy_alerts_total', (('measurement', measurement), ('rule', rule_name), ('event', 'cleared')))
+
+
+def evaluate_alert_rules(client: MongoClient, measurement: str, document: dict) -> None:
+    # Skip measurements without a rule, such as wind direction
+    rule: Union[dict[str, float], None] = app_alert_rules.get(measurement, None)
+    if rule is None:
+        return
+
+    value: float = document['metric']
+    alert_key: tuple[str, str, str] = (document['sensor_name'], measurement, 'threshold')
+    breached: bool = value < rule['min'] or value > rule['max']
+    recovered: bool = rule['clear_min'] <= value <= rule['clear_max']
+
+    # Most readings are in range for a sensor without an open alert, which needs no further work
+    open_alert: Union[dict, None] = app_open_alerts.get(alert_key, None)
+    if open_alert is None and not breached:
+        return
+
+    with app_open_alerts_lock:
+        open_alert = app_open_alerts.get(alert_key, None)
+        if open_alert is None and breached:  # A new breach raises one alert
+            below_min: bool = value < rule['min']
+            raise_alert(client, document, measurement, 'threshold', {
+                'direction': 'below' if below_min else 'above',
+                'threshold': rule['min'] if below_min else rule['max']
+            })
+        elif open_alert is not None and breached:  # A sustained breach is part of the same alert
+            extend_alert(open_alert, value, value < rule['min'])
+        elif open_alert is not None and recovered:  # The reading is back inside the band
+            clear_alert(client, document, measurement, 'threshold')
+
+
+def get_alerts(client: MongoClient, updated_since: Union[datetime, None]) -> dict:
+    # Get alerts changed since the client's last request, or the latest alerts on its first request
+    alert_collection: Collection = client['weather'][ALERT_COLLECTION]
+    if updated_since is None:
+        alerts: list[dict] = alert_collection.find().sort('updated_at', DESCENDING).limit(ALERT_RESULT_LIMIT).to_list()
+    else:
+        # Oldest changes first, so changes past the limit are picked up on the next request instead of skipped
+        alerts: list[dict] = alert_collection.find(
+            {'updated_at': {'$gte': updated_since}}
+        ).sort('updated_at', ASCENDING).limit(ALERT_RESULT_LIMIT).to_list()
+
+    # Keep time precision that the default JSON date format would drop
+    for alert in alerts:
+        alert['_id'] = str(alert['_id'])
+        for time_field in ['raised_at', 'cleared_at', 'updated_at']:
+            if isinstance(alert[time_field], datetime):
+                alert[time_field] = alert[time_field].replace(tzinfo=UTC).isoformat()
+
+    # The newest alert returned is first on the first request and last on later ones
+    if len(alerts) == 0:
+        latest_update: Union[str, None] = None
+    elif updated_since is None:
+        latest_update: Union[str, None] = alerts[0]['updated_at']
+    else:
+        latest_update: Union[str, None] = alerts[-1]['updated_at']
+    if latest_update is None and updated_since is not None:
+        latest_update = updated_since.isoformat()
+
+    return {'alerts': alerts, 'latest_update': latest_update}
@@ -0,0 +1,232 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+import pyarrow.compute as pc
+from pymongo import MongoClient, ASCENDING
+from pymongo.database import Database, Collection
+from pymongo.errors import OperationFailure, ConnectionFailure, CollectionInvalid
+from threading import Thread, Lock
+from time import sleep, monotonic
+from datetime import datetime, timedelta, UTC
+from os import makedirs, replace
+from os.path import join, isdir
+from typing import Union
+from .Constants import (STORED_MEASUREMENTS, NON_NUMERIC_MEASUREMENTS, ROLLUP_LATENESS_SECONDS, RETENTION_SECONDS,
+                        ARCHIVE_DIR, ARCHIVE_WATERMARK_COLLECTION, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_ROW_GROUP_SIZE,
+                        RESTORED_COLLECTION_PREFIX, ARCHIVE_BOUNDARY_CACHE_SECONDS)
+from .DatabaseClients import get_data_gen_client
+from .SensorCatalog import get_location_projection
+from .Units import is_derived_measurement, get_stored_measurement, get_conversion
+
+# Readings are archived one UTC day at a time
+ARCHIVE_PARTITION: timedelta = timedelta(days=1)
+
+# Partition directories are named by day, which compares correctly as a string
+ARCHIVE_PARTITIONING: ds.Partitioning = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+
+# Archive watermark per measurement with the time it was read, so queries rarely need to look it up
+app_archive_boundaries: dict[str, tuple[Union[datetime, None], float]] = {}
+app_archive_boundaries_lock: Lock = Lock()
+
+
+def get_archive_schema(measurement: str) -> pa.Schema:
+    return pa.schema([
+        ('sensor_name', pa.string()),
+        ('time_recorded', pa.timestamp('ms', tz='UTC')),
+        ('metric', pa.string() if measurement in NON_NUMERIC_MEASUREMENTS else pa.float64()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('city', pa.string()),
+        ('county', pa.string()),
+        ('state', pa.string()),
+        ('zip_code', pa.int64())
+    ])
+
+
+def get_archive_path(measurement: str, day_start: datetime) -> str:
+    # Hive-style partitions let readers skip whole days by path alone
+    return join(ARCHIVE_DIR, measurement, f'date={day_start:%Y-%m-%d}', 'part-0.parquet')
+
+
+def apply_retention(weather: Database) -> None:
+    # Expire readings per collection, turning expiry off where no retention is configured
+    for measurement in STORED_MEASUREMENTS:
+        retention_seconds: int = RETENTION_SECONDS[measurement]
+        try:
+            weather.command({'collMod': measurement, 'expireAfterSeconds': retention_seconds or 'off'})
+        except OperationFailure as e:
+            print(f'Could not set retention for {measurement}. Reason: {e}')
+
+    # Warn when readings could expire before the archiver gets to them
+    archive_delay_seconds: int = (
+        int(ARCHIVE_PARTITION.total_seconds()) + ROLLUP_LATENESS_SECONDS + ARCHIVE_INTERVAL_SECONDS
+    )
+    for measurement in STORED_MEASUREMENTS:
+        retention_seconds: int = RETENTION_SECONDS[measurement]
+        if retention_seconds > 0 and ARCHIVE_DIR == '':
+            print(f'Retention is set for {measurement} without an archive directory, so expired readings are lost.')
+        elif 0 < retention_seconds <= archive_delay_seconds:
+            print(f'Retention for {measurement} is shorter than the archive delay, so some readings are lost.')
+
+
+def archive_day(weather: Database, measurement: str, day_start: datetime) -> int:
+    # Read the day and sort it by sensor, so row group statistics can skip sensors as well as days
+    day_readings: list[dict] = weather[measurement].find(
+        {'time_recorded': {'$gte': day_start, '$lt': day_start + ARCHIVE_PARTITION}},
+        {'_id': 0}
+    ).to_list()
+    if len(day_readings) == 0:
+        return 0
+
+    day_table: pa.Table = pa.Table.from_pylist(day_readings, schema=get_archive_schema(measurement))
+    day_table = day_table.sort_by([('sensor_name', 'ascending'), ('time_recorded', 'ascending')])
+
+    # Write next to the final file and move it into place so readers never see a partial day
+    archive_path: str = get_archive_path(measurement, day_start)
+    makedirs(archive_path.rsplit('/', 1)[0], exist_ok=True)
+    pq.write_table(day_table, f'{archive_path}.tmp', row_group_size=ARCHIVE_ROW_GROUP_SIZE, compression='zstd')
+    replace(f'{archive_path}.tmp', archive_path)
+    return day_table.num_rows
+
+
+def archive_measurement(weather: Database, measurement: str) -> None:
+    # Only archive whole days that late readings can no longer change
+    archive_cutoff: datetime = datetime.now(UTC) - timedelta(seconds=ROLLUP_LATENESS_SECONDS)
+    watermark_collection: Collection = weather[ARCHIVE_WATERMARK_COLLECTION]
+    watermark_document: Union[dict, None] = watermark_collection.find_one({'_id': measurement})
+    if watermark_document is not None:
+        day_start: datetime = watermark_document['archived_until'].replace(tzinfo=UTC)
+    else:  # Start from the oldest reading still in the collection
+        oldest_reading: Union[dict, None] = weather[measurement].find_one(
+            {}, {'time_recorded': 1}, sort=[('time_recorded', ASCENDING)]
+        )
+        if oldest_reading is None:
+            return
+        day_start: datetime = oldest_reading['time_recorded'].replace(
+            hour=0, minute=0, second=0, microsecond=0, tzinfo=UTC
+        )
+
+    while day_start + ARCHIVE_PARTITION <= archive_cutoff:
+        archived_count: int = archive_day(weather, measurement, day_start)
+        print(f'Archived {archived_count} {measurement} readings for {day_start:%Y-%m-%d}.')
+
+        # Move the watermark after each day so a restart picks up where this pass stopped
+        day_start += ARCHIVE_PARTITION
+        watermark_collection.update_one({'_id': measurement}, {'$set': {'archived_until': day_start}}, upsert=True)
+
+
+def archive_readings(client: MongoClient) -> None:
+    for measurement in STORED_MEASUREMENTS:
+        archive_measurement(client['weather'], measurement)
+
+
+def run_archiver() -> None:
+    while True:
+        try:
+            archive_readings(get_data_gen_client())
+        except (OperationFailure, ConnectionFailure, OSError) as e:
+            print(f'Archiving readings failed. Reason: {e}')
+
+        sleep(ARCHIVE_INTERVAL_SECONDS)
+
+
+def start_archiver() -> None:
+    if ARCHIVE_DIR == '':
+        return
+
+    archiver_thread: Thread = Thread(target=run_archiver, name='archiver', daemon=True)
+    archiver_thread.start()
+
+
+def get_archive_boundary(client: MongoClient, measurement: str) -> Union[datetime, None]:
+    # Readings before the boundary are in the archive
+    if ARCHIVE_DIR == '':
+        return None
+
+    with app_archive_boundaries_lock:
+        cached_boundary: Union[tuple, None] = app_archive_boundaries.get(measurement, None)
+    if cached_boundary is not None and monotonic() - cached_boundary[1] < ARCHIVE_BOUNDARY_CACHE_SECONDS:
+        return cached_boundary[0]
+
+    watermark_document: Union[dict, None] = client['weather'][ARCHIVE_WATERMARK_COLLECTION].find_one(
+        {'_id': measurement}
+    )
+    archive_boundary: Union[datetime, None] = None
+    if watermark_document is not None:
+        archive_boundary = watermark_document['archived_until'].replace(tzinfo=UTC)
+
+    with app_archive_boundaries_lock:
+        app_archive_boundaries[measurement] = (archive_boundary, monotonic())
+
+    return archive_boundary
+
+
+def read_archived_measurements(measurement: str, all_or_selected: str, selected_sensors: list[str],
+                               start_date_time: datetime, end_date_time: datetime,
+                               archive_boundary: datetime, fields: Union[list[str], None] = None) -> list[dict]:
+    # Prune whole days by path, then row groups by their time and sensor statistics
+    archive_filter: list[tuple] = [
+        ('date', '>=', f'{start_date_time:%Y-%m-%d}'),
+        ('date', '<=', f'{min(end_date_time, archive_boundary):%Y-%m-%d}'),
+        ('time_recorded', '>=', start_date_time),
+        ('time_recorded', '<=', end_date_time),
+        ('time_recorded', '<', archive_boundary)
+    ]
+    if not (all_or_selected in ['All', 'Empty'] or 'Empty' in selected_sensors):
+        archive_filter.append(('sensor_name', 'in', selected_sensors))
+
+    # Only read the charted columns, mapping the files instead of copying them into memory
+    archive_columns: list[str] = [*(fields or get_location_projection().keys()), 'time_recorded', 'metric']
+    try:
+        archived_table: pa.Table = pq.read_table(
+            join(ARCHIVE_DIR, get_stored_measurement(measurement)), columns=archive_columns,
+            filters=archive_filter, partitioning=ARCHIVE_PARTITIONING, memory_map=True
+        )
+    except FileNotFoundError:
+        return []
+
+    # Convert derived units over the whole column at once
+    if is_derived_measurement(measurement):
+        scale, offset = get_conversion(measurement)
+        archived_table = archived_table.set_column(
+            archived_table.schema.get_field_index('metric'), 'metric',
+            pc.add(pc.multiply(archived_table['metric'], scale), offset)
+        )
+
+    # Newest first, matching the MongoDB part of the query
+    return archived_table.sort_by([('time_recorded', 'descending')]).to_pylist()
+
+
+def restore_archive(client: MongoClient, measurement: str, start_date_time: datetime,
+                    end_date_time: datetime) -> int:
+    measurement_dir: str = join(ARCHIVE_DIR, measurement)
+    if not isdir(measurement_dir):
+        raise FileNotFoundError(f'No archive found for {measurement} in {ARCHIVE_DIR}.')
+
+    # Restore into a separate time-series collection that never expires, leaving the live collection alone
+    weather: Database = client['weather']
+    restored_name: str = f'{RESTORED_COLLECTION_PREFIX}{measurement}'
+    try:
+        weather.create_collection(
+            name=restored_name,
+            timeseries={'timeField': 'time_recorded', 'metaField': 'sensor_name', 'granularity': 'hours'}
+        )
+    except CollectionInvalid:
+        print(f'Restored collection {restored_name} already exists.')
+
+    # Read only the days in range, then insert them in batches
+    archive_dataset: ds.Dataset = ds.dataset(measurement_dir, format='parquet', partitioning=ARCHIVE_PARTITIONING)
+    time_filter: ds.Expression = (
+        (ds.field('time_recorded') >= pa.scalar(start_date_time, pa.timestamp('ms', tz='UTC'))) &
+        (ds.field('time_recorded') <= pa.scalar(end_date_time, pa.timestamp('ms', tz='UTC')))
+    )
+    restored_count: int = 0
+    for record_batch in archive_dataset.to_batches(
+            columns=get_archive_schema(measurement).names, filter=time_filter, batch_size=ARCHIVE_ROW_GROUP_SIZE):
+        restored_readings: list[dict] = record_batch.to_pylist()
+        if len(restored_readings) > 0:
+            weather[restored_name].insert_many(restored_readings, ordered=False)
+            restored_count += len(restored_readings)
+
+    return restored_count
@@ -0,0 +1,80 @@
+from threading import Event, Lock
+from json import dumps as json_dumps
+from typing import Callable, Union
+from .Constants import COALESCE_ENABLED, COALESCE_WAIT_SECONDS
+from .Metrics import increment_counter
+from .Admission import get_remaining_time_ms
+
+
+class InFlightQuery:
+    # One execution of a query that identical requests wait on instead of running their own
+    def __init__(self) -> None:
+        self.finished: Event = Event()
+        self.result: Union[tuple[bytes, int], None] = None
+        self.error: Union[BaseException, None] = None
+
+
+# Queries currently running, keyed by their normalized form
+app_in_flight_queries: dict[str, InFlightQuery] = {}
+app_in_flight_lock: Lock = Lock()
+
+
+def get_query_key(purpose: int, query: dict) -> str:
+    # Settings that select the same readings get the same key
+    normalized_query: dict = dict(query)
+    filters: Union[dict, None] = normalized_query.get('filters', None)
+    try:
+        filters = dict(filters)
+        if filters['all_or_selected'] in ['All', 'Empty'] or 'Empty' in filters['selected_sensors']:
+            filters['all_or_selected'] = 'All'
+            filters['selected_sensors'] = []
+        else:
+            filters['selected_sensors'] = sorted(set(filters['selected_sensors']))
+        if filters.get('metric_or_customary', 'Empty') == 'Empty':
+            filters['metric_or_customary'] = 'Metric'
+        normalized_query['filters'] = filters
+    except (KeyError, TypeError, ValueError):
+        # Missing or malformed filters are keyed as sent and left for the query to reject
+        pass
+
+    return json_dumps({'purpose': purpose, **normalized_query}, sort_keys=True, default=str)
+
+
+def run_coalesced(query_key: str, purpose: int, run_query: Callable[[], tuple[bytes, int]]) -> tuple[bytes, int]:
+    if not COALESCE_ENABLED:
+        return run_query()
+
+    # The first request for a query runs it, every request that arrives while it runs waits for its result
+    with app_in_flight_lock:
+        in_flight_query: Union[InFlightQuery, None] = app_in_flight_queries.get(query_key, None)
+        is_leader: bool = in_flight_query is None
+        if is_leader:
+            in_flight_query = InFlightQuery()
+            app_in_flight_queries[query_key] = in_flight_query
+
+    if not is_leader:
+        # Wait no longer than the follower's own deadline, since it holds an admission slot the whole time
+        increment_counter('proxy_coalesced_requests_total', (('purpose', str(purpose)), ('role', 'follower')))
+        remaining_time_ms: Union[int, None] = get_remaining_time_ms()
+        wait_seconds: float = COALESCE_WAIT_SECONDS if remaining_time_ms is None else \
+            min(COALESCE_WAIT_SECONDS, remaining_time_ms / 1000)
+        if in_flight_query.finished.wait(wait_seconds):
+            if in_flight_query.error is not None:
+                raise in_flight_query.error
+            return in_flight_query.result
+
+        # Run the query separately under the follower's own slot rather than wait on a leader that is stuck
+        return run_query()
+
+    increment_counter('proxy_coalesced_requests_total', (('purpose', str(purpose)), ('role', 'leader')))
+    try:
+        in_flight_query.result = run_query()
+        return in_flight_query.result
+    except BaseException as e:
+        in_flight_query.error = e
+        raise
+    finally:
+        # Requests arriving from here on start a fresh execution
+        with app_in_flight_lock:
+            app_in_flight_queries.pop(query_key, None)
+        in_flight_query.finished.set()
@@ -0,0 +1,186 @@
+from os import getenv
+from hashlib import sha256
+
+# Get core database environmental variables
+DB_HOST: str = getenv('DB_HOST')
+DB_PORT: str = getenv('DB_PORT')
+DB_OWNER: str = getenv('DB_OWNER')
+DB_OWNER_PASSWORD_FILE: str = getenv('DB_OWNER_PASS_FILE')
+
+# Replica set settings, where web view reads can go to secondaries while every write goes to the primary
+DB_REPLICA_SET: str = getenv('DB_REPLICA_SET', '')  # Replica set name, or empty for the single server above
+DB_REPLICA_HOSTS: str = getenv('DB_REPLICA_HOSTS', '')  # host:port of each member, comma separated
+READ_PREFERENCE: str = getenv('READ_PREFERENCE', 'secondaryPreferred')  # Read preference mode of web view reads
+READ_MAX_STALENESS_SECONDS: int = int(getenv('READ_MAX_STALENESS_SECONDS', '90'))  # At least 90, or -1 for no limit
+
+# Get the other usernames
+DATA_GEN: str = getenv('DATA_GEN')
+WEB_VIEW: str = getenv('WEB_VIEW')
+
+# Hash the passwords
+HASHED_DATA_GEN_PASSWORD: str = sha256(open(getenv('DATA_GEN_PASSWORD_FILE')).read().encode()).hexdigest().strip()
+HASHED_WEB_VIEW_PASSWORD: str = sha256(open(getenv('WEB_VIEW_PASSWORD_FILE')).read().encode()).hexdigest().strip()
+
+# List of sensor measurements
+CUSTOMARY_MEASUREMENTS: list[str] = [
+    'humidity_perc', 'precip_in', 'pressure_in', 'temp_f', 'uv_index_score', 'wind_degree', 'wind_dir', 'wind_mph'
+]
+METRIC_MEASUREMENTS: list[str] = [
+    'humidity_perc', 'precip_mm', 'pressure_mb', 'temp_c', 'uv_index_score', 'wind_degree', 'wind_dir', 'wind_kph'
+]
+ALL_MEASUREMENTS: list[str] = [
+    'humidity_perc', 'precip_in', 'precip_mm', 'pressure_in', 'pressure_mb', 'temp_c',
+    'temp_f', 'uv_index_score', 'wind_degree', 'wind_dir', 'wind_kph', 'wind_mph'
+]
+
+# Unit storage settings, where metric keeps one collection per quantity and derives the customary units on read
+STORAGE_UNITS: str = getenv('STORAGE_UNITS', 'both')  # both or metric
+CUSTOMARY_CONVERSIONS: dict[str, tuple[str, float, float]] = {  # Customary = metric * scale + offset
+    'precip_in': ('precip_mm', 1 / 25.4, 0.0),
+    'pressure_in': ('pressure_mb', 0.0295299830714, 0.0),
+    'temp_f': ('temp_c', 1.8, 32.0),
+    'wind_mph': ('wind_kph', 0.621371192237, 0.0)
+}
+STORED_MEASUREMENTS: list[str] = [
+    measurement for measurement in ALL_MEASUREMENTS
+    if STORAGE_UNITS != 'metric' or measurement not in CUSTOMARY_CONVERSIONS
+]
+
+# Document settings, where lean documents leave each sensor's location to the sensor catalog
+DOCUMENT_MODE: str = getenv('DOCUMENT_MODE', 'full')  # full or lean
+LEAN_DOCUMENT_FIELDS: list[str] = ['sensor_name', 'time_recorded', 'metric']
+LOCATION_FIELDS: list[str] = ['city', 'county']  # Location fields returned with historical readings
+
+# Storage backend settings, where sqlite keeps the readings and the sensor catalog in one local file
+STORAGE_BACKEND: str = getenv('STORAGE_BACKEND', 'mongo')  # mongo, sqlite or partitioned
+SQLITE_PATH: str = getenv('SQLITE_PATH', './weather.db')
+SQLITE_BUSY_TIMEOUT_MS: int = int(getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))  # Wait on another writer's lock
+MONGO_CATALOG_BACKENDS: list[str] = ['mongo', 'partitioned']  # Keep the catalog, alerts and baselines in MongoDB
+
+# Partition settings, where the partitioned backend spreads readings across MongoDB servers by sensor
+PARTITION_HOSTS: list[str] = [host for host in getenv('PARTITION_HOSTS', '').split(',') if host != '']  # host:port
+PARTITION_KEY: str = getenv('PARTITION_KEY', 'hash')  # hash of the sensor name, or state
+PARTITION_STATES: dict[str, int] = {  # Partition index of each state, like VA=0,MD=1, with other states hashed
+    state: int(partition) for state, partition in
+    (state_partition.split('=') for state_partition in getenv('PARTITION_STATES', '').split(',') if state_partition)
+}
+
+# Hot store settings, where each sensor's newest readings are kept in memory for short historical ranges
+HOT_STORE_HOURS: float = float(getenv('HOT_STORE_HOURS', '6'))  # 0 leaves the hot store off
+HOT_STORE_CAPACITY: int = int(getenv('HOT_STORE_CAPACITY', '512'))  # Readings kept per sensor and measurement
+
+# Sliding-window aggregate settings, where readings are summed into buckets that each window adds up
+AGGREGATE_WINDOW_MINUTES: list[int] = [1, 5, 15]
+AGGREGATE_BUCKET_SECONDS: int = int(getenv('AGGREGATE_BUCKET_SECONDS', '10'))  # Must divide a minute evenly
+
+# Sensor catalog settings
+SENSOR_COLLECTION: str = 'sensors'
+CATALOG_META_COLLECTION: str = 'catalog_meta'
+CATALOG_META_ID: str = 'sensors'
+GEO_RESULT_LIMIT: int = int(getenv('GEO_RESULT_LIMIT', '5000'))  # Most sensors returned for one area
+
+# Rollup settings
+ROLLUP_TIERS: dict[str, str] = {'hourly': 'hour', 'daily': 'day'}  # Collection suffix to $dateTrunc unit
+ROLLUP_TIER_SECONDS: dict[str, int] = {'hourly': 3600, 'daily': 86400}
+ROLLUP_WATERMARK_COLLECTION: str = 'rollup_watermarks'
+ROLLUP_INTERVAL_SECONDS: int = int(getenv('ROLLUP_INTERVAL_SECONDS', '60'))
+ROLLUP_LATENESS_SECONDS: int = int(getenv('ROLLUP_LATENESS_SECONDS', '3600'))
+NON_NUMERIC_MEASUREMENTS: list[str] = ['wind_dir']
+SKETCH_RELATIVE_ACCURACY: float = float(getenv('SKETCH_RELATIVE_ACCURACY', '0.01'))  # Percentile error of the sketches
+SKETCH_MIN_VALUE: float = float(getenv('SKETCH_MIN_VALUE', '0.001'))  # Readings closer to zero share one sketch bin
+
+# Spatial aggregation settings, where historical readings can be averaged per location instead of charted per sensor
+SPATIAL_LEVEL_FIELDS: dict[str, list[str]] = {  # Catalog fields that tell the locations of each level apart
+    'sensor': ['sensor_name'], 'city': ['city', 'county', 'state'], 'county': ['county', 'state'], 'state': ['state']
+}
+SPATIAL_ROLLUP_LEVEL: str = 'county'  # Rollups are also kept per county, which state views are added up from
+SPATIAL_BUCKET_SECONDS: int = int(getenv('SPATIAL_BUCKET_SECONDS', '60'))  # Raw time bucket, must divide a day evenly
+
+# Anomaly query settings
+ANOMALY_RESULT_LIMIT: int = int(getenv('ANOMALY_RESULT_LIMIT', '500'))  # Most recent violating readings per measurement
+
+# Alert rule settings
+ALERT_COLLECTION: str = 'alerts'
+ALERT_RULES_FILE: str = getenv('ALERT_RULES_FILE', '')
+ALERT_HYSTERESIS_FRACTION: float = float(getenv('ALERT_HYSTERESIS_FRACTION', '0.05'))  # Of the rule's range
+ALERT_RESULT_LIMIT: int = int(getenv('ALERT_RESULT_LIMIT', '500'))
+DEFAULT_ALERT_RULES: dict[str, dict[str, float]] = {
+    'humidity_perc': {'min': 0, 'max': 100},
+    'precip_mm': {'min': 0, 'max': 500},
+    'precip_in': {'min': 0, 'max': 20},
+    'pressure_mb': {'min': 0, 'max': 2000},
+    'pressure_in': {'min': 0, 'max': 60},
+    'temp_c': {'min': 0, 'max': 100},
+    'temp_f': {'min': 32, 'max': 212},
+    'uv_index_score': {'min': 0, 'max': 11},
+    'wind_kph': {'min': 0, 'max': 500},
+    'wind_mph': {'min': 0, 'max': 311}
+}
+
+# Statistical outlier detector settings
+DETECTOR_STATE_COLLECTION: str = 'detector_state'
+DETECTOR_ALPHA: float = float(getenv('DETECTOR_ALPHA', '0.05'))  # Weight of the newest reading in the EWMA
+DETECTOR_Z_THRESHOLD: float = float(getenv('DETECTOR_Z_THRESHOLD', '4.0'))
+DETECTOR_WARMUP_READINGS: int = int(getenv('DETECTOR_WARMUP_READINGS', '30'))
+DETECTOR_SNAPSHOT_SECONDS: int = int(getenv('DETECTOR_SNAPSHOT_SECONDS', '60'))
+DETECTOR_MIN_STDDEV: dict[str, float] = {  # Keeps near-constant series from flagging tiny changes
+    'humidity_perc': 2.0, 'precip_mm': 0.5, 'precip_in': 0.02, 'pressure_mb': 1.0, 'pressure_in': 0.03,
+    'temp_c': 0.5, 'temp_f': 1.0, 'uv_index_score': 0.5, 'wind_kph': 2.0, 'wind_mph': 1.0
+}
+
+# Ingest settings
+INGEST_MODE: str = getenv('INGEST_MODE', 'sync')  # sync, async (ack on enqueue) or durable (ack after flush)
+INGEST_QUEUE_SIZE: int = int(getenv('INGEST_QUEUE_SIZE', '20000'))  # Documents waiting across all collections
+INGEST_BATCH_SIZE: int = int(getenv('INGEST_BATCH_SIZE', '500'))
+INGEST_FLUSH_MS: int = int(getenv('INGEST_FLUSH_MS', '100'))
+INGEST_DURABLE_TIMEOUT_MS: int = int(getenv('INGEST_DURABLE_TIMEOUT_MS', '10000'))
+INGEST_WRITE_CONCERN: str = getenv('INGEST_WRITE_CONCERN', '1')  # 0, 1, any member count, or majority
+INGEST_JOURNAL: bool = getenv('INGEST_JOURNAL', 'false').lower() == 'true'
+
+# Streaming ingest settings
+STREAM_INGEST_PORT: int = int(getenv('STREAM_INGEST_PORT', '0'))  # 0 leaves the listener off
+STREAM_ACK_FRAMES: int = int(getenv('STREAM_ACK_FRAMES', '4'))
+STREAM_ACK_MS: int = int(getenv('STREAM_ACK_MS', '250'))
+STREAM_AUTH_TIMEOUT_SECONDS: int = int(getenv('STREAM_AUTH_TIMEOUT_SECONDS', '10'))
+STREAM_MAX_FRAME_BYTES: int = int(getenv('STREAM_MAX_FRAME_BYTES', str(16 * 1024 * 1024)))
+
+# Worker settings
+PROXY_PORT: int = 8079
+PROXY_WORKERS: int = int(getenv('PROXY_WORKERS', '1'))  # Processes sharing the listening socket
+CATALOG_REFRESH_SECONDS: int = int(getenv('CATALOG_REFRESH_SECONDS', '2'))
+METRICS_SNAPSHOT_DIR: str = getenv('METRICS_SNAPSHOT_DIR', '/tmp/proxy_metrics')
+METRICS_SNAPSHOT_SECONDS: int = int(getenv('METRICS_SNAPSHOT_SECONDS', '5'))
+
+# Admission control settings, where query pools stay below the thread count so ingest always has threads left
+WAITRESS_THREADS: int = int(getenv('WAITRESS_THREADS', '12'))
+ADMISSION_INGEST_CONCURRENCY: int = int(getenv('ADMISSION_INGEST_CONCURRENCY', str(WAITRESS_THREADS)))
+ADMISSION_QUERY_CONCURRENCY: int = int(getenv('ADMISSION_QUERY_CONCURRENCY', '6'))
+ADMISSION_HEAVY_CONCURRENCY: int = int(getenv('ADMISSION_HEAVY_CONCURRENCY', '2'))
+ADMISSION_WAIT_MS: int = int(getenv('ADMISSION_WAIT_MS', '50'))  # Wait for a free slot before turning a request away
+ADMISSION_HEAVY_COST: float = float(getenv('ADMISSION_HEAVY_COST', '1000000'))  # Estimated documents read
+ADMISSION_READING_INTERVAL_SECONDS: int = int(getenv('ADMISSION_READING_INTERVAL_SECONDS', '60'))  # Per sensor
+ADMISSION_RETRY_AFTER_SECONDS: int = int(getenv('ADMISSION_RETRY_AFTER_SECONDS', '2'))
+QUERY_MAX_TIME_MS: int = int(getenv('QUERY_MAX_TIME_MS', '5000'))
+HEAVY_QUERY_MAX_TIME_MS: int = int(getenv('HEAVY_QUERY_MAX_TIME_MS', '9000'))  # Under the web app's 10 second timeout
+
+# Request coalescing settings
+COALESCE_ENABLED: bool = getenv('COALESCE_ENABLED', 'true').lower() == 'true'  # Share identical concurrent queries
+COALESCE_WAIT_SECONDS: int = int(getenv('COALESCE_WAIT_SECONDS', '30'))  # Before a waiting request runs its own
+
+# Profiling settings
+PROFILE_ENABLED: bool = getenv('PROFILE_ENABLED', 'false').lower() == 'true'  # Honour the X-Profile header
+PROFILE_DIR: str = getenv('PROFILE_DIR', '')  # Write profiles here instead of into the response
+PROFILE_SAMPLE_MS: int = int(getenv('PROFILE_SAMPLE_MS', '5'))
+PROFILE_TOP_STACKS: int = int(getenv('PROFILE_TOP_STACKS', '20'))
+
+# Retention and archive settings, where a retention of 0 keeps readings forever
+RETENTION_SECONDS: dict[str, int] = {
+    measurement: int(getenv(f'RETENTION_SECONDS_{measurement.upper()}', getenv('RETENTION_SECONDS', '0')))
+    for measurement in ALL_MEASUREMENTS
+}
+ARCHIVE_DIR: str = getenv('ARCHIVE_DIR', '')  # Empty leaves the archiver off
+ARCHIVE_WATERMARK_COLLECTION: str = 'archive_watermarks'
+ARCHIVE_INTERVAL_SECONDS: int = int(getenv('ARCHIVE_INTERVAL_SECONDS', '3600'))
+ARCHIVE_ROW_GROUP_SIZE: int = int(getenv('ARCHIVE_ROW_GROUP_SIZE', '65536'))
+ARCHIVE_BOUNDARY_CACHE_SECONDS: int = int(getenv('ARCHIVE_BOUNDARY_CACHE_SECONDS', '60'))
+RESTORED_COLLECTION_PREFIX: str = 'restored_'
@@ -0,0 +1,74 @@
+from pymongo import MongoClient
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+from threading import Lock
+from .Constants import (DB_HOST, DB_PORT, DATA_GEN, HASHED_DATA_GEN_PASSWORD, WEB_VIEW, HASHED_WEB_VIEW_PASSWORD,
+                        DB_REPLICA_SET, DB_REPLICA_HOSTS, READ_PREFERENCE, READ_MAX_STALENESS_SECONDS)
+
+# Long-lived clients shared by background jobs, keyed by username
+app_shared_clients: dict[str, MongoClient] = {}
+app_shared_clients_lock: Lock = Lock()
+
+
+def get_mongo_address() -> str:
+    # Listing every member lets the client find the primary again after a failover
+    return DB_REPLICA_HOSTS if DB_REPLICA_SET != '' else f'{DB_HOST}:{DB_PORT}'
+
+
+def get_client_options(username: str) -> dict:
+    if DB_REPLICA_SET == '':
+        return {}
+
+    # Only web view reads may be served stale by a secondary, so ingest and background jobs see their own writes
+    client_options: dict = {'replicaSet': DB_REPLICA_SET}
+    if username == WEB_VIEW and READ_PREFERENCE != 'primary':
+        client_options['readPreference'] = READ_PREFERENCE
+        client_options['maxStalenessSeconds'] = READ_MAX_STALENESS_SECONDS
+
+    return client_options
+
+
+def get_shared_client(username: str, hashed_password: str) -> MongoClient:
+    # Create the client on first use and reuse its connection pool afterwards
+    with app_shared_clients_lock:
+        if username not in app_shared_clients:
+            conn_string: str = f'mongodb://{username}:{hashed_password}@{get_mongo_address()}/weather'
+            app_shared_clients[username] = MongoClient(
+                conn_string, connectTimeoutMS=3000, tz_aware=True, **get_client_options(username)
+            )
+
+        return app_shared_clients[username]
+
+
+def create_app_users(weather: Database) -> None:
+    # Create data gen user
+    try:
+        weather.command(
+            {'createUser': DATA_GEN, 'pwd': HASHED_DATA_GEN_PASSWORD, 'roles': [{'role': 'readWrite', 'db': 'weather'}]}
+        )
+    except OperationFailure:
+        print('Data Generation user already exists.')
+
+    # Create web view user
+    try:
+        weather.command(
+            {'createUser': WEB_VIEW, 'pwd': HASHED_WEB_VIEW_PASSWORD, 'roles': [{'role': 'read', 'db': 'weather'}]}
+        )
+    except OperationFailure:
+        print('Web View user already exists.')
+
+
+def close_shared_clients() -> None:
+    # Clients are not fork-safe, so the parent closes its own before forking and each worker opens new ones on first use
+    with app_shared_clients_lock:
+        for shared_client in app_shared_clients.values():
+            shared_client.close()
+        app_shared_clients.clear()
+
+
+def get_data_gen_client() -> MongoClient:
+    return get_shared_client(DATA_GEN, HASHED_DATA_GEN_PASSWORD)
+
+
+def get_web_view_client() -> MongoClient:
+    return get_shared_client(WEB_VIEW, HASHED_WEB_VIEW_PASSWORD)
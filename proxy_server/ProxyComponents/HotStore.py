@@ -0,0 +1,158 @@
+import numpy as np
+from threading import Lock
+from datetime import datetime, timedelta, UTC
+from typing import Union
+from .Constants import STORED_MEASUREMENTS, NON_NUMERIC_MEASUREMENTS, HOT_STORE_HOURS, HOT_STORE_CAPACITY, PROXY_WORKERS
+from .Metrics import increment_counter
+from .SensorCatalog import get_sensor_location
+from .Storage import get_storage
+from .Units import get_stored_measurement, get_conversion
+
+# Each worker only sees the readings sent to it, so the hot store is only complete with a single worker
+HOT_STORE_ENABLED: bool = HOT_STORE_HOURS > 0 and PROXY_WORKERS == 1
+EMPTY_SLOT: int = int(np.iinfo(np.int64).min)  # Time of a slot no reading has been written to yet
+INITIAL_SENSOR_ROWS: int = 64
+
+
+class HotBuffer:
+    # Newest readings of one measurement, as a fixed-size ring of times and values for each sensor's row
+    def __init__(self) -> None:
+        self.lock: Lock = Lock()
+        self.times: np.ndarray = np.full((INITIAL_SENSOR_ROWS, HOT_STORE_CAPACITY), EMPTY_SLOT, dtype=np.int64)
+        self.values: np.ndarray = np.zeros((INITIAL_SENSOR_ROWS, HOT_STORE_CAPACITY), dtype=np.float64)
+        self.next_slots: np.ndarray = np.zeros(INITIAL_SENSOR_ROWS, dtype=np.int64)
+        self.evicted_until: np.ndarray = np.full(INITIAL_SENSOR_ROWS, EMPTY_SLOT, dtype=np.int64)
+        self.sensor_rows: dict[str, int] = {}
+        self.sensor_names: list[str] = []
+
+
+# One buffer per stored numeric measurement, holding every reading since the store was warmed
+app_hot_buffers: dict[str, HotBuffer] = {
+    measurement: HotBuffer() for measurement in STORED_MEASUREMENTS if measurement not in NON_NUMERIC_MEASUREMENTS
+} if HOT_STORE_ENABLED else {}
+app_hot_store_since: Union[datetime, None] = None
+
+
+def get_timestamp_ms(date_time: datetime) -> int:
+    if date_time.tzinfo is None:
+        date_time = date_time.replace(tzinfo=UTC)
+
+    return int(date_time.timestamp() * 1000)
+
+
+def get_sensor_row(hot_buffer: HotBuffer, sensor_name: str) -> int:
+    sensor_row: Union[int, None] = hot_buffer.sensor_rows.get(sensor_name, None)
+    if sensor_row is not None:
+        return sensor_row
+
+    # Double the rows once every one is taken, which keeps copying rare as sensors are added
+    sensor_row = len(hot_buffer.sensor_names)
+    if sensor_row == hot_buffer.times.shape[0]:
+        added_rows: int = hot_buffer.times.shape[0]
+        hot_buffer.times = np.vstack(
+            [hot_buffer.times, np.full((added_rows, HOT_STORE_CAPACITY), EMPTY_SLOT, dtype=np.int64)]
+        )
+        hot_buffer.values = np.vstack([hot_buffer.values, np.zeros((added_rows, HOT_STORE_CAPACITY), dtype=np.float64)])
+        hot_buffer.next_slots = np.concatenate([hot_buffer.next_slots, np.zeros(added_rows, dtype=np.int64)])
+        hot_buffer.evicted_until = np.concatenate(
+            [hot_buffer.evicted_until, np.full(added_rows, EMPTY_SLOT, dtype=np.int64)]
+        )
+
+    hot_buffer.sensor_rows[sensor_name] = sensor_row
+    hot_buffer.sensor_names.append(sensor_name)
+    return sensor_row
+
+
+def add_hot_readings(measurement: str, documents: list[dict]) -> None:
+    hot_buffer: Union[HotBuffer, None] = app_hot_buffers.get(measurement, None)
+    if hot_buffer is None:
+        return
+
+    with hot_buffer.lock:
+        for document in documents:
+            sensor_row: int = get_sensor_row(hot_buffer, document['sensor_name'])
+            time_recorded: int = get_timestamp_ms(document['time_recorded'])
+
+            # Readings the buffer cannot hold leave their time to storage, like overwritten ones
+            if not isinstance(document['metric'], (int, float)):
+                hot_buffer.evicted_until[sensor_row] = max(hot_buffer.evicted_until[sensor_row], time_recorded)
+                continue
+
+            # Overwriting the oldest reading means the ring no longer holds everything from that time on
+            slot: int = int(hot_buffer.next_slots[sensor_row])
+            hot_buffer.evicted_until[sensor_row] = max(
+                hot_buffer.evicted_until[sensor_row], hot_buffer.times[sensor_row, slot]
+            )
+            hot_buffer.times[sensor_row, slot] = time_recorded
+            hot_buffer.values[sensor_row, slot] = document['metric']
+            hot_buffer.next_slots[sensor_row] = (slot + 1) % HOT_STORE_CAPACITY
+
+
+def warm_hot_store() -> None:
+    global app_hot_store_since
+
+    if not HOT_STORE_ENABLED:
+        return
+
+    # Load the readings still inside the window, including any stamped ahead of the clock, oldest first
+    warm_start: datetime = datetime.now(UTC) - timedelta(hours=HOT_STORE_HOURS)
+    warm_end: datetime = datetime.max.replace(tzinfo=UTC)
+    reading_count: int = 0
+    for measurement in app_hot_buffers.keys():
+        readings: list[dict] = get_storage().get_raw_readings(measurement, None, warm_start, warm_end, ['sensor_name'])
+        add_hot_readings(measurement, readings[::-1])
+        reading_count += len(readings)
+
+    # Ingest keeps the buffers complete from here on
+    app_hot_store_since = warm_start
+    print(f'Hot store loaded with {reading_count} readings from the last {HOT_STORE_HOURS} hours.')
+
+
+def get_hot_readings(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                     end_date_time: datetime) -> Union[list[dict], None]:
+    # Only ranges that start inside the window are served, so older readings still come from storage
+    hot_buffer: Union[HotBuffer, None] = app_hot_buffers.get(get_stored_measurement(measurement), None)
+    if hot_buffer is None or app_hot_store_since is None:
+        return None
+
+    window_start: datetime = max(app_hot_store_since, datetime.now(UTC) - timedelta(hours=HOT_STORE_HOURS))
+    if start_date_time < window_start:
+        increment_counter('proxy_cache_requests_total', (('cache', 'hot_store'), ('result', 'miss')))
+        return None
+
+    start_ms: int = get_timestamp_ms(start_date_time)
+    end_ms: int = get_timestamp_ms(end_date_time)
+    with hot_buffer.lock:
+        if selected_sensors is None:
+            sensor_rows: np.ndarray = np.arange(len(hot_buffer.sensor_names), dtype=np.int64)
+        else:
+            sensor_rows: np.ndarray = np.array([
+                hot_buffer.sensor_rows[sensor_name] for sensor_name in set(selected_sensors)
+                if sensor_name in hot_buffer.sensor_rows
+            ], dtype=np.int64)
+
+        # A ring that overwrote a reading inside the range no longer holds all of its readings
+        if len(sensor_rows) > 0 and hot_buffer.evicted_until[sensor_rows].max() >= start_ms:
+            increment_counter('proxy_cache_requests_total', (('cache', 'hot_store'), ('result', 'miss')))
+            return None
+
+        # Pick every slot in the range across all the sensors' rings at once
+        row_times: np.ndarray = hot_buffer.times[sensor_rows]
+        range_rows, range_slots = np.nonzero((row_times >= start_ms) & (row_times <= end_ms))
+        range_times: np.ndarray = row_times[range_rows, range_slots]
+        range_values: np.ndarray = hot_buffer.values[sensor_rows[range_rows], range_slots]
+        row_sensor_names: list[str] = [hot_buffer.sensor_names[sensor_row] for sensor_row in sensor_rows.tolist()]
+
+    increment_counter('proxy_cache_requests_total', (('cache', 'hot_store'), ('result', 'hit')))
+
+    # Newest first in the requested unit, like the storage backends return raw readings
+    newest_first: np.ndarray = np.argsort(-range_times, kind='stable')
+    scale, offset = get_conversion(measurement)
+    metric_values: list[float] = (range_values[newest_first] * scale + offset).tolist()
+    time_values: list[datetime] = range_times[newest_first].astype('datetime64[ms]').astype(datetime).tolist()
+    row_locations: list[dict] = [get_sensor_location(sensor_name) for sensor_name in row_sensor_names]
+    reading_rows: list[int] = range_rows[newest_first].tolist()
+    return [
+        {**row_locations[reading_row], 'time_recorded': time_recorded, 'metric': metric_value}
+        for reading_row, time_recorded, metric_value in zip(reading_rows, time_values, metric_values)
+    ]
@@ -0,0 +1,26 @@
+from msgpack import unpackb
+from datetime import datetime, UTC
+from .SensorCatalog import SENSOR_FIELDS
+
+# Content type of a MessagePack reading batch
+MSGPACK_CONTENT_TYPE: str = 'application/msgpack'
+
+
+def decode_reading_batch(payload: bytes) -> dict[str, list[dict]]:
+    # A batch is a map with a sensor table in SENSOR_FIELDS order, the measurement names, and reading rows of
+    # [sensor index, epoch seconds, [one value per measurement or None]]
+    batch: dict = unpackb(payload)
+    sensors: list[dict] = [dict(zip(SENSOR_FIELDS, sensor_row, strict=True)) for sensor_row in batch['sensors']]
+    measurements: list[str] = batch['measurements']
+
+    # Expand each row into one document per measurement, the same shape the form endpoint stores
+    batch_documents: dict[str, list[dict]] = {measurement: [] for measurement in measurements}
+    for sensor_index, epoch_seconds, values in batch['readings']:
+        time_recorded: datetime = datetime.fromtimestamp(epoch_seconds, UTC)
+        sensor: dict = sensors[sensor_index]
+        for measurement, value in zip(measurements, values, strict=True):
+            if value is None:
+                continue
+            batch_documents[measurement].append({**sensor, 'time_recorded': time_recorded, 'metric': value})
+
+    return batch_documents
@@ -0,0 +1,225 @@
+from pymongo.errors import OperationFailure, ConnectionFailure, BulkWriteError
+from sqlite3 import Error as SQLiteError
+from threading import Thread, Condition, Event, BoundedSemaphore
+from collections import deque
+from typing import Union
+from .Constants import (ALL_MEASUREMENTS, STORED_MEASUREMENTS, INGEST_MODE, INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE,
+                        INGEST_FLUSH_MS, INGEST_DURABLE_TIMEOUT_MS, DOCUMENT_MODE, LEAN_DOCUMENT_FIELDS,
+                        STORAGE_BACKEND, MONGO_CATALOG_BACKENDS)
+from .DatabaseClients import get_data_gen_client
+from .Metrics import increment_counter
+from .SensorCatalog import register_sensor
+from .Storage import get_storage
+from .HotStore import add_hot_readings
+from .WindowAggregates import add_window_readings
+from .AlertRules import evaluate_alert_rules
+from .OutlierDetector import update_outlier_detector
+from .Workers import is_leader, send_to_leader
+
+# Fields every measurement document needs before it is accepted
+REQUIRED_DOCUMENT_FIELDS: list[str] = ['sensor_name', 'time_recorded', 'metric']
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class IngestTimeout(Exception):
+    pass
+
+
+class FlushTicket:
+    # Lets a durable request wait until the batch holding its document has been written
+    def __init__(self) -> None:
+        self.flushed: Event = Event()
+        self.error: Union[Exception, None] = None
+
+
+# Pending documents per collection, bounded across all collections by the semaphore
+app_ingest_capacity: BoundedSemaphore = BoundedSemaphore(INGEST_QUEUE_SIZE)
+app_ingest_queues: dict[str, deque] = {measurement: deque() for measurement in ALL_MEASUREMENTS}
+app_ingest_conditions: dict[str, Condition] = {measurement: Condition() for measurement in ALL_MEASUREMENTS}
+
+
+def validate_document(collection: str, document: dict) -> None:
+    if collection not in ALL_MEASUREMENTS:
+        raise KeyError(f'Collection {collection} is not a measurement collection.')
+
+    for field in REQUIRED_DOCUMENT_FIELDS:
+        if field not in document:
+            raise KeyError(field)
+
+
+def get_stored_document(document: dict) -> dict:
+    # Lean documents leave the sensor's location to the sensor catalog, while the caller keeps the full document
+    if DOCUMENT_MODE != 'lean':
+        return document
+
+    return {field: document[field] for field in LEAN_DOCUMENT_FIELDS}
+
+
+def enqueue_documents(collection: str, documents: list[dict]) -> list[FlushTicket]:
+    # Reserve room for every document so a batch is queued entirely or not at all
+    reserved_count: int = 0
+    while reserved_count < len(documents) and app_ingest_capacity.acquire(blocking=False):
+        reserved_count += 1
+
+    # Refuse new documents instead of growing without bound when MongoDB falls behind
+    if reserved_count < len(documents):
+        for _ in range(reserved_count):
+            app_ingest_capacity.release()
+        increment_counter('proxy_ingest_rejected_total', (('reason', 'queue_full'),), len(documents))
+        raise IngestQueueFull(f'Ingest queue is holding {INGEST_QUEUE_SIZE} documents.')
+
+    flush_tickets: list[FlushTicket] = []
+    ingest_condition: Condition = app_ingest_conditions[collection]
+    with ingest_condition:
+        for document in documents:
+            flush_ticket: Union[FlushTicket, None] = FlushTicket() if INGEST_MODE == 'durable' else None
+            app_ingest_queues[collection].append((document, flush_ticket))
+            if flush_ticket is not None:
+                flush_tickets.append(flush_ticket)
+
+        # Only wake the flusher early once a full batch is waiting
+        if len(app_ingest_queues[collection]) >= INGEST_BATCH_SIZE:
+            ingest_condition.notify()
+
+    increment_counter('proxy_ingest_queue_depth', amount=len(documents))
+    return flush_tickets
+
+
+def wait_for_flush(flush_ticket: FlushTicket) -> None:
+    if not flush_ticket.flushed.wait(INGEST_DURABLE_TIMEOUT_MS / 1000):
+        raise IngestTimeout(f'Document was not written within {INGEST_DURABLE_TIMEOUT_MS} milliseconds.')
+
+    if flush_ticket.error is not None:
+        raise flush_ticket.error
+
+
+def insert_documents(collection: str, documents: list[dict]) -> list[str]:
+    stored_documents: list[dict] = [get_stored_document(document) for document in documents]
+
+    # Write immediately in sync mode, otherwise hand the documents to the flusher
+    if INGEST_MODE == 'sync':
+        inserted_ids: list[str] = get_storage().insert_readings(collection, stored_documents)
+        increment_counter('proxy_documents_inserted_total', (('collection', collection),), len(documents))
+        add_hot_readings(collection, documents)
+        add_window_readings(collection, documents)
+        return inserted_ids
+
+    for flush_ticket in enqueue_documents(collection, stored_documents):
+        wait_for_flush(flush_ticket)
+
+    add_hot_readings(collection, documents)
+    add_window_readings(collection, documents)
+    return []
+
+
+def insert_document(collection: str, document: dict) -> Union[str, None]:
+    inserted_ids: list[str] = insert_documents(collection, [document])
+    return inserted_ids[0] if len(inserted_ids) > 0 else None
+
+
+def validate_batch(batch_documents: dict[str, list[dict]]) -> None:
+    for collection, documents in batch_documents.items():
+        for document in documents:
+            validate_document(collection, document)
+
+
+def check_new_reading(collection: str, document: dict) -> None:
+    # Open alerts and baselines live in the leader, so the other workers send it the fields the checks read
+    if not is_leader():
+        send_to_leader({'collection': collection, 'document': {
+            field: document[field] for field in ['sensor_name', 'time_recorded', 'metric', 'city', 'county']
+            if field in document
+        }})
+        return
+
+    evaluate_alert_rules(get_data_gen_client(), collection, document)
+    update_outlier_detector(get_data_gen_client(), collection, document)
+
+
+def check_forwarded_reading(message: dict) -> None:
+    try:
+        check_new_reading(message['collection'], message['document'])
+    except (OperationFailure, ConnectionFailure) as e:
+        print(f'Alert rule evaluation for {message["document"]["sensor_name"]} failed. Reason: {e}')
+
+
+def process_new_readings(batch_documents: dict[str, list[dict]]) -> None:
+    # Register new sensors and check each reading against the alert rules and its baseline, which live in MongoDB
+    try:
+        for collection, documents in batch_documents.items():
+            for document in documents:
+                register_sensor(document)
+                if STORAGE_BACKEND in MONGO_CATALOG_BACKENDS:
+                    check_new_reading(collection, document)
+    except (OperationFailure, SQLiteError) as e:
+        print(f'Post-insert processing of a batch failed. Reason: {e}')
+
+
+def flush_collection(collection: str, batch: list[tuple[dict, Union[FlushTicket, None]]]) -> None:
+    flush_error: Union[Exception, None] = None
+    try:
+        get_storage().insert_readings(collection, [document for document, _ in batch])
+        increment_counter('proxy_documents_inserted_total', (('collection', collection),), len(batch))
+    except (BulkWriteError, OperationFailure, ConnectionFailure, SQLiteError) as e:
+        print(f'Flushing {len(batch)} documents into {collection} failed. Reason: {e}')
+        increment_counter('proxy_ingest_flush_failures_total', (('collection', collection),))
+        flush_error = e
+
+    # Free the queue space and release any durable requests waiting on this batch
+    for _, flush_ticket in batch:
+        app_ingest_capacity.release()
+        if flush_ticket is not None:
+            flush_ticket.error = flush_error
+            flush_ticket.flushed.set()
+
+    increment_counter('proxy_ingest_queue_depth', amount=-len(batch))
+    increment_counter('proxy_ingest_flushes_total', (('collection', collection),))
+
+
+def run_ingest_flusher(collection: str) -> None:
+    ingest_queue: deque = app_ingest_queues[collection]
+    ingest_condition: Condition = app_ingest_conditions[collection]
+
+    while True:
+        # Flush when a full batch is waiting or when the flush interval runs out, whichever comes first
+        with ingest_condition:
+            ingest_condition.wait_for(lambda: len(ingest_queue) >= INGEST_BATCH_SIZE, timeout=INGEST_FLUSH_MS / 1000)
+            batch: list = [ingest_queue.popleft() for _ in range(min(len(ingest_queue), INGEST_BATCH_SIZE))]
+
+        if len(batch) > 0:
+            flush_collection(collection, batch)
+
+
+def drain_ingest_queues() -> None:
+    if INGEST_MODE == 'sync':
+        return
+
+    # Write everything still queued before the process stops, since async requests were already acknowledged
+    drained_count: int = 0
+    for measurement in STORED_MEASUREMENTS:
+        ingest_queue: deque = app_ingest_queues[measurement]
+        while len(ingest_queue) > 0:
+            with app_ingest_conditions[measurement]:
+                batch: list = [ingest_queue.popleft() for _ in range(min(len(ingest_queue), INGEST_BATCH_SIZE))]
+
+            if len(batch) > 0:
+                flush_collection(measurement, batch)
+                drained_count += len(batch)
+
+    print(f'Flushed {drained_count} queued documents before stopping.')
+
+
+def start_ingest_flushers() -> None:
+    if INGEST_MODE == 'sync':
+        return
+
+    for measurement in STORED_MEASUREMENTS:
+        flusher_thread: Thread = Thread(
+            target=run_ingest_flusher, args=(measurement,), name=f'ingest-flusher-{measurement}', daemon=True
+        )
+        flusher_thread.start()
+
+    print(f'Started {len(STORED_MEASUREMENTS)} ingest flushers in {INGEST_MODE} mode.')
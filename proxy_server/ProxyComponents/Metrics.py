@@ -0,0 +1,271 @@
+from pymongo import monitoring
+from threading import Thread, Lock, local
+from bisect import bisect_left
+from os import getpid, listdir, remove, replace
+from os.path import join
+from json import dump as json_dump, load as json_load
+from time import sleep
+from typing import Union
+from .Constants import PROXY_WORKERS, METRICS_SNAPSHOT_DIR, METRICS_SNAPSHOT_SECONDS
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS: list[float] = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Type and description of every metric the proxy exposes
+METRIC_DEFINITIONS: dict[str, tuple[str, str]] = {
+    'proxy_requests_total': ('counter', 'Requests handled by route, purpose and status code.'),
+    'proxy_request_duration_seconds': ('histogram', 'Request latency by route and purpose.'),
+    'proxy_requests_in_flight': ('gauge', 'Requests currently being handled.'),
+    'proxy_mongo_command_duration_seconds': ('histogram', 'MongoDB round-trip time by command and collection.'),
+    'proxy_mongo_command_failures_total': ('counter', 'Failed MongoDB commands by command and collection.'),
+    'proxy_documents_inserted_total': ('counter', 'Documents inserted by collection.'),
+    'proxy_cache_requests_total': ('counter', 'Cache lookups by cache and result.'),
+    'proxy_sensor_registry_size': ('gauge', 'Sensors in the local sensor registry.'),
+    'proxy_sensor_catalog_version': ('gauge', 'Current version of the sensor catalog.'),
+    'proxy_alerts_total': ('counter', 'Alerts raised and cleared by measurement and rule.'),
+    'proxy_ingest_queue_depth': ('gauge', 'Documents waiting in the ingest queue.'),
+    'proxy_ingest_flushes_total': ('counter', 'Batches flushed from the ingest queue by collection.'),
+    'proxy_ingest_flush_failures_total': ('counter', 'Ingest queue batches that failed to insert by collection.'),
+    'proxy_ingest_rejected_total': ('counter', 'Documents refused by the ingest queue by reason.'),
+    'proxy_stream_connections': ('gauge', 'Open streaming ingest connections.'),
+    'proxy_stream_frames_total': ('counter', 'Streaming ingest frames by result.'),
+    'proxy_admission_rejected_total': ('counter', 'Requests turned away because their pool was full, by pool.'),
+    'proxy_admission_in_use': ('gauge', 'Requests holding a slot, by pool.'),
+    'proxy_coalesced_requests_total': ('counter', 'Web app queries that ran or waited on a shared run, by purpose.'),
+    'proxy_partition_documents_total': ('counter', 'Documents inserted by partition of the partitioned storage.'),
+    'proxy_leader_messages_dropped_total': ('counter', 'Messages to the leader worker dropped with its pipe full.'),
+    'proxy_mongo_reads_total': ('counter', 'MongoDB read commands by the server that answered and its role.'),
+}
+
+# Each thread records into its own shard so the hot path never takes a lock
+app_metric_shards: list[dict] = []
+app_metric_shards_lock: Lock = Lock()
+app_metric_local: local = local()
+
+# MongoDB commands that have started but not finished, keyed by request and connection
+app_pending_commands: dict[tuple, tuple[str, str]] = {}
+
+# Commands counted as reads, and the role of each MongoDB server the clients have seen, keyed by address
+READ_COMMANDS: list[str] = ['find', 'aggregate', 'getMore', 'count', 'distinct']
+SERVER_ROLES: dict[str, str] = {'RSPrimary': 'primary', 'RSSecondary': 'secondary', 'Standalone': 'standalone'}
+app_server_roles: dict[tuple[str, int], str] = {}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def get_metric_shard() -> dict:
+    metric_shard: Union[dict, None] = getattr(app_metric_local, 'shard', None)
+    if metric_shard is None:
+        # Only the first metric recorded by a thread registers its shard
+        metric_shard = {'counters': {}, 'histograms': {}}
+        with app_metric_shards_lock:
+            app_metric_shards.append(metric_shard)
+        app_metric_local.shard = metric_shard
+
+    return metric_shard
+
+
+def increment_counter(name: str, labels: Labels = (), amount: float = 1.0) -> None:
+    counters: dict = get_metric_shard()['counters']
+    counters[(name, labels)] = counters.get((name, labels), 0.0) + amount
+
+
+def observe_histogram(name: str, labels: Labels, value: float) -> None:
+    histograms: dict = get_metric_shard()['histograms']
+    histogram: Union[list, None] = histograms.get((name, labels), None)
+    if histogram is None:
+        # Bucket counts followed by the running sum and count
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+        histograms[(name, labels)] = histogram
+
+    histogram[bisect_left(LATENCY_BUCKETS, value)] += 1
+    histogram[-2] += value
+    histogram[-1] += 1
+
+
+def add_metric_values(counters: dict, histograms: dict, new_counters: dict, new_histograms: dict) -> None:
+    for key, value in new_counters.items():
+        counters[key] = counters.get(key, 0.0) + value
+    for key, histogram in new_histograms.items():
+        histogram = list(histogram)
+        if key in histograms:
+            histograms[key] = [total + value for total, value in zip(histograms[key], histogram)]
+        else:
+            histograms[key] = histogram
+
+
+def collect_metrics() -> tuple[dict, dict]:
+    # Copy every shard, which is atomic for plain dictionaries, then add them together
+    with app_metric_shards_lock:
+        metric_shards: list[dict] = list(app_metric_shards)
+
+    counters: dict = {}
+    histograms: dict = {}
+    for metric_shard in metric_shards:
+        add_metric_values(counters, histograms, dict(metric_shard['counters']), dict(metric_shard['histograms']))
+
+    return counters, histograms
+
+
+def clear_metrics() -> None:
+    # A new worker starts from zero instead of repeating what the parent process recorded before forking
+    with app_metric_shards_lock:
+        for metric_shard in app_metric_shards:
+            metric_shard['counters'].clear()
+            metric_shard['histograms'].clear()
+
+
+def write_metric_snapshot() -> None:
+    counters, histograms = collect_metrics()
+    snapshot: dict = {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, histogram] for (name, labels), histogram in histograms.items()]
+    }
+
+    # Replace the file in one step so readers never see half a snapshot
+    snapshot_path: str = join(METRICS_SNAPSHOT_DIR, f'{getpid()}.json')
+    with open(f'{snapshot_path}.tmp', 'w') as snapshot_file:
+        json_dump(snapshot, snapshot_file)
+    replace(f'{snapshot_path}.tmp', snapshot_path)
+
+
+def add_metric_snapshots(counters: dict, histograms: dict) -> None:
+    # Add the latest snapshot of every other worker to this worker's live metrics
+    own_snapshot: str = f'{getpid()}.json'
+    for snapshot_name in listdir(METRICS_SNAPSHOT_DIR):
+        if not snapshot_name.endswith('.json') or snapshot_name == own_snapshot:
+            continue
+
+        try:
+            with open(join(METRICS_SNAPSHOT_DIR, snapshot_name)) as snapshot_file:
+                snapshot: dict = json_load(snapshot_file)
+        except (FileNotFoundError, ValueError):  # The worker stopped or is replacing its file
+            continue
+
+        add_metric_values(
+            counters, histograms,
+            {(name, tuple(map(tuple, labels))): value for name, labels, value in snapshot['counters']},
+            {(name, tuple(map(tuple, labels))): histogram for name, labels, histogram in snapshot['histograms']}
+        )
+
+
+def remove_metric_snapshot(pid: int) -> None:
+    try:
+        remove(join(METRICS_SNAPSHOT_DIR, f'{pid}.json'))
+    except FileNotFoundError:
+        pass
+
+
+def run_metric_snapshots() -> None:
+    while True:
+        sleep(METRICS_SNAPSHOT_SECONDS)
+        write_metric_snapshot()
+
+
+def start_metric_snapshots() -> None:
+    # A single worker already sees all of its own metrics
+    if PROXY_WORKERS == 1:
+        return
+
+    snapshot_thread: Thread = Thread(target=run_metric_snapshots, name='metric-snapshots', daemon=True)
+    snapshot_thread.start()
+
+
+def format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ''
+
+    escaped_labels: list[str] = []
+    for label_name, label_value in labels:
+        label_value = str(label_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped_labels.append(f'{label_name}="{label_value}"')
+
+    return '{' + ','.join(escaped_labels) + '}'
+
+
+def render_metrics(gauges: dict[str, float]) -> str:
+    counters, histograms = collect_metrics()
+    if PROXY_WORKERS > 1:
+        add_metric_snapshots(counters, histograms)
+
+    # Group every series under its metric name
+    series_by_name: dict[str, list[str]] = {name: [] for name in METRIC_DEFINITIONS.keys()}
+    for (name, labels), value in sorted(counters.items()):
+        series_by_name.setdefault(name, []).append(f'{name}{format_labels(labels)} {value}')
+    for name, value in gauges.items():
+        series_by_name.setdefault(name, []).append(f'{name} {value}')
+    for (name, labels), histogram in sorted(histograms.items()):
+        # Histogram buckets are cumulative in the exposition format
+        cumulative_count: int = 0
+        for bucket_bound, bucket_count in zip(LATENCY_BUCKETS + ['+Inf'], histogram[:-2]):
+            cumulative_count += bucket_count
+            bucket_labels: Labels = labels + (('le', str(bucket_bound)),)
+            series_by_name[name].append(f'{name}_bucket{format_labels(bucket_labels)} {cumulative_count}')
+        series_by_name[name].append(f'{name}_sum{format_labels(labels)} {histogram[-2]}')
+        series_by_name[name].append(f'{name}_count{format_labels(labels)} {histogram[-1]}')
+
+    # Write the help and type lines ahead of each metric's series
+    exposition_lines: list[str] = []
+    for name, series in series_by_name.items():
+        if len(series) == 0:
+            continue
+        if name in METRIC_DEFINITIONS:
+            metric_type, metric_help = METRIC_DEFINITIONS[name]
+            exposition_lines.append(f'# HELP {name} {metric_help}')
+            exposition_lines.append(f'# TYPE {name} {metric_type}')
+        exposition_lines.extend(series)
+
+    return '\n'.join(exposition_lines) + '\n'
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        # Most commands name their collection as the value of the command itself
+        collection_name: Union[str, int] = event.command.get(event.command_name, '')
+        if not isinstance(collection_name, str):
+            collection_name = ''
+
+        app_pending_commands[(event.request_id, event.connection_id)] = (event.command_name, collection_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        command_name, collection_name = app_pending_commands.pop(
+            (event.request_id, event.connection_id), (event.command_name, '')
+        )
+        observe_histogram(
+            'proxy_mongo_command_duration_seconds', (('command', command_name), ('collection', collection_name)),
+            event.duration_micros / 1e6
+        )
+
+        # Count reads by the server that answered them, which shows how much of the load secondaries take
+        if command_name in READ_COMMANDS:
+            server_host, server_port = event.connection_id
+            increment_counter('proxy_mongo_reads_total', (
+                ('server', f'{server_host}:{server_port}'), ('role', app_server_roles.get(event.connection_id, 'other'))
+            ))
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        command_name, collection_name = app_pending_commands.pop(
+            (event.request_id, event.connection_id), (event.command_name, '')
+        )
+        increment_counter(
+            'proxy_mongo_command_failures_total', (('command', command_name), ('collection', collection_name))
+        )
+
+
+class MongoServerRoles(monitoring.ServerListener):
+    def opened(self, event: monitoring.ServerOpeningEvent) -> None:
+        pass
+
+    def description_changed(self, event: monitoring.ServerDescriptionChangedEvent) -> None:
+        # A server's role changes when the replica set elects a new primary
+        app_server_roles[event.server_address] = SERVER_ROLES.get(event.new_description.server_type_name, 'other')
+
+    def closed(self, event: monitoring.ServerClosedEvent) -> None:
+        # Keep the role, since other clients can still be using the server
+        pass
+
+
+def register_mongo_metrics() -> None:
+    # Applies to every client created after registration
+    monitoring.register(MongoCommandMetrics())
+    monitoring.register(MongoServerRoles())
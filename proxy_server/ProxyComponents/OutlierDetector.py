@@ -0,0 +1,164 @@
+from pymongo import MongoClient, UpdateOne
+from pymongo.database import Database
+from pymongo.errors import OperationFailure, ConnectionFailure
+from threading import Thread, Lock
+from time import sleep
+from math import sqrt, isfinite
+from typing import Union
+from .Constants import (DETECTOR_STATE_COLLECTION, DETECTOR_ALPHA, DETECTOR_Z_THRESHOLD, DETECTOR_WARMUP_READINGS,
+                        DETECTOR_SNAPSHOT_SECONDS, DETECTOR_MIN_STDDEV)
+from .DatabaseClients import get_data_gen_client
+from .Units import get_stored_measurement, get_conversion
+from .AlertRules import app_open_alerts, app_open_alerts_lock, raise_alert, extend_alert, clear_alert
+
+# Exponentially weighted mean and variance per sensor and measurement, stored as [mean, variance, count, last z-score]
+app_detector_state: dict[tuple[str, str], list[float]] = {}
+app_detector_dirty: set[tuple[str, str]] = set()
+app_detector_lock: Lock = Lock()
+
+
+def load_detector_state(weather: Database) -> int:
+    # Replace the local baselines with the saved ones
+    saved_states: list[dict] = weather[DETECTOR_STATE_COLLECTION].find().to_list()
+    with app_detector_lock:
+        app_detector_state.clear()
+        app_detector_dirty.clear()
+        for saved_state in saved_states:
+            app_detector_state[(saved_state['sensor_name'], saved_state['measurement'])] = [
+                saved_state['mean'], saved_state['variance'], saved_state['count'], saved_state['last_z_score']
+            ]
+
+    return len(saved_states)
+
+
+def warm_detector_state(weather: Database) -> None:
+    # Pick up the baselines saved before the proxy last stopped
+    print(f'Loaded outlier detector state for {load_detector_state(weather)} series.')
+
+
+def update_outlier_detector(client: MongoClient, measurement: str, document: dict) -> None:
+    # Only measurements with a known noise floor are tracked, which leaves out wind direction and degrees
+    if measurement not in DETECTOR_MIN_STDDEV:
+        return
+
+    # A single NaN or infinite reading would leave the baseline NaN for good
+    value: float = document['metric']
+    if not isinstance(value, (int, float)) or not isfinite(value):
+        return
+
+    state_key: tuple[str, str] = (document['sensor_name'], measurement)
+    with app_detector_lock:
+        series_state: Union[list[float], None] = app_detector_state.get(state_key, None)
+        if series_state is None:
+            series_state = [value, 0.0, 0, 0.0]
+            app_detector_state[state_key] = series_state
+
+        # Score the reading against the baseline from before it arrived
+        mean, variance, count, _ = series_state
+        stddev: float = max(sqrt(variance), DETECTOR_MIN_STDDEV[measurement])
+        z_score: float = (value - mean) / stddev
+
+        # Fold the reading into the baseline
+        difference: float = value - mean
+        increment: float = DETECTOR_ALPHA * difference
+        series_state[0] = mean + increment
+        series_state[1] = (1 - DETECTOR_ALPHA) * (variance + difference * increment)
+        series_state[2] = count + 1
+        series_state[3] = z_score
+        app_detector_dirty.add(state_key)
+
+    # Raise one alert per run of outlying readings, clearing once readings are back near the baseline
+    is_outlier: bool = count >= DETECTOR_WARMUP_READINGS and abs(z_score) > DETECTOR_Z_THRESHOLD
+    alert_key: tuple[str, str, str] = (document['sensor_name'], measurement, 'ewma')
+    open_alert: Union[dict, None] = app_open_alerts.get(alert_key, None)
+    if open_alert is None and not is_outlier:
+        return
+
+    with app_open_alerts_lock:
+        open_alert = app_open_alerts.get(alert_key, None)
+        if open_alert is None and is_outlier:
+            raise_alert(client, document, measurement, 'ewma', {
+                'direction': 'below' if z_score < 0 else 'above',
+                'threshold': None,
+                'expected': mean,
+                'z_score': z_score
+            })
+        elif open_alert is not None and is_outlier:
+            extend_alert(open_alert, value, z_score < 0)
+        elif open_alert is not None and abs(z_score) <= DETECTOR_Z_THRESHOLD / 2:
+            clear_alert(client, document, measurement, 'ewma')
+
+
+def save_detector_state(client: MongoClient) -> None:
+    # Write only the series that changed since the last snapshot
+    with app_detector_lock:
+        dirty_keys: list[tuple[str, str]] = list(app_detector_dirty)
+        app_detector_dirty.clear()
+        snapshot: list[tuple[tuple[str, str], list[float]]] = [
+            (state_key, list(app_detector_state[state_key])) for state_key in dirty_keys
+        ]
+
+    if len(snapshot) == 0:
+        return
+
+    state_updates: list[UpdateOne] = [
+        UpdateOne(
+            {'_id': f'{sensor_name}|{measurement}'},
+            {'$set': {
+                'sensor_name': sensor_name, 'measurement': measurement, 'mean': series_state[0],
+                'variance': series_state[1], 'count': series_state[2], 'last_z_score': series_state[3]
+            }},
+            upsert=True
+        )
+        for (sensor_name, measurement), series_state in snapshot
+    ]
+    client['weather'][DETECTOR_STATE_COLLECTION].bulk_write(state_updates, ordered=False)
+
+
+def run_detector_snapshots(is_leader: bool) -> None:
+    # Only the leader updates the baselines, so the other workers follow its snapshots to answer baseline queries
+    while True:
+        sleep(DETECTOR_SNAPSHOT_SECONDS)
+        try:
+            if is_leader:
+                save_detector_state(get_data_gen_client())
+            else:
+                load_detector_state(get_data_gen_client()['weather'])
+        except (OperationFailure, ConnectionFailure) as e:
+            print(f'Syncing outlier detector state failed. Reason: {e}')
+
+
+def start_detector_snapshots(is_leader: bool) -> None:
+    snapshot_thread: Thread = Thread(
+        target=run_detector_snapshots, args=(is_leader,), name='detector-snapshots', daemon=True
+    )
+    snapshot_thread.start()
+
+
+def get_detector_baselines(measurements: list[str], all_or_selected: str,
+                           selected_sensors: list[str]) -> dict[str, list]:
+    # Start baseline super dictionary, tracking which requested measurements each stored one answers for
+    baselines: dict[str, list] = {measurement: [] for measurement in measurements if measurement in DETECTOR_MIN_STDDEV}
+    requested_measurements: dict[str, list[str]] = {}
+    for measurement in baselines.keys():
+        requested_measurements.setdefault(get_stored_measurement(measurement), []).append(measurement)
+    select_all: bool = all_or_selected in ['All', 'Empty'] or 'Empty' in selected_sensors
+
+    with app_detector_lock:
+        for (sensor_name, stored_measurement), series_state in app_detector_state.items():
+            if stored_measurement not in requested_measurements or not (select_all or sensor_name in selected_sensors):
+                continue
+
+            # Derived units scale the spread as well as the mean, but only shift the mean
+            for measurement in requested_measurements[stored_measurement]:
+                scale, offset = get_conversion(measurement)
+                baselines[measurement].append({
+                    'sensor_name': sensor_name,
+                    'mean': series_state[0] * scale + offset,
+                    'stddev': sqrt(series_state[1]) * scale,
+                    'count': series_state[2],
+                    'last_z_score': series_state[3],
+                    'warmed_up': series_state[2] >= DETECTOR_WARMUP_READINGS
+                })
+
+    return baselines
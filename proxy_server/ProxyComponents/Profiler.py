@@ -0,0 +1,130 @@
+from pymongo.collection import Collection
+from bson import json_util
+from flask import g, Response
+from threading import Thread, Event, get_ident
+from time import perf_counter, time
+from sys import _current_frames
+from os.path import join, basename
+from json import dumps as json_dumps, loads as json_loads
+from typing import Union
+from .Constants import PROFILE_ENABLED, PROFILE_DIR, PROFILE_SAMPLE_MS, PROFILE_TOP_STACKS
+from .Admission import get_remaining_time_ms
+
+# Request header that turns profiling on, holding any of timing, explain and sample separated by commas
+PROFILE_HEADER: str = 'X-Profile'
+
+
+def run_stack_sampler(thread_id: int, stack_counts: dict[str, int], stop_event: Event) -> None:
+    # Count how often each call stack of the request thread is seen
+    while not stop_event.wait(PROFILE_SAMPLE_MS / 1000):
+        frame = _current_frames().get(thread_id, None)
+        stack: list[str] = []
+        while frame is not None:
+            stack.append(f'{frame.f_code.co_name} ({basename(frame.f_code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+
+        # Folded format, outermost call first
+        folded_stack: str = ';'.join(reversed(stack))
+        stack_counts[folded_stack] = stack_counts.get(folded_stack, 0) + 1
+
+
+def start_profile(profile_options: str, start_time: float) -> None:
+    if not PROFILE_ENABLED:
+        return
+
+    g.profile = {
+        'options': {option.strip().lower() for option in profile_options.split(',')},
+        'start': start_time,
+        'last': start_time,
+        'stages': [],
+        'aggregations': [],
+        'stack_counts': {},
+        'sampler_stop': None
+    }
+
+    if 'sample' in g.profile['options']:
+        sampler_stop: Event = Event()
+        sampler_thread: Thread = Thread(
+            target=run_stack_sampler, args=(get_ident(), g.profile['stack_counts'], sampler_stop),
+            name='profile-sampler', daemon=True
+        )
+        sampler_thread.start()
+        g.profile['sampler_stop'] = sampler_stop
+
+
+def mark_stage(stage_name: str) -> None:
+    # Record the time since the previous stage ended, which costs one lookup when profiling is off
+    profile: Union[dict, None] = g.get('profile', None)
+    if profile is None:
+        return
+
+    stage_end: float = perf_counter()
+    profile['stages'].append({'stage': stage_name, 'duration_ms': (stage_end - profile['last']) * 1000})
+    profile['last'] = stage_end
+
+
+def run_aggregate(collection: Collection, pipeline: list) -> list[dict]:
+    # Stop the aggregation on the server once the request's deadline passes
+    aggregate_options: dict = {'allowDiskUse': True}
+    remaining_time_ms: Union[int, None] = get_remaining_time_ms()
+    if remaining_time_ms is not None:
+        aggregate_options['maxTimeMS'] = remaining_time_ms
+
+    profile: Union[dict, None] = g.get('profile', None)
+    if profile is None:
+        return collection.aggregate(pipeline, **aggregate_options).to_list()
+
+    # Time the aggregation including fetching every batch of results
+    aggregate_start: float = perf_counter()
+    results: list[dict] = collection.aggregate(pipeline, **aggregate_options).to_list()
+    aggregation: dict = {
+        'collection': collection.name,
+        'duration_ms': (perf_counter() - aggregate_start) * 1000,
+        'documents': len(results)
+    }
+
+    # Run the pipeline again under explain on the same kind of member, since commands default to the primary
+    if 'explain' in profile['options']:
+        explain_result: dict = collection.database.command({
+            'explain': {'aggregate': collection.name, 'pipeline': pipeline, 'cursor': {}, 'allowDiskUse': True},
+            'verbosity': 'executionStats'
+        }, read_preference=collection.read_preference)
+        aggregation['explain'] = json_loads(json_util.dumps(explain_result))
+
+    profile['aggregations'].append(aggregation)
+    return results
+
+
+def finish_profile(response: Response, route: str) -> Response:
+    profile: Union[dict, None] = g.pop('profile', None)
+    if profile is None:
+        return response
+
+    if profile['sampler_stop'] is not None:
+        profile['sampler_stop'].set()
+
+    # Put the most common stacks first
+    top_stacks: list[tuple[str, int]] = sorted(
+        profile['stack_counts'].items(), key=lambda stack_count: stack_count[1], reverse=True
+    )[:PROFILE_TOP_STACKS]
+    profile_report: dict = {
+        'route': route,
+        'total_ms': (perf_counter() - profile['start']) * 1000,
+        'stages': profile['stages'],
+        'aggregations': profile['aggregations'],
+        'sample_interval_ms': PROFILE_SAMPLE_MS if 'sample' in profile['options'] else None,
+        'samples': [{'stack': stack, 'count': count} for stack, count in top_stacks]
+    }
+
+    # Save the report to the profile directory or add it to the JSON response
+    if PROFILE_DIR != '':
+        profile_name: str = f'{time():.6f}{route.replace("/", "_")}.json'
+        with open(join(PROFILE_DIR, profile_name), 'w') as profile_file:
+            profile_file.write(json_dumps(profile_report, indent=2))
+        response.headers['X-Profile-File'] = profile_name
+    elif response.is_json:
+        response_json: dict = response.get_json()
+        response_json['profile'] = profile_report
+        response.set_data(json_dumps(response_json))
+
+    return response
@@ -0,0 +1,401 @@
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.database import Database, Collection
+from pymongo.errors import OperationFailure, CollectionInvalid, ConnectionFailure
+from threading import Thread
+from time import sleep
+from datetime import datetime, timedelta, UTC
+from typing import Union
+from .Constants import (STORED_MEASUREMENTS, ROLLUP_TIERS, ROLLUP_TIER_SECONDS, ROLLUP_WATERMARK_COLLECTION,
+                        ROLLUP_INTERVAL_SECONDS, ROLLUP_LATENESS_SECONDS, NON_NUMERIC_MEASUREMENTS, DOCUMENT_MODE,
+                        SENSOR_COLLECTION, SPATIAL_LEVEL_FIELDS, SPATIAL_ROLLUP_LEVEL)
+from .DatabaseClients import get_data_gen_client
+from .SensorCatalog import app_sensor_catalog_index, get_location_projection, get_sensor_location
+from .Sketches import build_sketch_key_stage, merge_sketch
+
+# Oldest time a rollup can cover, used when rebuilding from scratch
+ROLLUP_EPOCH: datetime = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def get_rollup_collection_name(measurement: str, tier: str, spatial_level: str = 'sensor') -> str:
+    if spatial_level == 'sensor':
+        return f'{measurement}_{tier}'
+
+    return f'{measurement}_{tier}_{spatial_level}'
+
+
+def create_rollup_collections(weather: Database) -> None:
+    # Create a regular collection per measurement and tier, keyed by sensor and bucket for $merge
+    for measurement in STORED_MEASUREMENTS:
+        for tier in ROLLUP_TIERS.keys():
+            rollup_name: str = get_rollup_collection_name(measurement, tier)
+            try:
+                weather.create_collection(name=rollup_name)
+                print(f'Rollup collection {rollup_name} created.')
+            except CollectionInvalid:
+                print(f'Rollup collection {rollup_name} already exists.')
+
+            rollup_collection: Collection = weather[rollup_name]
+            rollup_collection.create_index([('sensor_name', ASCENDING), ('bucket', ASCENDING)], unique=True)
+            rollup_collection.create_index([('bucket', DESCENDING)])
+
+            # Numeric measurements also get a rollup per location, keyed by the location's fields and bucket
+            if measurement in NON_NUMERIC_MEASUREMENTS:
+                continue
+            spatial_name: str = get_rollup_collection_name(measurement, tier, SPATIAL_ROLLUP_LEVEL)
+            try:
+                weather.create_collection(name=spatial_name)
+                print(f'Rollup collection {spatial_name} created.')
+            except CollectionInvalid:
+                print(f'Rollup collection {spatial_name} already exists.')
+
+            spatial_collection: Collection = weather[spatial_name]
+            spatial_collection.create_index(
+                [*[(field, ASCENDING) for field in SPATIAL_LEVEL_FIELDS[SPATIAL_ROLLUP_LEVEL]], ('bucket', ASCENDING)],
+                unique=True
+            )
+            spatial_collection.create_index([('bucket', DESCENDING)])
+
+
+def truncate_to_tier(date_time: datetime, tier: str) -> datetime:
+    if tier == 'daily':
+        return date_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        return date_time.replace(minute=0, second=0, microsecond=0)
+
+
+def truncate_to_bucket(date_time: datetime, bucket_seconds: int) -> datetime:
+    # Buckets start on multiples of their length since the epoch, like the storage backends cut them
+    if date_time.tzinfo is None:
+        date_time = date_time.replace(tzinfo=UTC)
+    if bucket_seconds == 0:
+        return date_time
+
+    return date_time - timedelta(seconds=date_time.timestamp() % bucket_seconds)
+
+
+def choose_rollup_tier(resolution_seconds: int) -> Union[str, None]:
+    # Pick the coarsest tier whose bucket size still meets the requested resolution
+    chosen_tier: Union[str, None] = None
+    for tier, tier_seconds in sorted(ROLLUP_TIER_SECONDS.items(), key=lambda item: item[1]):
+        if resolution_seconds >= tier_seconds:
+            chosen_tier = tier
+
+    return chosen_tier
+
+
+def build_compaction_pipeline(measurement: str, tier: str, start_date_time: datetime) -> list[dict]:
+    # Hourly rollups are built from raw readings, coarser rollups from the hourly ones
+    if tier == 'hourly':
+        time_field: str = '$time_recorded'
+        group_fields: dict = {
+            'min': {'$min': '$metric'},
+            'max': {'$max': '$metric'},
+            'sum': {'$sum': '$metric'},
+            'count': {'$sum': 1},
+            'last': {'$top': {'sortBy': {'time_recorded': -1}, 'output': '$metric'}}
+        }
+        match_stage: dict = {'$match': {'time_recorded': {'$gte': start_date_time}}}
+    else:
+        time_field: str = '$bucket'
+        group_fields: dict = {
+            'min': {'$min': '$min'},
+            'max': {'$max': '$max'},
+            'sum': {'$sum': '$sum'},
+            'count': {'$sum': '$count'},
+            'last': {'$top': {'sortBy': {'bucket': -1}, 'output': '$last'}}
+        }
+        match_stage: dict = {'$match': {'bucket': {'$gte': start_date_time}}}
+
+    # Categorical measurements only keep the latest value and the reading count
+    if measurement in NON_NUMERIC_MEASUREMENTS:
+        group_fields = {'count': group_fields['count'], 'last': group_fields['last']}
+        average_field: dict = {}
+    else:
+        average_field: dict = {'avg': {'$divide': ['$sum', '$count']}}
+
+    # Lean readings have no location to copy, so their rollups are joined with the sensor catalog on read
+    if DOCUMENT_MODE == 'lean':
+        location_fields: dict = {}
+    else:
+        location_fields: dict = {
+            'city': {'$first': '$city'},
+            'county': {'$first': '$county'},
+            'state': {'$first': '$state'}
+        }
+
+    return [
+        match_stage,
+        {'$group': {
+            '_id': {
+                'sensor_name': '$sensor_name',
+                'bucket': {'$dateTrunc': {'date': time_field, 'unit': ROLLUP_TIERS[tier]}}
+            },
+            **location_fields,
+            **group_fields
+        }},
+        {'$set': {'sensor_name': '$_id.sensor_name', 'bucket': '$_id.bucket', **average_field}},
+        {'$unset': '_id'},
+        {'$merge': {
+            'into': get_rollup_collection_name(measurement, tier),
+            'on': ['sensor_name', 'bucket'],
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+
+
+def build_spatial_location_stages() -> list[dict]:
+    # Lean rollups have no location, so look up each sensor's in the catalog collection
+    level_fields: list[str] = SPATIAL_LEVEL_FIELDS[SPATIAL_ROLLUP_LEVEL]
+    if DOCUMENT_MODE == 'lean':
+        location_stages: list[dict] = [
+            {'$lookup': {
+                'from': SENSOR_COLLECTION, 'localField': 'sensor_name', 'foreignField': 'sensor_name', 'as': 'sensor'
+            }},
+            {'$set': {field: {'$first': f'$sensor.{field}'} for field in level_fields}}
+        ]
+    else:
+        location_stages: list[dict] = []
+
+    # Skip sensors the catalog has no location for
+    return location_stages + [{'$match': {field: {'$ne': None} for field in level_fields}}]
+
+
+def build_spatial_compaction_pipeline(measurement: str, tier: str, start_date_time: datetime) -> list[dict]:
+    # Add up every sensor's bucket in the location
+    level_fields: list[str] = SPATIAL_LEVEL_FIELDS[SPATIAL_ROLLUP_LEVEL]
+    return [
+        {'$match': {'bucket': {'$gte': start_date_time}}},
+        *build_spatial_location_stages(),
+        {'$group': {
+            '_id': {**{field: f'${field}' for field in level_fields}, 'bucket': '$bucket'},
+            'min': {'$min': '$min'},
+            'max': {'$max': '$max'},
+            'sum': {'$sum': '$sum'},
+            'count': {'$sum': '$count'}
+        }},
+        {'$set': {
+            **{field: f'$_id.{field}' for field in level_fields}, 'bucket': '$_id.bucket',
+            'avg': {'$divide': ['$sum', '$count']}
+        }},
+        {'$unset': '_id'},
+        {'$merge': {
+            'into': get_rollup_collection_name(measurement, tier, SPATIAL_ROLLUP_LEVEL),
+            'on': [*level_fields, 'bucket'],
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+
+
+def build_sketch_compaction_pipeline(measurement: str, tier: str, spatial_level: str,
+                                     start_date_time: datetime) -> list[dict]:
+    # Hourly sketches bin raw readings, while coarser and location sketches merge the bins of the ones they cover
+    if tier == 'hourly' and spatial_level == 'sensor':
+        source_stages: list[dict] = [
+            {'$match': {'time_recorded': {'$gte': start_date_time}, 'metric': {'$type': 'number'}}},
+            build_sketch_key_stage('$metric')
+        ]
+        bucket_expression: dict = {'$dateTrunc': {'date': '$time_recorded', 'unit': ROLLUP_TIERS[tier]}}
+    else:
+        source_stages: list[dict] = [
+            {'$match': {'bucket': {'$gte': start_date_time}}},
+            *(build_spatial_location_stages() if spatial_level != 'sensor' else []),
+            {'$unwind': '$sketch'},
+            {'$set': {'s': '$sketch.s', 'k': '$sketch.k', 'c': '$sketch.c'}}
+        ]
+        bucket_expression: dict = {'$dateTrunc': {'date': '$bucket', 'unit': ROLLUP_TIERS[tier]}}
+
+    # Count each bin per series and bucket, then gather the bins into one sketch per rollup document
+    level_fields: list[str] = SPATIAL_LEVEL_FIELDS[spatial_level]
+    return [
+        *source_stages,
+        {'$group': {
+            '_id': {
+                **{field: f'${field}' for field in level_fields}, 'bucket': bucket_expression, 's': '$s', 'k': '$k'
+            },
+            'c': {'$sum': '$c'}
+        }},
+        {'$group': {
+            '_id': {**{field: f'$_id.{field}' for field in level_fields}, 'bucket': '$_id.bucket'},
+            'sketch': {'$push': {'s': '$_id.s', 'k': '$_id.k', 'c': '$c'}}
+        }},
+        {'$set': {**{field: f'$_id.{field}' for field in level_fields}, 'bucket': '$_id.bucket'}},
+        {'$unset': '_id'},
+        {'$merge': {
+            'into': get_rollup_collection_name(measurement, tier, spatial_level),
+            'on': [*level_fields, 'bucket'],
+            'whenMatched': 'merge',
+            'whenNotMatched': 'discard'
+        }}
+    ]
+
+
+def compact_measurement(weather: Database, measurement: str, hourly_start: datetime) -> None:
+    # Recompute every bucket touched since the start, source collection first
+    for tier in ROLLUP_TIERS.keys():
+        if tier == 'hourly':
+            source_collection: Collection = weather[measurement]
+        else:
+            source_collection: Collection = weather[get_rollup_collection_name(measurement, 'hourly')]
+
+        tier_start: datetime = truncate_to_tier(hourly_start, tier)
+        source_collection.aggregate(build_compaction_pipeline(measurement, tier, tier_start), allowDiskUse=True)
+        if measurement in NON_NUMERIC_MEASUREMENTS:
+            continue
+
+        # Replacing a rollup drops its sketch, so the sketch is written again right after
+        source_collection.aggregate(
+            build_sketch_compaction_pipeline(measurement, tier, 'sensor', tier_start), allowDiskUse=True
+        )
+
+        # Location rollups and sketches are added up from the sensor rollups just written, whole buckets at a time
+        sensor_collection: Collection = weather[get_rollup_collection_name(measurement, tier)]
+        sensor_collection.aggregate(build_spatial_compaction_pipeline(measurement, tier, tier_start), allowDiskUse=True)
+        sensor_collection.aggregate(
+            build_sketch_compaction_pipeline(measurement, tier, SPATIAL_ROLLUP_LEVEL, tier_start), allowDiskUse=True
+        )
+
+
+def compact_rollups(client: MongoClient) -> None:
+    weather: Database = client['weather']
+    watermark_collection: Collection = weather[ROLLUP_WATERMARK_COLLECTION]
+
+    for measurement in STORED_MEASUREMENTS:
+        # Start from the last pass, stepping back to catch readings that arrived late
+        pass_start: datetime = datetime.now(UTC)
+        watermark_document: Union[dict, None] = watermark_collection.find_one({'_id': measurement})
+        if watermark_document is None:
+            hourly_start: datetime = ROLLUP_EPOCH
+        else:
+            hourly_start: datetime = max(
+                watermark_document['watermark'] - timedelta(seconds=ROLLUP_LATENESS_SECONDS), ROLLUP_EPOCH
+            )
+
+        compact_measurement(weather, measurement, truncate_to_tier(hourly_start, 'hourly'))
+
+        # Move the watermark up to the start of this pass
+        watermark_collection.update_one({'_id': measurement}, {'$set': {'watermark': pass_start}}, upsert=True)
+
+
+def rebuild_rollups(client: MongoClient) -> None:
+    weather: Database = client['weather']
+
+    # Clear every rollup and its watermark, then compact all existing readings again
+    for measurement in STORED_MEASUREMENTS:
+        for tier in ROLLUP_TIERS.keys():
+            weather[get_rollup_collection_name(measurement, tier)].delete_many({})
+            weather[get_rollup_collection_name(measurement, tier, SPATIAL_ROLLUP_LEVEL)].delete_many({})
+        weather[ROLLUP_WATERMARK_COLLECTION].delete_one({'_id': measurement})
+        print(f'Rebuilding rollups for {measurement}...')
+
+    compact_rollups(client)
+    print('Rollups rebuilt!')
+
+
+def run_rollup_compaction() -> None:
+    while True:
+        try:
+            compact_rollups(get_data_gen_client())
+        except (OperationFailure, ConnectionFailure) as e:
+            print(f'Rollup compaction failed. Reason: {e}')
+
+        sleep(ROLLUP_INTERVAL_SECONDS)
+
+
+def start_rollup_compaction() -> None:
+    compaction_thread: Thread = Thread(target=run_rollup_compaction, name='rollup-compaction', daemon=True)
+    compaction_thread.start()
+
+
+def build_rollup_pipeline(measurement: str, all_or_selected: str, selected_sensors: list[str], tier: str,
+                          start_date_time: datetime, end_date_time: datetime,
+                          location_projection: Union[dict, None] = None, with_sketches: bool = False) -> list[dict]:
+    # Match whole buckets that overlap the requested range
+    match_filter: dict = {'bucket': {'$gte': truncate_to_tier(start_date_time, tier), '$lte': end_date_time}}
+    if not (all_or_selected in ['All', 'Empty'] or 'Empty' in selected_sensors):
+        match_filter['sensor_name'] = {'$in': selected_sensors}
+
+    # Shape each bucket like a raw reading so callers can chart it the same way
+    metric_field: str = '$last' if measurement in NON_NUMERIC_MEASUREMENTS else '$avg'
+    return [
+        {'$match': match_filter},
+        {'$sort': {'bucket': -1}},
+        {'$project': {
+            '_id': 0, **(location_projection or get_location_projection()), 'time_recorded': '$bucket',
+            'metric': metric_field, 'min': 1, 'max': 1, 'count': 1, **({'sketch': 1} if with_sketches else {})
+        }}
+    ]
+
+
+def build_spatial_rollup_pipeline(spatial_level: str, tier: str, start_date_time: datetime, end_date_time: datetime,
+                                  with_sketches: bool = False) -> list[dict]:
+    # Read the location rollups directly, adding them up again for coarser levels
+    measurement_pipeline: list[dict] = [
+        {'$match': {'bucket': {'$gte': truncate_to_tier(start_date_time, tier), '$lte': end_date_time}}}
+    ]
+    # Sketches are dropped when buckets are added up here, so callers after them read the rollup level and merge
+    level_fields: list[str] = SPATIAL_LEVEL_FIELDS[spatial_level]
+    if spatial_level != SPATIAL_ROLLUP_LEVEL:
+        measurement_pipeline += [
+            {'$group': {
+                '_id': {**{field: f'${field}' for field in level_fields}, 'bucket': '$bucket'},
+                'min': {'$min': '$min'},
+                'max': {'$max': '$max'},
+                'sum': {'$sum': '$sum'},
+                'count': {'$sum': '$count'}
+            }},
+            {'$set': {
+                **{field: f'$_id.{field}' for field in level_fields}, 'bucket': '$_id.bucket',
+                'avg': {'$divide': ['$sum', '$count']}
+            }}
+        ]
+
+    # Shape each bucket like a rollup of a single sensor
+    return measurement_pipeline + [
+        {'$sort': {'bucket': -1}},
+        {'$project': {
+            '_id': 0, **{field: 1 for field in level_fields}, 'time_recorded': '$bucket', 'metric': '$avg',
+            'min': 1, 'max': 1, 'count': 1, **({'sketch': 1} if with_sketches else {})
+        }}
+    ]
+
+
+def average_by_sensor_location(sensor_records: list[dict], spatial_level: str, bucket_seconds: int) -> list[dict]:
+    # Combine each sensor's readings or time buckets under the location the catalog has for the sensor,
+    # while location rollups already carry their own
+    level_fields: list[str] = SPATIAL_LEVEL_FIELDS[spatial_level]
+    location_buckets: dict[tuple, dict] = {}
+    for sensor_record in sensor_records:
+        location_source: dict = app_sensor_catalog_index.get(sensor_record['sensor_name'], {}) \
+            if 'sensor_name' in sensor_record else sensor_record
+        location: tuple = tuple(location_source.get(field, None) for field in level_fields)
+        time_recorded: datetime = truncate_to_bucket(sensor_record['time_recorded'], bucket_seconds)
+
+        # Raw readings count once, and buckets by how many readings they summarize
+        record_count: int = sensor_record.get('count', 1)
+        location_bucket: Union[dict, None] = location_buckets.get((location, time_recorded), None)
+        if location_bucket is None:
+            location_bucket = {'sum': 0.0, 'count': 0, 'min': sensor_record.get('min', sensor_record['metric']),
+                               'max': sensor_record.get('max', sensor_record['metric'])}
+            location_buckets[(location, time_recorded)] = location_bucket
+        location_bucket['sum'] += sensor_record['metric'] * record_count
+        location_bucket['count'] += record_count
+        location_bucket['min'] = min(location_bucket['min'], sensor_record.get('min', sensor_record['metric']))
+        location_bucket['max'] = max(location_bucket['max'], sensor_record.get('max', sensor_record['metric']))
+        if 'sketch' in sensor_record:
+            merge_sketch(location_bucket.setdefault('sketch', {}), sensor_record['sketch'])
+
+    # Shape each location's bucket like a rollup, newest first, with sensors keeping their location for charts
+    return [
+        {
+            **dict(zip(level_fields, location)),
+            **(get_sensor_location(location[0]) if spatial_level == 'sensor' else {}),
+            'time_recorded': time_recorded, 'metric': location_bucket['sum'] / location_bucket['count'],
+            'min': location_bucket['min'], 'max': location_bucket['max'], 'count': location_bucket['count'],
+            **({'sketch': location_bucket['sketch']} if 'sketch' in location_bucket else {})
+        }
+        for (location, time_recorded), location_bucket in sorted(
+            location_buckets.items(), key=lambda item: item[0][1], reverse=True
+        )
+    ]
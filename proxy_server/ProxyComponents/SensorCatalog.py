@@ -0,0 +1,323 @@
+from pymongo import MongoClient, ReturnDocument, ASCENDING, GEOSPHERE
+from pymongo.database import Database, Collection
+from pymongo.errors import OperationFailure, ConnectionFailure
+from sqlite3 import Error as SQLiteError
+from threading import Thread, Lock
+from time import sleep
+from bisect import bisect_right
+from uuid import uuid4
+from typing import Union
+from .Constants import (SENSOR_COLLECTION, CATALOG_META_COLLECTION, CATALOG_META_ID, PROXY_WORKERS,
+                        CATALOG_REFRESH_SECONDS, DOCUMENT_MODE, LOCATION_FIELDS, GEO_RESULT_LIMIT)
+from .Storage import get_storage
+
+# Dictionary to maintain sensors
+app_sensor_tracker: dict[int, list] = {}
+app_sensor_mod: int = 20  # Calculated by sqrt(n), where n is the number of entries expected in the equation x + n/x
+
+# Local copy of the sensor catalog, ordered by the catalog version each sensor was added under
+app_sensor_catalog: list[dict] = []
+app_sensor_catalog_versions: list[int] = []
+app_sensor_catalog_index: dict[str, dict] = {}
+app_catalog_version: int = 0  # Every sensor up to this version is in the local copy
+app_catalog_seen_version: int = 0  # Latest version another worker may still be inserting a sensor under
+app_catalog_epoch: str = ''
+app_catalog_lock: Lock = Lock()
+
+# Fields copied from a measurement document into the sensor catalog
+SENSOR_FIELDS: list[str] = ['sensor_name', 'latitude', 'longitude', 'city', 'county', 'state', 'zip_code']
+
+
+def insert_into_sensor_tracker(sensor_name: str) -> bool:
+    # Get the zipcode for sorting
+    sensor_info: list[str] = sensor_name.split('_')
+    sensor_zipcode: int = int(sensor_info[0])
+
+    # Sort the zipcode into
+    sensor_already_existed: bool = False
+    mod_location: int = sensor_zipcode % app_sensor_mod
+    if mod_location in app_sensor_tracker:
+        if sensor_name in app_sensor_tracker[mod_location]:
+            sensor_already_existed = True
+        else:
+            app_sensor_tracker[mod_location].append(sensor_name)
+    else:
+        app_sensor_tracker[mod_location] = [sensor_name]
+
+    return sensor_already_existed
+
+
+def build_sensor_location(latitude: float, longitude: float) -> Union[dict, None]:
+    # GeoJSON points go longitude first, and 2dsphere indexes reject points that are not on the globe
+    if not (isinstance(latitude, (int, float)) and isinstance(longitude, (int, float))):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+
+    return {'type': 'Point', 'coordinates': [longitude, latitude]}
+
+
+def add_to_sensor_catalog(sensor_document: dict) -> None:
+    global app_catalog_version
+
+    # Make the document JSON friendly once instead of on every request
+    sensor_document = dict(sensor_document)
+    sensor_document['_id'] = str(sensor_document['_id'])
+
+    # Skip sensors that are already in the local copy
+    if sensor_document['sensor_name'] in app_sensor_catalog_index:
+        return
+
+    # Keep the catalog ordered by version so deltas can be sliced off the end
+    sensor_version: int = sensor_document.get('catalog_version', 0)
+    insert_location: int = bisect_right(app_sensor_catalog_versions, sensor_version)
+    app_sensor_catalog.insert(insert_location, sensor_document)
+    app_sensor_catalog_versions.insert(insert_location, sensor_version)
+    app_sensor_catalog_index[sensor_document['sensor_name']] = sensor_document
+
+    # With several workers a sensor can arrive ahead of versions other workers are still inserting
+    if PROXY_WORKERS == 1:
+        app_catalog_version = max(app_catalog_version, sensor_version)
+
+
+def migrate_sensor_catalog(weather: Database) -> None:
+    # Create the catalog version counter if it does not exist yet
+    meta_collection: Collection = weather[CATALOG_META_COLLECTION]
+    meta_collection.update_one(
+        {'_id': CATALOG_META_ID},
+        {'$setOnInsert': {'version': 0, 'epoch': uuid4().hex}},
+        upsert=True
+    )
+
+    # Give sensors created before catalog versioning a version of their own
+    sensor_collection: Collection = weather[SENSOR_COLLECTION]
+    unversioned_sensors: list[dict] = sensor_collection.find(
+        {'catalog_version': {'$exists': False}}, {'_id': 1}
+    ).sort('_id', ASCENDING).to_list()
+    for sensor in unversioned_sensors:
+        meta_document: dict = meta_collection.find_one_and_update(
+            {'_id': CATALOG_META_ID}, {'$inc': {'version': 1}}, return_document=ReturnDocument.AFTER
+        )
+        sensor_collection.update_one({'_id': sensor['_id']}, {'$set': {'catalog_version': meta_document['version']}})
+
+    if len(unversioned_sensors) > 0:
+        print(f'Assigned catalog versions to {len(unversioned_sensors)} existing sensors.')
+
+    # Give sensors registered before geospatial queries a GeoJSON point
+    located_count: int = sensor_collection.update_many(
+        {
+            'location': {'$exists': False},
+            'latitude': {'$gte': -90, '$lte': 90},
+            'longitude': {'$gte': -180, '$lte': 180}
+        },
+        [{'$set': {'location': {'type': 'Point', 'coordinates': ['$longitude', '$latitude']}}}]
+    ).modified_count
+    if located_count > 0:
+        print(f'Added locations to {located_count} existing sensors.')
+
+    # Index the catalog for name lookups, delta queries and area queries
+    try:
+        sensor_collection.create_index([('sensor_name', ASCENDING)], unique=True)
+        sensor_collection.create_index([('catalog_version', ASCENDING)])
+        sensor_collection.create_index([('location', GEOSPHERE)])
+    except OperationFailure as e:
+        print(f'Could not create sensor catalog indexes. Reason: {e}')
+
+
+def warm_sensor_catalog() -> None:
+    global app_catalog_version
+    global app_catalog_seen_version
+    global app_catalog_epoch
+
+    # Get the current version and epoch of the catalog
+    meta_document: dict = get_storage().get_catalog_meta()
+
+    with app_catalog_lock:
+        app_catalog_epoch = meta_document['epoch']
+        app_catalog_version = meta_document['version']
+        app_catalog_seen_version = meta_document['version']
+
+        # Load every sensor into the local catalog and the sensor tracker
+        sensor_documents: list[dict] = get_storage().get_catalog_sensors(0)
+        for sensor_document in sensor_documents:
+            insert_into_sensor_tracker(sensor_document['sensor_name'])
+            add_to_sensor_catalog(sensor_document)
+
+    print(f'Sensor catalog loaded with {len(app_sensor_catalog)} sensors at version {app_catalog_version}.')
+
+
+def register_sensor(document: dict) -> str:
+    # Skip the database if the sensor is already known locally
+    exist_status: bool = insert_into_sensor_tracker(document['sensor_name'])
+    if exist_status:
+        return f'Sensor {document["sensor_name"]} already exists in local cache.'
+
+    # Add a new sensor to a collection of sensors if it does not exist
+    with app_catalog_lock:
+        sensor_document: dict = {field: document[field] for field in SENSOR_FIELDS}
+        sensor_location: Union[dict, None] = build_sensor_location(document['latitude'], document['longitude'])
+        if sensor_location is not None:
+            sensor_document['location'] = sensor_location
+
+        stored_document, is_new_sensor = get_storage().add_catalog_sensor(sensor_document)
+        add_to_sensor_catalog(stored_document)
+        if is_new_sensor:
+            return f'Sensor {document["sensor_name"]} has been added to local cache and database.'
+        else:
+            return f'Sensor {document["sensor_name"]} has been added to local cache but not database.'
+
+
+def refresh_sensor_catalog() -> None:
+    global app_catalog_version
+    global app_catalog_seen_version
+
+    # Nothing to do if no worker has bumped the version since the last refresh
+    meta_document: dict = get_storage().get_catalog_meta()
+    if meta_document['version'] == app_catalog_seen_version == app_catalog_version:
+        return
+
+    # Pick up sensors other workers registered since the last complete version
+    sensor_documents: list[dict] = get_storage().get_catalog_sensors(app_catalog_version)
+
+    with app_catalog_lock:
+        for sensor_document in sensor_documents:
+            insert_into_sensor_tracker(sensor_document['sensor_name'])
+            add_to_sensor_catalog(sensor_document)
+
+        # A version is only complete once it was already claimed a refresh ago, which gives the worker that
+        # claimed it time to insert its sensor
+        app_catalog_version = max(app_catalog_version, app_catalog_seen_version)
+        app_catalog_seen_version = meta_document['version']
+
+
+def run_catalog_refresh() -> None:
+    while True:
+        sleep(CATALOG_REFRESH_SECONDS)
+        try:
+            refresh_sensor_catalog()
+        except (OperationFailure, ConnectionFailure, SQLiteError) as e:
+            print(f'Refreshing the sensor catalog failed. Reason: {e}')
+
+
+def start_catalog_refresh() -> None:
+    # A single worker registers every sensor itself, so only several workers need to refresh
+    if PROXY_WORKERS == 1:
+        return
+
+    refresh_thread: Thread = Thread(target=run_catalog_refresh, name='catalog-refresh', daemon=True)
+    refresh_thread.start()
+
+
+def get_catalog_etag() -> str:
+    return f'"{app_catalog_epoch}-{app_catalog_version}"'
+
+
+def get_catalog_delta(client_version: int, client_epoch: str) -> dict:
+    with app_catalog_lock:
+        # Send everything if the client's copy came from a different catalog or is ahead of this one
+        if client_epoch != app_catalog_epoch or client_version > app_catalog_version:
+            full_catalog: bool = True
+            sensors: list[dict] = app_sensor_catalog[:bisect_right(app_sensor_catalog_versions, app_catalog_version)]
+        else:  # Otherwise only send the sensors added since the client's version
+            full_catalog: bool = False
+            sensors: list[dict] = app_sensor_catalog[
+                bisect_right(app_sensor_catalog_versions, client_version):
+                bisect_right(app_sensor_catalog_versions, app_catalog_version)
+            ]
+
+        return {
+            'catalog_epoch': app_catalog_epoch,
+            'catalog_version': app_catalog_version,
+            'full': full_catalog,
+            'sensors': sensors
+        }
+
+
+def get_sensor_catalog() -> list[dict]:
+    return list(app_sensor_catalog)
+
+
+def get_catalog_summary() -> dict[str, int]:
+    return {'sensor_count': len(app_sensor_catalog_index), 'catalog_version': app_catalog_version}
+
+
+def get_location_projection() -> dict[str, int]:
+    # Lean readings have no location of their own, so project the sensor name to join it from the catalog
+    if DOCUMENT_MODE == 'lean':
+        return {'sensor_name': 1}
+
+    return {field: 1 for field in LOCATION_FIELDS}
+
+
+def get_sensor_location(sensor_name: Union[str, None]) -> dict[str, Union[str, None]]:
+    sensor_document: dict = app_sensor_catalog_index.get(sensor_name, {})
+    return {field: sensor_document.get(field, None) for field in LOCATION_FIELDS}
+
+
+def join_sensor_locations(records: list[dict]) -> list[dict]:
+    # Swap the sensor name projected from lean readings for the location fields full readings carry
+    if DOCUMENT_MODE != 'lean':
+        return records
+
+    for record in records:
+        record.update(get_sensor_location(record.pop('sensor_name', None)))
+
+    return records
+
+
+def sum_by_sensor_location(sensor_counts: list[dict], field: str) -> list[dict]:
+    # Add up counts grouped by sensor under the location the catalog has for each sensor
+    location_counts: dict[str, int] = {}
+    for sensor_count in sensor_counts:
+        location: str = app_sensor_catalog_index.get(sensor_count['_id'], {}).get(field, None)
+        location_counts[location] = location_counts.get(location, 0) + sensor_count['count']
+
+    return [{'_id': location, 'count': count} for location, count in location_counts.items()]
+
+
+def build_box_filter(west: float, south: float, east: float, north: float) -> dict:
+    return {'location': {'$geoWithin': {'$geometry': {
+        'type': 'Polygon',
+        'coordinates': [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+    }}}}
+
+
+def build_area_filter(area: dict) -> dict:
+    # A viewport is a bounding box of [west, south, east, north], whose east edge is west of its west edge when it
+    # crosses the antimeridian
+    if 'bbox' in area:
+        west, south, east, north = [float(bound) for bound in area['bbox']]
+        box_width: float = east - west if east >= west else east - west + 360
+
+        # A box spanning half the globe or more has no single polygon, so every sensor is in view
+        if box_width >= 180:
+            return {'location': {'$exists': True}}
+
+        # Maps can pan past the antimeridian, so bring the edges back to [-180, 180] and split a box across it in two
+        west = (west + 180) % 360 - 180
+        east = 180 - (180 - east) % 360
+        if east < west:
+            return {'$or': [build_box_filter(west, south, 180, north), build_box_filter(-180, south, east, north)]}
+
+        return build_box_filter(west, south, east, north)
+
+    # A radius is a center of [longitude, latitude] and a distance in kilometres, returned nearest first
+    if 'center' in area:
+        longitude, latitude = [float(coordinate) for coordinate in area['center']]
+        return {'location': {'$nearSphere': {
+            '$geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+            '$maxDistance': float(area['radius_km']) * 1000
+        }}}
+
+    raise KeyError('An area needs a bbox or a center and radius_km.')
+
+
+def get_sensors_in_area(client: MongoClient, area: dict) -> list[dict]:
+    # Let the 2dsphere index find the sensors instead of sending the whole catalog
+    sensor_documents: list[dict] = client['weather'][SENSOR_COLLECTION].find(
+        build_area_filter(area), {'location': 0}
+    ).limit(GEO_RESULT_LIMIT).to_list()
+    for sensor_document in sensor_documents:
+        sensor_document['_id'] = str(sensor_document['_id'])
+
+    return sensor_documents
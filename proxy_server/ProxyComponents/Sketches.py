@@ -0,0 +1,64 @@
+from math import log
+from typing import Union
+from .Constants import SKETCH_RELATIVE_ACCURACY, SKETCH_MIN_VALUE
+
+# Sketch bins grow by this factor, so every reading is within the relative accuracy of its bin's value
+SKETCH_GAMMA: float = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+SKETCH_LN_GAMMA: float = log(SKETCH_GAMMA)
+
+
+def build_sketch_key_stage(value_field: str) -> dict:
+    # Sort each reading into a bin by its sign and the logarithm of its size, with readings near zero in one bin
+    absolute_value: dict = {'$abs': value_field}
+    return {'$set': {
+        's': {'$switch': {
+            'branches': [
+                {'case': {'$gt': [value_field, SKETCH_MIN_VALUE]}, 'then': 1},
+                {'case': {'$lt': [value_field, -SKETCH_MIN_VALUE]}, 'then': -1}
+            ],
+            'default': 0
+        }},
+        'k': {'$cond': [
+            {'$gt': [absolute_value, SKETCH_MIN_VALUE]},
+            {'$ceil': {'$divide': [{'$ln': absolute_value}, SKETCH_LN_GAMMA]}},
+            0
+        ]},
+        'c': 1
+    }}
+
+
+def merge_sketch(sketch_counts: dict[tuple[int, int], int], sketch: list[dict]) -> None:
+    # Sketches merge by adding up the counts of matching bins
+    for sketch_bin in sketch:
+        bin_key: tuple[int, int] = (int(sketch_bin['s']), int(sketch_bin['k']))
+        sketch_counts[bin_key] = sketch_counts.get(bin_key, 0) + sketch_bin['c']
+
+
+def get_bin_value(sign: int, key: int) -> float:
+    if sign == 0:
+        return 0.0
+
+    return sign * 2 * SKETCH_GAMMA ** key / (SKETCH_GAMMA + 1)
+
+
+def get_sketch_percentiles(sketch_counts: dict[tuple[int, int], int],
+                           percentiles: list[float]) -> list[Union[float, None]]:
+    if len(sketch_counts) == 0:
+        return [None for _ in percentiles]
+
+    # Walk the bins from the lowest value up until each percentile's rank is reached
+    sorted_bins: list[tuple[tuple[int, int], int]] = sorted(
+        sketch_counts.items(), key=lambda item: get_bin_value(*item[0])
+    )
+    total_count: int = sum(sketch_counts.values())
+    percentile_values: list[Union[float, None]] = []
+    for percentile in percentiles:
+        percentile_rank: float = percentile / 100 * (total_count - 1)
+        cumulative_count: int = 0
+        for (sign, key), bin_count in sorted_bins:
+            cumulative_count += bin_count
+            if cumulative_count > percentile_rank:
+                percentile_values.append(get_bin_value(sign, key))
+                break
+
+    return percentile_values
@@ -0,0 +1,26 @@
+from importlib import import_module
+from types import ModuleType
+from .Constants import STORAGE_BACKEND
+
+# Modules implementing the storage interface, which every backend module provides as these functions:
+#   create_storage() -> None
+#   insert_readings(measurement, documents) -> list[str], the inserted ids where the backend reports them
+#   get_latest_readings(measurement, selected_sensors) -> list[dict] of {'_id': sensor, 'latest_value': value}
+#   get_raw_readings(measurement, selected_sensors, start, end, fields) -> list[dict], newest first
+#   get_bucketed_readings(measurement, selected_sensors, start, end, bucket_seconds) -> list[dict] of each sensor's
+#       'metric' mean, 'min', 'max' and 'count' per time bucket, newest first
+#   get_catalog_meta() -> dict with the catalog 'version' and 'epoch'
+#   get_catalog_sensors(after_version) -> list[dict] of sensors added after the version, oldest first
+#   add_catalog_sensor(sensor_document) -> tuple[dict, bool], the stored sensor and whether it was new
+# Selected sensors of None means every sensor, and measurements are converted into the requested unit on read.
+STORAGE_BACKEND_MODULES: dict[str, str] = {
+    'mongo': 'StorageMongo', 'sqlite': 'StorageSQLite', 'partitioned': 'StoragePartitioned'
+}
+
+
+def get_storage() -> ModuleType:
+    # Import the backend on first use, so only the configured one is loaded and it can use any other component
+    if STORAGE_BACKEND not in STORAGE_BACKEND_MODULES:
+        raise ValueError(f'Storage backend {STORAGE_BACKEND} is not one of {list(STORAGE_BACKEND_MODULES)}.')
+
+    return import_module(f'.{STORAGE_BACKEND_MODULES[STORAGE_BACKEND]}', __package__)
@@ -0,0 +1,163 @@
+from pymongo import WriteConcern, ReturnDocument, ASCENDING
+from pymongo.database import Database, Collection
+from pymongo.results import InsertManyResult
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+from datetime import datetime
+from uuid import uuid4
+from typing import Union
+from .Constants import (STORED_MEASUREMENTS, INGEST_WRITE_CONCERN, INGEST_JOURNAL, SENSOR_COLLECTION,
+                        CATALOG_META_COLLECTION, CATALOG_META_ID)
+from .DatabaseClients import get_data_gen_client, get_web_view_client
+from .Profiler import run_aggregate
+from .Units import get_stored_measurement, build_conversion_stages
+
+
+def get_write_concern() -> WriteConcern:
+    write_concern_w: Union[int, str] = int(INGEST_WRITE_CONCERN) if INGEST_WRITE_CONCERN.isdigit() \
+        else INGEST_WRITE_CONCERN
+    if write_concern_w == 0:
+        return WriteConcern(w=0)
+
+    return WriteConcern(w=write_concern_w, j=INGEST_JOURNAL)
+
+
+def create_timeseries_collections(weather: Database) -> None:
+    # Create time-series collections, leaving out the units derived on read
+    for measurement in STORED_MEASUREMENTS:
+        try:
+            weather.create_collection(
+                name=measurement,
+                timeseries={
+                    'timeField': 'time_recorded',
+                    'metaField': 'sensor_name',
+                    'granularity': 'hours'
+                }
+            )
+            print(f'Time-series collection {measurement} created.')
+        except CollectionInvalid:
+            print(f'Time-series collection {measurement} already exists.')
+
+
+def create_storage() -> None:
+    create_timeseries_collections(get_data_gen_client()['weather'])
+
+
+def insert_readings(measurement: str, documents: list[dict]) -> list[str]:
+    cur_collection: Collection = get_data_gen_client()['weather'].get_collection(
+        measurement, write_concern=get_write_concern()
+    )
+    insert_result: InsertManyResult = cur_collection.insert_many(documents, ordered=False)
+    return [str(inserted_id) for inserted_id in insert_result.inserted_ids]
+
+
+def build_latest_pipeline(measurement: str, selected_sensors: Union[list[str], None],
+                          with_time: bool = False) -> list:
+    # Create the measurement pipeline based on filter settings, keeping the latest time when asked to
+    latest_group: dict = {'_id': '$sensor_name', 'latest_value': {'$first': '$metric'}}
+    if with_time:
+        latest_group['latest_time'] = {'$first': '$time_recorded'}
+    measurement_pipeline: list = [
+        {'$sort': {'time_recorded': -1}},
+        {'$group': latest_group}
+    ]
+    if selected_sensors is not None:
+        measurement_pipeline.insert(0, {'$match': {'sensor_name': {'$in': selected_sensors}}})
+    return measurement_pipeline + build_conversion_stages(measurement, ['latest_value'])
+
+
+def build_raw_pipeline(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                       end_date_time: datetime, fields: list[str]) -> list:
+    # Create the measurement pipeline based on filter settings
+    match_filter: dict = {'time_recorded': {'$gte': start_date_time, '$lte': end_date_time}}
+    if selected_sensors is not None:
+        match_filter['sensor_name'] = {'$in': selected_sensors}
+    return [
+        {'$match': match_filter},
+        {'$sort': {'time_recorded': -1}},
+        {'$project': {'_id': 0, **{field: 1 for field in fields}, 'time_recorded': 1, 'metric': 1}},
+        *build_conversion_stages(measurement, ['metric'])
+    ]
+
+
+def build_bucketed_pipeline(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                            end_date_time: datetime, bucket_seconds: int) -> list:
+    # Summarize each sensor's readings per time bucket inside MongoDB, so only one document per bucket comes back
+    match_filter: dict = {'time_recorded': {'$gte': start_date_time, '$lte': end_date_time}}
+    if selected_sensors is not None:
+        match_filter['sensor_name'] = {'$in': selected_sensors}
+    return [
+        {'$match': match_filter},
+        {'$group': {
+            '_id': {
+                'sensor_name': '$sensor_name',
+                'bucket': {'$dateTrunc': {'date': '$time_recorded', 'unit': 'second', 'binSize': bucket_seconds}}
+            },
+            'sum': {'$sum': '$metric'},
+            'count': {'$sum': 1},
+            'min': {'$min': '$metric'},
+            'max': {'$max': '$metric'}
+        }},
+        {'$project': {
+            '_id': 0, 'sensor_name': '$_id.sensor_name', 'time_recorded': '$_id.bucket',
+            'metric': {'$divide': ['$sum', '$count']}, 'min': 1, 'max': 1, 'count': 1
+        }},
+        {'$sort': {'time_recorded': -1}},
+        *build_conversion_stages(measurement, ['metric', 'min', 'max'])
+    ]
+
+
+def get_latest_readings(measurement: str, selected_sensors: Union[list[str], None]) -> list[dict]:
+    # Use aggregate pipeline to get the latest recorded value for each sensor
+    cur_collection: Collection = get_web_view_client()['weather'][get_stored_measurement(measurement)]
+    return run_aggregate(cur_collection, build_latest_pipeline(measurement, selected_sensors))
+
+
+def get_raw_readings(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                     end_date_time: datetime, fields: list[str]) -> list[dict]:
+    cur_collection: Collection = get_web_view_client()['weather'][get_stored_measurement(measurement)]
+    return run_aggregate(
+        cur_collection, build_raw_pipeline(measurement, selected_sensors, start_date_time, end_date_time, fields)
+    )
+
+
+def get_bucketed_readings(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                          end_date_time: datetime, bucket_seconds: int) -> list[dict]:
+    cur_collection: Collection = get_web_view_client()['weather'][get_stored_measurement(measurement)]
+    return run_aggregate(cur_collection, build_bucketed_pipeline(
+        measurement, selected_sensors, start_date_time, end_date_time, bucket_seconds
+    ))
+
+
+def get_catalog_meta() -> dict:
+    return get_data_gen_client()['weather'][CATALOG_META_COLLECTION].find_one({'_id': CATALOG_META_ID})
+
+
+def get_catalog_sensors(after_version: int) -> list[dict]:
+    return get_data_gen_client()['weather'][SENSOR_COLLECTION].find(
+        {'catalog_version': {'$gt': after_version}}
+    ).sort('catalog_version', ASCENDING).to_list()
+
+
+def add_catalog_sensor(sensor_document: dict) -> tuple[dict, bool]:
+    weather: Database = get_data_gen_client()['weather']
+    sensor_collection: Collection = weather[SENSOR_COLLECTION]
+    sensor_result: Union[dict, None] = sensor_collection.find_one({'sensor_name': sensor_document['sensor_name']})
+    if sensor_result is not None:
+        return sensor_result, False
+
+    # Bump the catalog version so clients know to fetch the new sensor
+    meta_document: dict = weather[CATALOG_META_COLLECTION].find_one_and_update(
+        {'_id': CATALOG_META_ID},
+        {'$inc': {'version': 1}, '$setOnInsert': {'epoch': uuid4().hex}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+    sensor_document = {**sensor_document, 'catalog_version': meta_document['version']}
+    try:
+        sensor_collection.insert_one(sensor_document)
+    except DuplicateKeyError:
+        # Another worker registered the sensor first, which leaves a harmless gap in the versions
+        return sensor_collection.find_one({'sensor_name': sensor_document['sensor_name']}), False
+
+    return sensor_document, True
@@ -0,0 +1,141 @@
+from pymongo import MongoClient
+from pymongo.database import Collection
+from pymongo.results import InsertManyResult
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextvars import copy_context
+from heapq import merge
+from threading import Lock
+from zlib import crc32
+from datetime import datetime
+from typing import Callable, Union
+from .Constants import (DB_OWNER, DB_OWNER_PASSWORD_FILE, DATA_GEN, HASHED_DATA_GEN_PASSWORD, WEB_VIEW,
+                        HASHED_WEB_VIEW_PASSWORD, WAITRESS_THREADS, PARTITION_HOSTS, PARTITION_KEY, PARTITION_STATES)
+from .DatabaseClients import create_app_users
+from .Metrics import increment_counter
+from .Profiler import run_aggregate
+from .SensorCatalog import app_sensor_catalog_index
+from .StorageMongo import (get_write_concern, create_timeseries_collections, build_latest_pipeline, build_raw_pipeline,
+                           build_bucketed_pipeline, get_catalog_meta, get_catalog_sensors, add_catalog_sensor)
+from .Units import get_stored_measurement
+
+# Long-lived clients for each partition, keyed by partition and username, with the catalog kept on the main server
+app_partition_clients: dict[tuple[int, str], MongoClient] = {}
+app_partition_clients_lock: Lock = Lock()
+
+# Enough threads for every waitress thread to reach every partition at once
+app_partition_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=max(len(PARTITION_HOSTS), 1) * WAITRESS_THREADS, thread_name_prefix='partition'
+)
+
+
+def get_partition_client(partition: int, username: str, hashed_password: str) -> MongoClient:
+    # Create the client on first use and reuse its connection pool afterwards
+    with app_partition_clients_lock:
+        if (partition, username) not in app_partition_clients:
+            conn_string: str = f'mongodb://{username}:{hashed_password}@{PARTITION_HOSTS[partition]}/weather'
+            app_partition_clients[(partition, username)] = MongoClient(
+                conn_string, connectTimeoutMS=3000, tz_aware=True
+            )
+
+        return app_partition_clients[(partition, username)]
+
+
+def get_sensor_partition(sensor_name: str, state: Union[str, None] = None) -> int:
+    # Sensors of a mapped state go to that state's partition, and every other sensor by a hash of its name
+    if PARTITION_KEY == 'state':
+        if state is None:
+            state = app_sensor_catalog_index.get(sensor_name, {}).get('state', None)
+        if state in PARTITION_STATES:
+            return PARTITION_STATES[state]
+
+    return crc32(sensor_name.encode()) % len(PARTITION_HOSTS)
+
+
+def scatter_partitions(partition_call: Callable[[int], object]) -> list:
+    # Run the call against every partition at once, each in a copy of the request's context for the profiler
+    partition_futures: list[Future] = [
+        app_partition_executor.submit(copy_context().run, partition_call, partition)
+        for partition in range(len(PARTITION_HOSTS))
+    ]
+    return [partition_future.result() for partition_future in partition_futures]
+
+
+def aggregate_partitions(measurement: str, measurement_pipeline: list) -> list[list[dict]]:
+    stored_measurement: str = get_stored_measurement(measurement)
+    return scatter_partitions(lambda partition: run_aggregate(
+        get_partition_client(partition, WEB_VIEW, HASHED_WEB_VIEW_PASSWORD)['weather'][stored_measurement],
+        measurement_pipeline
+    ))
+
+
+def create_storage() -> None:
+    if len(PARTITION_HOSTS) == 0:
+        raise ValueError('The partitioned storage backend needs at least one server in PARTITION_HOSTS.')
+
+    # Each partition gets the same users and time-series collections, through a client closed before workers fork
+    db_owner_password: str = open(DB_OWNER_PASSWORD_FILE).read()
+    for partition, partition_host in enumerate(PARTITION_HOSTS):
+        owner_client: MongoClient = MongoClient(
+            f'mongodb://{DB_OWNER}:{db_owner_password}@{partition_host}/', connectTimeoutMS=3000
+        )
+        create_app_users(owner_client['weather'])
+        create_timeseries_collections(owner_client['weather'])
+        owner_client.close()
+        print(f'Partition {partition} ready at {partition_host}.')
+
+
+def insert_partition(partition: int, measurement: str, documents: list[dict]) -> list[str]:
+    cur_collection: Collection = get_partition_client(partition, DATA_GEN, HASHED_DATA_GEN_PASSWORD)['weather'] \
+        .get_collection(measurement, write_concern=get_write_concern())
+    insert_result: InsertManyResult = cur_collection.insert_many(documents, ordered=False)
+    increment_counter('proxy_partition_documents_total', (('partition', str(partition)),), len(documents))
+    return [str(inserted_id) for inserted_id in insert_result.inserted_ids]
+
+
+def insert_readings(measurement: str, documents: list[dict]) -> list[str]:
+    # Split the batch by partition and write every part at once
+    partition_documents: dict[int, list[dict]] = {}
+    for document in documents:
+        partition: int = get_sensor_partition(document['sensor_name'], document.get('state', None))
+        partition_documents.setdefault(partition, []).append(document)
+
+    insert_futures: list[Future] = [
+        app_partition_executor.submit(insert_partition, partition, measurement, part_documents)
+        for partition, part_documents in partition_documents.items()
+    ]
+    return [inserted_id for insert_future in insert_futures for inserted_id in insert_future.result()]
+
+
+def get_latest_readings(measurement: str, selected_sensors: Union[list[str], None]) -> list[dict]:
+    # A sensor whose state was mapped after its first readings can be on two partitions, so keep its newest value
+    latest_readings: dict[str, dict] = {}
+    for partition_readings in aggregate_partitions(
+        measurement, build_latest_pipeline(measurement, selected_sensors, with_time=True)
+    ):
+        for latest_reading in partition_readings:
+            kept_reading: Union[dict, None] = latest_readings.get(latest_reading['_id'], None)
+            if kept_reading is None or latest_reading['latest_time'] > kept_reading['latest_time']:
+                latest_readings[latest_reading['_id']] = latest_reading
+
+    return [
+        {'_id': sensor_name, 'latest_value': latest_reading['latest_value']}
+        for sensor_name, latest_reading in latest_readings.items()
+    ]
+
+
+def get_raw_readings(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                     end_date_time: datetime, fields: list[str]) -> list[dict]:
+    # Every partition returns its readings newest first, so merging keeps them in order
+    partition_readings: list[list[dict]] = aggregate_partitions(
+        measurement, build_raw_pipeline(measurement, selected_sensors, start_date_time, end_date_time, fields)
+    )
+    return list(merge(*partition_readings, key=lambda reading: reading['time_recorded'], reverse=True))
+
+
+def get_bucketed_readings(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                          end_date_time: datetime, bucket_seconds: int) -> list[dict]:
+    partition_buckets: list[list[dict]] = aggregate_partitions(
+        measurement, build_bucketed_pipeline(measurement, selected_sensors, start_date_time, end_date_time,
+                                             bucket_seconds)
+    )
+    return list(merge(*partition_buckets, key=lambda bucket: bucket['time_recorded'], reverse=True))
@@ -0,0 +1,207 @@
+import sqlite3
+from threading import local
+from os import getpid
+from datetime import datetime, UTC
+from uuid import uuid4
+from typing import Union
+from .Constants import STORED_MEASUREMENTS, LOCATION_FIELDS, SQLITE_PATH, SQLITE_BUSY_TIMEOUT_MS
+from .Units import get_stored_measurement, convert_value
+
+# Connections are not shared across threads or forked workers, so each thread of each process opens its own
+app_sqlite_connections: local = local()
+
+# Sensor fields kept in the catalog table
+SENSOR_COLUMNS: list[str] = ['sensor_name', 'latitude', 'longitude', 'city', 'county', 'state', 'zip_code']
+CATALOG_META_ID: str = 'sensors'
+
+
+def get_connection() -> sqlite3.Connection:
+    connection: Union[sqlite3.Connection, None] = getattr(app_sqlite_connections, 'connection', None)
+    if connection is None or app_sqlite_connections.pid != getpid():
+        # Autocommit outside explicit transactions, with WAL so readers never wait on the writer
+        connection = sqlite3.connect(SQLITE_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        app_sqlite_connections.connection = connection
+        app_sqlite_connections.pid = getpid()
+
+    return connection
+
+
+def to_timestamp_ms(date_time: datetime) -> int:
+    # Readings are stored as UTC epoch milliseconds, the same precision MongoDB keeps
+    if date_time.tzinfo is None:
+        date_time = date_time.replace(tzinfo=UTC)
+
+    return int(date_time.timestamp() * 1000)
+
+
+def from_timestamp_ms(timestamp_ms: int) -> datetime:
+    return datetime.fromtimestamp(timestamp_ms / 1000, UTC)
+
+
+def get_sensor_clause(selected_sensors: Union[list[str], None], column: str) -> tuple[str, list[str]]:
+    if selected_sensors is None:
+        return '', []
+
+    return f' AND {column} IN ({", ".join("?" * len(selected_sensors))})', list(selected_sensors)
+
+
+def create_storage() -> None:
+    connection: sqlite3.Connection = get_connection()
+
+    # One table per measurement, keeping only the location fields queries return since the rest is in the catalog
+    for measurement in STORED_MEASUREMENTS:
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {measurement} '
+            f'(sensor_name TEXT NOT NULL, time_recorded INTEGER NOT NULL, metric, {", ".join(LOCATION_FIELDS)})'
+        )
+
+        # Latest and per-sensor range queries seek on sensor then time, range queries over every sensor on time
+        connection.execute(
+            f'CREATE INDEX IF NOT EXISTS {measurement}_sensor_time ON {measurement} (sensor_name, time_recorded)'
+        )
+        connection.execute(f'CREATE INDEX IF NOT EXISTS {measurement}_time ON {measurement} (time_recorded)')
+
+    # Create the sensor catalog and its version counter
+    connection.execute(
+        f'CREATE TABLE IF NOT EXISTS sensors '
+        f'(sensor_name TEXT PRIMARY KEY, {", ".join(SENSOR_COLUMNS[1:])}, catalog_version INTEGER NOT NULL)'
+    )
+    connection.execute('CREATE INDEX IF NOT EXISTS sensors_catalog_version ON sensors (catalog_version)')
+    connection.execute('CREATE TABLE IF NOT EXISTS catalog_meta (id TEXT PRIMARY KEY, version INTEGER, epoch TEXT)')
+    connection.execute(
+        'INSERT OR IGNORE INTO catalog_meta (id, version, epoch) VALUES (?, 0, ?)', (CATALOG_META_ID, uuid4().hex)
+    )
+
+    print(f'SQLite storage ready at {SQLITE_PATH}.')
+
+
+def insert_readings(measurement: str, documents: list[dict]) -> list[str]:
+    # Write the whole batch in one transaction, which is what makes SQLite inserts fast
+    reading_rows: list[tuple] = [
+        (
+            document['sensor_name'], to_timestamp_ms(document['time_recorded']), document['metric'],
+            *[document.get(field, None) for field in LOCATION_FIELDS]
+        )
+        for document in documents
+    ]
+    connection: sqlite3.Connection = get_connection()
+    with connection:
+        connection.execute('BEGIN IMMEDIATE')
+        connection.executemany(
+            f'INSERT INTO {measurement} (sensor_name, time_recorded, metric, {", ".join(LOCATION_FIELDS)}) '
+            f'VALUES ({", ".join("?" * (3 + len(LOCATION_FIELDS)))})',
+            reading_rows
+        )
+
+    # Row ids are not reported for batched inserts
+    return []
+
+
+def get_latest_readings(measurement: str, selected_sensors: Union[list[str], None]) -> list[dict]:
+    # Seek each catalog sensor's newest reading through the sensor and time index instead of scanning the table
+    stored_measurement: str = get_stored_measurement(measurement)
+    sensor_clause, sensor_parameters = get_sensor_clause(selected_sensors, 'sensors.sensor_name')
+    latest_rows: list[sqlite3.Row] = get_connection().execute(
+        f'SELECT readings.sensor_name, readings.metric FROM sensors JOIN {stored_measurement} AS readings '
+        f'ON readings.rowid = (SELECT rowid FROM {stored_measurement} WHERE sensor_name = sensors.sensor_name '
+        f'ORDER BY time_recorded DESC LIMIT 1) WHERE 1 = 1{sensor_clause}',
+        sensor_parameters
+    ).fetchall()
+
+    return [
+        {'_id': latest_row['sensor_name'], 'latest_value': convert_value(measurement, latest_row['metric'])}
+        for latest_row in latest_rows
+    ]
+
+
+def get_raw_readings(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                     end_date_time: datetime, fields: list[str]) -> list[dict]:
+    sensor_clause, sensor_parameters = get_sensor_clause(selected_sensors, 'sensor_name')
+    reading_rows: list[sqlite3.Row] = get_connection().execute(
+        f'SELECT {", ".join(fields)}, time_recorded, metric FROM {get_stored_measurement(measurement)} '
+        f'WHERE time_recorded BETWEEN ? AND ?{sensor_clause} ORDER BY time_recorded DESC',
+        [to_timestamp_ms(start_date_time), to_timestamp_ms(end_date_time), *sensor_parameters]
+    ).fetchall()
+
+    return [
+        {
+            **{field: reading_row[field] for field in fields},
+            'time_recorded': from_timestamp_ms(reading_row['time_recorded']),
+            'metric': convert_value(measurement, reading_row['metric'])
+        }
+        for reading_row in reading_rows
+    ]
+
+
+def get_bucketed_readings(measurement: str, selected_sensors: Union[list[str], None], start_date_time: datetime,
+                          end_date_time: datetime, bucket_seconds: int) -> list[dict]:
+    # Integer division of the epoch milliseconds puts each reading in its bucket
+    bucket_ms: int = bucket_seconds * 1000
+    sensor_clause, sensor_parameters = get_sensor_clause(selected_sensors, 'sensor_name')
+    bucket_rows: list[sqlite3.Row] = get_connection().execute(
+        f'SELECT sensor_name, time_recorded / ? * ? AS bucket, AVG(metric) AS mean_metric, MIN(metric) AS min_metric, '
+        f'MAX(metric) AS max_metric, COUNT(*) AS count FROM {get_stored_measurement(measurement)} '
+        f'WHERE time_recorded BETWEEN ? AND ?{sensor_clause} GROUP BY sensor_name, bucket ORDER BY bucket DESC',
+        [bucket_ms, bucket_ms, to_timestamp_ms(start_date_time), to_timestamp_ms(end_date_time), *sensor_parameters]
+    ).fetchall()
+
+    return [
+        {
+            'sensor_name': bucket_row['sensor_name'],
+            'time_recorded': from_timestamp_ms(bucket_row['bucket']),
+            'metric': convert_value(measurement, bucket_row['mean_metric']),
+            'min': convert_value(measurement, bucket_row['min_metric']),
+            'max': convert_value(measurement, bucket_row['max_metric']),
+            'count': bucket_row['count']
+        }
+        for bucket_row in bucket_rows
+    ]
+
+
+def get_catalog_meta() -> dict:
+    meta_row: sqlite3.Row = get_connection().execute(
+        'SELECT version, epoch FROM catalog_meta WHERE id = ?', (CATALOG_META_ID,)
+    ).fetchone()
+    return dict(meta_row)
+
+
+def get_sensor_document(sensor_row: sqlite3.Row) -> dict:
+    return {'_id': sensor_row['rowid'], **{column: sensor_row[column] for column in SENSOR_COLUMNS},
+            'catalog_version': sensor_row['catalog_version']}
+
+
+def get_catalog_sensors(after_version: int) -> list[dict]:
+    sensor_rows: list[sqlite3.Row] = get_connection().execute(
+        f'SELECT rowid, {", ".join(SENSOR_COLUMNS)}, catalog_version FROM sensors WHERE catalog_version > ? '
+        f'ORDER BY catalog_version',
+        (after_version,)
+    ).fetchall()
+    return [get_sensor_document(sensor_row) for sensor_row in sensor_rows]
+
+
+def add_catalog_sensor(sensor_document: dict) -> tuple[dict, bool]:
+    connection: sqlite3.Connection = get_connection()
+    with connection:
+        # Take the write lock first so the version bump and the insert cannot interleave with another process
+        connection.execute('BEGIN IMMEDIATE')
+        sensor_row: Union[sqlite3.Row, None] = connection.execute(
+            f'SELECT rowid, {", ".join(SENSOR_COLUMNS)}, catalog_version FROM sensors WHERE sensor_name = ?',
+            (sensor_document['sensor_name'],)
+        ).fetchone()
+        if sensor_row is not None:
+            return get_sensor_document(sensor_row), False
+
+        # Bump the catalog version so clients know to fetch the new sensor
+        catalog_version: int = connection.execute(
+            'UPDATE catalog_meta SET version = version + 1 WHERE id = ? RETURNING version', (CATALOG_META_ID,)
+        ).fetchone()['version']
+        sensor_rowid: int = connection.execute(
+            f'INSERT INTO sensors ({", ".join(SENSOR_COLUMNS)}, catalog_version) '
+            f'VALUES ({", ".join("?" * (len(SENSOR_COLUMNS) + 1))})',
+            [*[sensor_document.get(column, None) for column in SENSOR_COLUMNS], catalog_version]
+        ).lastrowid
+
+    return {**sensor_document, '_id': sensor_rowid, 'catalog_version': catalog_version}, True
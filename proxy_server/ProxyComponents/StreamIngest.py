@@ -0,0 +1,117 @@
+from pymongo.errors import OperationFailure, ConnectionFailure
+from sqlite3 import Error as SQLiteError
+from msgpack import packb, unpackb, UnpackException
+from threading import Thread
+from time import sleep
+import asyncio
+from .Constants import (DATA_GEN, HASHED_DATA_GEN_PASSWORD, INGEST_FLUSH_MS, STREAM_INGEST_PORT, STREAM_ACK_FRAMES,
+                        STREAM_ACK_MS, STREAM_AUTH_TIMEOUT_SECONDS, STREAM_MAX_FRAME_BYTES)
+from .IngestFormats import decode_reading_batch
+from .IngestQueue import IngestQueueFull, IngestTimeout, insert_documents, validate_batch, process_new_readings
+from .Metrics import increment_counter
+from .Units import drop_derived_documents
+
+# Every frame is a four byte big-endian length followed by that many bytes of MessagePack
+FRAME_HEADER_BYTES: int = 4
+
+
+def write_frame(writer: asyncio.StreamWriter, message: dict) -> None:
+    frame_body: bytes = packb(message)
+    writer.write(len(frame_body).to_bytes(FRAME_HEADER_BYTES, 'big') + frame_body)
+
+
+async def read_frame_body(reader: asyncio.StreamReader, frame_header: bytes) -> bytes:
+    frame_length: int = int.from_bytes(frame_header, 'big')
+    if frame_length > STREAM_MAX_FRAME_BYTES:
+        raise ValueError(f'Frame of {frame_length} bytes is over the {STREAM_MAX_FRAME_BYTES} byte limit.')
+
+    return await reader.readexactly(frame_length)
+
+
+def ingest_stream_batch(batch_documents: dict[str, list[dict]]) -> None:
+    for collection, documents in batch_documents.items():
+        if len(documents) == 0:
+            continue
+
+        # Hold the stream while the ingest queue is full, which stops reading and pushes back on the sender
+        while True:
+            try:
+                insert_documents(collection, documents)
+                break
+            except IngestQueueFull:
+                sleep(INGEST_FLUSH_MS / 1000)
+
+    process_new_readings(batch_documents)
+
+
+async def handle_stream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    increment_counter('proxy_stream_connections')
+    received_frames: int = 0
+    acked_frames: int = 0
+    try:
+        # The first frame carries the credentials for the whole connection
+        frame_header: bytes = await asyncio.wait_for(
+            reader.readexactly(FRAME_HEADER_BYTES), STREAM_AUTH_TIMEOUT_SECONDS
+        )
+        credentials: dict = unpackb(await read_frame_body(reader, frame_header))
+        if credentials.get('username', None) != DATA_GEN or \
+                credentials.get('password', None) != HASHED_DATA_GEN_PASSWORD:
+            write_frame(writer, {'status': 'Unauthorized', 'message': 'Invalid username or password.'})
+            await writer.drain()
+            return
+
+        write_frame(writer, {'status': 'Authenticated', 'ack_frames': STREAM_ACK_FRAMES, 'ack_ms': STREAM_ACK_MS})
+        await writer.drain()
+
+        while True:
+            # Acknowledge what has been written so far whenever the sender goes quiet
+            try:
+                frame_header: bytes = await asyncio.wait_for(
+                    reader.readexactly(FRAME_HEADER_BYTES), STREAM_ACK_MS / 1000
+                )
+            except TimeoutError:
+                if acked_frames < received_frames:
+                    write_frame(writer, {'status': 'Ack', 'frames': received_frames})
+                    await writer.drain()
+                    acked_frames = received_frames
+                continue
+
+            # Frames are the same reading batches the batch endpoint takes, handled in order off the event loop
+            batch_documents: dict[str, list[dict]] = decode_reading_batch(await read_frame_body(reader, frame_header))
+            validate_batch(batch_documents)
+            await asyncio.to_thread(ingest_stream_batch, drop_derived_documents(batch_documents))
+            received_frames += 1
+            increment_counter('proxy_stream_frames_total', (('result', 'ingested'),))
+
+            # Cumulative acknowledgements let the sender keep a bounded number of frames in flight
+            if received_frames - acked_frames >= STREAM_ACK_FRAMES:
+                write_frame(writer, {'status': 'Ack', 'frames': received_frames})
+                await writer.drain()
+                acked_frames = received_frames
+    except (asyncio.IncompleteReadError, ConnectionError, TimeoutError):
+        # The sender hung up or never authenticated
+        pass
+    except (KeyError, IndexError, TypeError, ValueError, UnpackException, OperationFailure, ConnectionFailure,
+            SQLiteError, IngestTimeout) as e:
+        # Tell the sender how far it got before closing, so it can resend the rest
+        increment_counter('proxy_stream_frames_total', (('result', 'rejected'),))
+        write_frame(writer, {'status': 'Error', 'message': str(e), 'frames': received_frames})
+        await writer.drain()
+    finally:
+        increment_counter('proxy_stream_connections', amount=-1.0)
+        writer.close()
+
+
+async def serve_stream_ingest() -> None:
+    stream_server: asyncio.Server = await asyncio.start_server(handle_stream, host='0.0.0.0', port=STREAM_INGEST_PORT)
+    print(f'Streaming ingest listening on port {STREAM_INGEST_PORT}.')
+    async with stream_server:
+        await stream_server.serve_forever()
+
+
+def start_stream_ingest() -> None:
+    if STREAM_INGEST_PORT == 0:
+        return
+
+    stream_thread: Thread = Thread(target=asyncio.run, args=(serve_stream_ingest(),), name='stream-ingest', daemon=True)
+    stream_thread.start()
@@ -0,0 +1,93 @@
+from pymongo import MongoClient
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+from typing import Union
+from .Constants import (STORAGE_UNITS, CUSTOMARY_CONVERSIONS, ROLLUP_TIERS, ROLLUP_WATERMARK_COLLECTION,
+                        ARCHIVE_WATERMARK_COLLECTION)
+from .Rollups import get_rollup_collection_name
+
+
+def is_derived_measurement(measurement: str) -> bool:
+    # Derived measurements have no collection of their own and are converted from their metric one on read
+    return STORAGE_UNITS == 'metric' and measurement in CUSTOMARY_CONVERSIONS
+
+
+def get_stored_measurement(measurement: str) -> str:
+    return CUSTOMARY_CONVERSIONS[measurement][0] if is_derived_measurement(measurement) else measurement
+
+
+def get_conversion(measurement: str) -> tuple[float, float]:
+    # Scale and offset from the stored unit, which leaves stored measurements unchanged
+    if not is_derived_measurement(measurement):
+        return 1.0, 0.0
+
+    _, scale, offset = CUSTOMARY_CONVERSIONS[measurement]
+    return scale, offset
+
+
+def convert_value(measurement: str, value: Union[float, None]) -> Union[float, None]:
+    if value is None or not is_derived_measurement(measurement):
+        return value
+
+    scale, offset = get_conversion(measurement)
+    return value * scale + offset
+
+
+def invert_value(measurement: str, value: float) -> float:
+    # Turn a value in the requested unit back into the stored unit, for filters on stored readings
+    scale, offset = get_conversion(measurement)
+    return (value - offset) / scale
+
+
+def build_conversion_stages(measurement: str, fields: list[str]) -> list[dict]:
+    # Convert the given fields inside the pipeline so results leave MongoDB in the requested unit
+    if not is_derived_measurement(measurement):
+        return []
+
+    scale, offset = get_conversion(measurement)
+    return [{'$set': {
+        field: {'$add': [{'$multiply': [f'${field}', scale]}, offset]} for field in fields
+    }}]
+
+
+def drop_derived_documents(batch_documents: dict[str, list[dict]]) -> dict[str, list[dict]]:
+    # Generators that still send every unit have their customary readings dropped, since they are derived on read
+    return {
+        collection: documents for collection, documents in batch_documents.items()
+        if not is_derived_measurement(collection)
+    }
+
+
+def migrate_storage_units(client: MongoClient, force: bool = False) -> None:
+    if STORAGE_UNITS != 'metric':
+        raise ValueError('Set STORAGE_UNITS to metric before migrating to metric storage.')
+
+    weather: Database = client['weather']
+    existing_collections: list[str] = weather.list_collection_names()
+    for customary_measurement, (metric_measurement, _, _) in CUSTOMARY_CONVERSIONS.items():
+        if customary_measurement not in existing_collections:
+            print(f'{customary_measurement} is already derived from {metric_measurement}.')
+            continue
+
+        # Both units were always written together, so the metric collection should hold every customary reading
+        customary_count: int = weather[customary_measurement].count_documents({})
+        metric_count: int = weather[metric_measurement].count_documents({})
+        if metric_count < customary_count and not force:
+            print(
+                f'Kept {customary_measurement}: it holds {customary_count} readings but {metric_measurement} only '
+                f'holds {metric_count}. Rerun with --force to drop it anyway.'
+            )
+            continue
+
+        # Drop the customary readings, their rollups and their watermarks, keeping any archived days on disk
+        try:
+            weather.drop_collection(customary_measurement)
+            for tier in ROLLUP_TIERS.keys():
+                weather.drop_collection(get_rollup_collection_name(customary_measurement, tier))
+            weather[ROLLUP_WATERMARK_COLLECTION].delete_one({'_id': customary_measurement})
+            weather[ARCHIVE_WATERMARK_COLLECTION].delete_one({'_id': customary_measurement})
+        except OperationFailure as e:
+            print(f'Dropping {customary_measurement} failed. Reason: {e}')
+            continue
+
+        print(f'Dropped {customary_measurement}, which is now derived from {metric_measurement}.')
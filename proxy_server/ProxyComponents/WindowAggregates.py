@@ -0,0 +1,181 @@
+import numpy as np
+from threading import Lock
+from time import time
+from datetime import datetime, timedelta, UTC
+from typing import Union
+from .Constants import (STORED_MEASUREMENTS, NON_NUMERIC_MEASUREMENTS, PROXY_WORKERS, AGGREGATE_WINDOW_MINUTES,
+                        AGGREGATE_BUCKET_SECONDS)
+from .HotStore import get_timestamp_ms
+from .Storage import get_storage
+from .Units import get_stored_measurement, get_conversion
+
+# Each worker only sees the readings sent to it, so the aggregates are only complete with a single worker
+WINDOW_AGGREGATES_ENABLED: bool = PROXY_WORKERS == 1
+BUCKET_MS: int = AGGREGATE_BUCKET_SECONDS * 1000
+# Enough buckets for the longest window and the one before it, which its change is measured against
+AGGREGATE_BUCKETS: int = 2 * max(AGGREGATE_WINDOW_MINUTES) * 60 // AGGREGATE_BUCKET_SECONDS
+GLOBAL_ROW: int = 0  # Every reading of a measurement is also added to this row, ahead of the sensors' own rows
+INITIAL_ROWS: int = 64
+
+
+class WindowBuckets:
+    # Count, sum, min and max of one measurement's readings per time bucket, in a ring of buckets for each row
+    def __init__(self) -> None:
+        self.lock: Lock = Lock()
+        self.bucket_ids: np.ndarray = np.full((INITIAL_ROWS, AGGREGATE_BUCKETS), -1, dtype=np.int64)
+        self.counts: np.ndarray = np.zeros((INITIAL_ROWS, AGGREGATE_BUCKETS), dtype=np.int64)
+        self.sums: np.ndarray = np.zeros((INITIAL_ROWS, AGGREGATE_BUCKETS), dtype=np.float64)
+        self.minimums: np.ndarray = np.full((INITIAL_ROWS, AGGREGATE_BUCKETS), np.inf, dtype=np.float64)
+        self.maximums: np.ndarray = np.full((INITIAL_ROWS, AGGREGATE_BUCKETS), -np.inf, dtype=np.float64)
+        self.sensor_rows: dict[str, int] = {}
+
+
+# One set of buckets per stored numeric measurement
+app_window_buckets: dict[str, WindowBuckets] = {
+    measurement: WindowBuckets() for measurement in STORED_MEASUREMENTS if measurement not in NON_NUMERIC_MEASUREMENTS
+} if WINDOW_AGGREGATES_ENABLED else {}
+
+
+def get_window_row(window_buckets: WindowBuckets, sensor_name: str) -> int:
+    sensor_row: Union[int, None] = window_buckets.sensor_rows.get(sensor_name, None)
+    if sensor_row is not None:
+        return sensor_row
+
+    # Double the rows once every one is taken, with new rows holding empty buckets
+    sensor_row = len(window_buckets.sensor_rows) + 1
+    if sensor_row == window_buckets.bucket_ids.shape[0]:
+        window_buckets.bucket_ids = np.vstack([window_buckets.bucket_ids, np.full_like(window_buckets.bucket_ids, -1)])
+        window_buckets.counts = np.vstack([window_buckets.counts, np.zeros_like(window_buckets.counts)])
+        window_buckets.sums = np.vstack([window_buckets.sums, np.zeros_like(window_buckets.sums)])
+        window_buckets.minimums = np.vstack([window_buckets.minimums, np.full_like(window_buckets.minimums, np.inf)])
+        window_buckets.maximums = np.vstack([window_buckets.maximums, np.full_like(window_buckets.maximums, -np.inf)])
+
+    window_buckets.sensor_rows[sensor_name] = sensor_row
+    return sensor_row
+
+
+def add_to_bucket(window_buckets: WindowBuckets, row: int, bucket_id: int, value: float) -> None:
+    # A slot still holding an older bucket is emptied first, and readings older than the slot's bucket are dropped
+    slot: int = bucket_id % AGGREGATE_BUCKETS
+    slot_bucket_id: int = int(window_buckets.bucket_ids[row, slot])
+    if slot_bucket_id > bucket_id:
+        return
+    if slot_bucket_id < bucket_id:
+        window_buckets.bucket_ids[row, slot] = bucket_id
+        window_buckets.counts[row, slot] = 0
+        window_buckets.sums[row, slot] = 0.0
+        window_buckets.minimums[row, slot] = np.inf
+        window_buckets.maximums[row, slot] = -np.inf
+
+    window_buckets.counts[row, slot] += 1
+    window_buckets.sums[row, slot] += value
+    window_buckets.minimums[row, slot] = min(window_buckets.minimums[row, slot], value)
+    window_buckets.maximums[row, slot] = max(window_buckets.maximums[row, slot], value)
+
+
+def add_window_readings(measurement: str, documents: list[dict]) -> None:
+    window_buckets: Union[WindowBuckets, None] = app_window_buckets.get(measurement, None)
+    if window_buckets is None:
+        return
+
+    # Each reading touches one bucket of the global row and one of its sensor's row
+    with window_buckets.lock:
+        for document in documents:
+            if not isinstance(document['metric'], (int, float)):
+                continue
+
+            bucket_id: int = get_timestamp_ms(document['time_recorded']) // BUCKET_MS
+            add_to_bucket(window_buckets, GLOBAL_ROW, bucket_id, document['metric'])
+            add_to_bucket(window_buckets, get_window_row(window_buckets, document['sensor_name']), bucket_id,
+                          document['metric'])
+
+
+def warm_window_aggregates() -> None:
+    if not WINDOW_AGGREGATES_ENABLED:
+        return
+
+    # Load the readings every window and the one before it cover, including any stamped ahead of the clock
+    warm_start: datetime = datetime.now(UTC) - timedelta(minutes=2 * max(AGGREGATE_WINDOW_MINUTES))
+    warm_end: datetime = datetime.max.replace(tzinfo=UTC)
+    for measurement in app_window_buckets.keys():
+        readings: list[dict] = get_storage().get_raw_readings(measurement, None, warm_start, warm_end, ['sensor_name'])
+        add_window_readings(measurement, readings[::-1])
+
+
+def summarize_rows(window_buckets: WindowBuckets, rows: np.ndarray, latest_bucket_id: int, window_minutes: int,
+                   scale: float, offset: float) -> dict[str, Union[int, float, None]]:
+    # The window is its newest buckets up to now, and its change is measured against the window before it
+    window_buckets_count: int = window_minutes * 60 // AGGREGATE_BUCKET_SECONDS
+    bucket_ids: np.ndarray = window_buckets.bucket_ids[rows]
+    in_window: np.ndarray = (bucket_ids > latest_bucket_id - window_buckets_count) & (bucket_ids <= latest_bucket_id)
+    in_previous: np.ndarray = (bucket_ids > latest_bucket_id - 2 * window_buckets_count) & \
+        (bucket_ids <= latest_bucket_id - window_buckets_count)
+
+    counts: np.ndarray = window_buckets.counts[rows]
+    sums: np.ndarray = window_buckets.sums[rows]
+    window_count: int = int(counts[in_window].sum())
+    if window_count == 0:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None, 'change_per_minute': None}
+
+    # Scale and offset put the stored unit into the requested one, and a change only needs the scale
+    window_mean: float = float(sums[in_window].sum()) / window_count
+    previous_count: int = int(counts[in_previous].sum())
+    if previous_count > 0:
+        previous_mean: float = float(sums[in_previous].sum()) / previous_count
+        change_per_minute: Union[float, None] = (window_mean - previous_mean) / window_minutes * scale
+    else:
+        change_per_minute: Union[float, None] = None
+
+    return {
+        'count': window_count,
+        'mean': window_mean * scale + offset,
+        'min': float(window_buckets.minimums[rows][in_window].min()) * scale + offset,
+        'max': float(window_buckets.maximums[rows][in_window].max()) * scale + offset,
+        'change_per_minute': change_per_minute
+    }
+
+
+def get_window_aggregates(measurements: list[str], selected_sensors: Union[list[str], None]) -> dict[str, dict]:
+    if not WINDOW_AGGREGATES_ENABLED:
+        raise ValueError('Sliding-window aggregates are only kept when the proxy runs a single worker.')
+
+    # Every window ends at the bucket the clock is in now
+    latest_bucket_id: int = int(time() * 1000) // BUCKET_MS
+    window_aggregates: dict[str, dict] = {}
+    for measurement in measurements:
+        window_buckets: Union[WindowBuckets, None] = app_window_buckets.get(get_stored_measurement(measurement), None)
+        if window_buckets is None:
+            continue
+
+        scale, offset = get_conversion(measurement)
+        with window_buckets.lock:
+            # Every sensor is summarized from the global row, and selected sensors from their own rows together
+            if selected_sensors is None:
+                sensor_rows: dict[str, int] = {}
+                overall_rows: np.ndarray = np.array([GLOBAL_ROW], dtype=np.int64)
+            else:
+                sensor_rows: dict[str, int] = {
+                    sensor_name: window_buckets.sensor_rows[sensor_name] for sensor_name in set(selected_sensors)
+                    if sensor_name in window_buckets.sensor_rows
+                }
+                overall_rows: np.ndarray = np.array(list(sensor_rows.values()), dtype=np.int64)
+
+            window_aggregates[measurement] = {
+                'overall': {
+                    f'{window_minutes}m': summarize_rows(
+                        window_buckets, overall_rows, latest_bucket_id, window_minutes, scale, offset
+                    )
+                    for window_minutes in AGGREGATE_WINDOW_MINUTES
+                },
+                'sensors': {
+                    sensor_name: {
+                        f'{window_minutes}m': summarize_rows(
+                            window_buckets, np.array([sensor_row]), latest_bucket_id, window_minutes, scale, offset
+                        )
+                        for window_minutes in AGGREGATE_WINDOW_MINUTES
+                    }
+                    for sensor_name, sensor_row in sensor_rows.items()
+                }
+            }
+
+    return window_aggregates
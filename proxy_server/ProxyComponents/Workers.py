@@ -0,0 +1,150 @@
+from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+from os import (fork, wait, waitpid, kill, makedirs, listdir, remove, pipe, read, write, set_blocking, _exit,
+                WIFSIGNALED, WTERMSIG, WEXITSTATUS)
+from os.path import join
+from select import PIPE_BUF
+from signal import signal, SIGTERM, SIGINT
+from threading import Thread
+from msgpack import packb, unpackb
+from typing import Callable, Union
+from .Constants import PROXY_WORKERS, METRICS_SNAPSHOT_DIR
+from .DatabaseClients import close_shared_clients
+from .Metrics import increment_counter, clear_metrics, remove_metric_snapshot
+
+# Worker process IDs mapped to their worker index, where index 0 is the leader that runs the shared background jobs
+app_worker_pids: dict[int, int] = {}
+
+# Pipe the other workers send messages to the leader through, and whether this process is the leader
+app_leader_pipe: Union[tuple[int, int], None] = None
+app_is_leader: bool = True  # A single process is its own leader
+FRAME_HEADER_BYTES: int = 4
+
+
+def is_leader() -> bool:
+    return app_is_leader
+
+
+def send_to_leader(message: dict) -> bool:
+    # Frames up to PIPE_BUF are written whole even with every worker writing, and a full pipe drops the frame
+    # instead of stalling the request
+    payload: bytes = packb(message, datetime=True)
+    frame: bytes = len(payload).to_bytes(FRAME_HEADER_BYTES, 'big') + payload
+    try:
+        if len(frame) > PIPE_BUF:
+            raise BlockingIOError(f'Frame of {len(frame)} bytes is larger than a pipe writes whole.')
+        write(app_leader_pipe[1], frame)
+    except BlockingIOError:
+        increment_counter('proxy_leader_messages_dropped_total')
+        return False
+
+    return True
+
+
+def run_leader_inbox(handle_message: Callable[[dict], None]) -> None:
+    # Split the byte stream back into frames, which can arrive split across reads
+    pending_bytes: bytes = b''
+    while True:
+        pending_bytes += read(app_leader_pipe[0], 65536)
+        while len(pending_bytes) >= FRAME_HEADER_BYTES:
+            frame_end: int = FRAME_HEADER_BYTES + int.from_bytes(pending_bytes[:FRAME_HEADER_BYTES], 'big')
+            if len(pending_bytes) < frame_end:
+                break
+
+            handle_message(unpackb(pending_bytes[FRAME_HEADER_BYTES:frame_end], timestamp=3))
+            pending_bytes = pending_bytes[frame_end:]
+
+
+def start_leader_inbox(handle_message: Callable[[dict], None]) -> None:
+    if app_leader_pipe is None:
+        return
+
+    inbox_thread: Thread = Thread(target=run_leader_inbox, args=(handle_message,), name='leader-inbox', daemon=True)
+    inbox_thread.start()
+
+
+def create_listen_socket(port: int) -> socket:
+    # Bind once in the parent so every worker accepts from the same socket
+    listen_socket: socket = socket(AF_INET, SOCK_STREAM)
+    listen_socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    listen_socket.bind(('0.0.0.0', port))
+    listen_socket.listen(1024)
+    return listen_socket
+
+
+def exit_on_signal(signum: int, frame) -> None:
+    # Leave through SystemExit, so the process runs its cleanup before it stops
+    raise SystemExit(0)
+
+
+def spawn_worker(worker_index: int, listen_socket: socket, run_worker: Callable[[int, socket], None]) -> None:
+    global app_is_leader
+
+    worker_pid: int = fork()
+    if worker_pid == 0:
+        app_is_leader = worker_index == 0
+        app_worker_pids.clear()
+        # SIGTERM from the parent, or SIGINT sent to the whole process group by Ctrl-C, ends serving instead of running
+        # the parent's shutdown, which lets the worker flush its ingest queue before exiting
+        signal(SIGTERM, exit_on_signal)
+        signal(SIGINT, exit_on_signal)
+        clear_metrics()
+        try:
+            run_worker(worker_index, listen_socket)
+        except SystemExit:
+            _exit(0)
+        finally:
+            _exit(1)
+
+    app_worker_pids[worker_pid] = worker_index
+    print(f'Started worker {worker_index} with process ID {worker_pid}.')
+
+
+def stop_workers(signum: int, frame) -> None:
+    for worker_pid in list(app_worker_pids.keys()):
+        try:
+            kill(worker_pid, SIGTERM)
+        except ProcessLookupError:  # The worker already got the signal from the terminal
+            pass
+
+    # Wait for every worker to flush its queue, since the container stops as soon as the parent exits
+    for worker_pid in list(app_worker_pids.keys()):
+        try:
+            waitpid(worker_pid, 0)
+        except ChildProcessError:
+            pass
+    _exit(0)
+
+
+def run_workers(listen_socket: socket, run_worker: Callable[[int, socket], None]) -> None:
+    global app_leader_pipe
+
+    # Start from an empty snapshot directory so metrics from an earlier run are not counted
+    makedirs(METRICS_SNAPSHOT_DIR, exist_ok=True)
+    for snapshot_name in listdir(METRICS_SNAPSHOT_DIR):
+        remove(join(METRICS_SNAPSHOT_DIR, snapshot_name))
+
+    # The parent warmed its state through shared MongoDB clients, whose sockets and monitor threads cannot be forked
+    close_shared_clients()
+
+    # The parent keeps both ends open, so a restarted leader picks up the messages its predecessor did not read
+    app_leader_pipe = pipe()
+    set_blocking(app_leader_pipe[1], False)
+
+    # Fork every worker, which open their own clients and start their own threads
+    for worker_index in range(PROXY_WORKERS):
+        spawn_worker(worker_index, listen_socket, run_worker)
+
+    signal(SIGTERM, stop_workers)
+    signal(SIGINT, stop_workers)
+
+    # Replace workers that stop, keeping the index so the leader is always replaced by a new leader
+    while True:
+        worker_pid, worker_status = wait()
+        worker_index: int = app_worker_pids.pop(worker_pid)
+        if WIFSIGNALED(worker_status):
+            print(f'Worker {worker_index} was stopped by signal {WTERMSIG(worker_status)}. Restarting it.')
+        else:
+            print(f'Worker {worker_index} exited with status {WEXITSTATUS(worker_status)}. Restarting it.')
+
+        remove_metric_snapshot(worker_pid)
+        spawn_worker(worker_index, listen_socket, run_worker)
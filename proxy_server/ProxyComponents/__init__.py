@@ -0,0 +1,68 @@
+__all__ = [
+    "DB_HOST", "DB_PORT", "DB_OWNER", "DB_OWNER_PASSWORD_FILE", "DATA_GEN", "WEB_VIEW", "HASHED_DATA_GEN_PASSWORD",
+    "HASHED_WEB_VIEW_PASSWORD", "CUSTOMARY_MEASUREMENTS", "METRIC_MEASUREMENTS", "ALL_MEASUREMENTS",
+    "NON_NUMERIC_MEASUREMENTS", "ANOMALY_RESULT_LIMIT", "INGEST_MODE", "INGEST_FLUSH_MS",
+    "migrate_sensor_catalog", "warm_sensor_catalog", "register_sensor", "get_catalog_etag", "get_catalog_delta",
+    "get_sensor_catalog", "get_data_gen_client", "get_web_view_client", "create_rollup_collections",
+    "choose_rollup_tier", "get_rollup_collection_name", "build_rollup_pipeline", "start_rollup_compaction",
+    "rebuild_rollups", "get_catalog_summary", "increment_counter", "observe_histogram", "render_metrics",
+    "register_mongo_metrics", "load_alert_rules", "create_alert_collection", "warm_open_alerts",
+    "evaluate_alert_rules", "get_alerts", "warm_detector_state", "update_outlier_detector",
+    "start_detector_snapshots", "get_detector_baselines", "IngestQueueFull", "IngestTimeout", "validate_document",
+    "insert_document", "insert_documents", "start_ingest_flushers", "MSGPACK_CONTENT_TYPE", "decode_reading_batch",
+    "validate_batch", "process_new_readings", "start_stream_ingest", "PROXY_PORT", "PROXY_WORKERS",
+    "start_catalog_refresh", "start_metric_snapshots", "create_listen_socket", "run_workers",
+    "PROFILE_HEADER", "start_profile", "mark_stage", "run_aggregate", "finish_profile",
+    "RESTORED_COLLECTION_PREFIX", "apply_retention", "start_archiver", "restore_archive",
+    "get_archive_boundary", "read_archived_measurements", "STORED_MEASUREMENTS", "is_derived_measurement",
+    "get_stored_measurement", "invert_value", "build_conversion_stages", "drop_derived_documents",
+    "migrate_storage_units", "DOCUMENT_MODE", "get_location_projection", "join_sensor_locations",
+    "sum_by_sensor_location", "get_sensors_in_area", "get_query_key",
+    "run_coalesced", "WAITRESS_THREADS", "ADMISSION_RETRY_AFTER_SECONDS", "estimate_query_cost", "classify_query",
+    "admit_request", "release_request", "STORAGE_BACKEND", "get_storage",
+    "warm_hot_store", "get_hot_readings",
+    "warm_window_aggregates", "get_window_aggregates", "SPATIAL_LEVEL_FIELDS", "SPATIAL_ROLLUP_LEVEL",
+    "SPATIAL_BUCKET_SECONDS", "average_by_sensor_location", "build_spatial_rollup_pipeline", "convert_value",
+    "get_sketch_percentiles", "MONGO_CATALOG_BACKENDS", "create_app_users",
+    "get_mongo_address", "get_client_options", "drain_ingest_queues", "exit_on_signal",
+    "check_new_reading", "check_forwarded_reading", "start_leader_inbox", "WINDOW_AGGREGATES_ENABLED"
+]
+
+from .Constants import (DB_HOST, DB_PORT, DB_OWNER, DB_OWNER_PASSWORD_FILE, DATA_GEN, WEB_VIEW,
+                        HASHED_DATA_GEN_PASSWORD, HASHED_WEB_VIEW_PASSWORD, CUSTOMARY_MEASUREMENTS, METRIC_MEASUREMENTS,
+                        ALL_MEASUREMENTS, NON_NUMERIC_MEASUREMENTS, ANOMALY_RESULT_LIMIT, INGEST_MODE,
+                        INGEST_FLUSH_MS, PROXY_PORT, PROXY_WORKERS, RESTORED_COLLECTION_PREFIX,
+                        STORED_MEASUREMENTS, DOCUMENT_MODE, WAITRESS_THREADS, ADMISSION_RETRY_AFTER_SECONDS,
+                        STORAGE_BACKEND, SPATIAL_LEVEL_FIELDS, SPATIAL_ROLLUP_LEVEL, SPATIAL_BUCKET_SECONDS,
+                        MONGO_CATALOG_BACKENDS)
+from .SensorCatalog import (migrate_sensor_catalog, warm_sensor_catalog, register_sensor, get_catalog_etag,
+                            get_catalog_delta, get_sensor_catalog, get_catalog_summary, start_catalog_refresh,
+                            get_location_projection, join_sensor_locations, sum_by_sensor_location,
+                            get_sensors_in_area)
+from .DatabaseClients import (get_data_gen_client, get_web_view_client, create_app_users, get_mongo_address,
+                              get_client_options)
+from .Rollups import (create_rollup_collections, choose_rollup_tier, get_rollup_collection_name, build_rollup_pipeline,
+                      build_spatial_rollup_pipeline, start_rollup_compaction, rebuild_rollups,
+                      average_by_sensor_location)
+from .Metrics import (increment_counter, observe_histogram, render_metrics, register_mongo_metrics,
+                      start_metric_snapshots)
+from .AlertRules import load_alert_rules, create_alert_collection, warm_open_alerts, evaluate_alert_rules, get_alerts
+from .OutlierDetector import (warm_detector_state, update_outlier_detector, start_detector_snapshots,
+                              get_detector_baselines)
+from .IngestQueue import (IngestQueueFull, IngestTimeout, validate_document, insert_document, insert_documents,
+                          start_ingest_flushers, validate_batch, process_new_readings, drain_ingest_queues,
+                          check_new_reading, check_forwarded_reading)
+from .IngestFormats import MSGPACK_CONTENT_TYPE, decode_reading_batch
+from .StreamIngest import start_stream_ingest
+from .Workers import create_listen_socket, run_workers, exit_on_signal, start_leader_inbox
+from .Storage import get_storage
+from .Sketches import get_sketch_percentiles
+from .HotStore import warm_hot_store, get_hot_readings
+from .WindowAggregates import WINDOW_AGGREGATES_ENABLED, warm_window_aggregates, get_window_aggregates
+from .Profiler import PROFILE_HEADER, start_profile, mark_stage, run_aggregate, finish_profile
+from .Units import (is_derived_measurement, get_stored_measurement, convert_value, invert_value,
+                    build_conversion_stages, drop_derived_documents, migrate_storage_units)
+from .Admission import estimate_query_cost, classify_query, admit_request, release_request
+from .Coalescing import get_query_key, run_coalesced
+from .Archive import (apply_retention, start_archiver, restore_archive, get_archive_boundary,
+                      read_archived_measurements)
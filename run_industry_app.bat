@@ -21,6 +21,10 @@ powershell -Command^
 powershell -Command^
  "[System.Guid]::NewGuid().ToString() | Set-Content -Path 'secrets/web_view_password.txt' -NoNewline"
 
+:: Generate key the replica set members authenticate each other with
+powershell -Command^
+ "[Convert]::ToBase64String((1..756 | ForEach-Object { [byte](Get-Random -Maximum 256) })) | Set-Content -Path 'secrets/mongo_replica_key.txt' -NoNewline"
+
 echo Accounts created! Starting IoT weather app...
 
 :: Run Docker Compose to start up the containers
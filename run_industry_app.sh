@@ -18,6 +18,9 @@ uuidgen | tr -d '\n' > secrets/data_gen_password.txt
 # Generate password for web viewer
 uuidgen | tr -d '\n' > secrets/web_view_password.txt
 
+# Generate key the replica set members authenticate each other with
+openssl rand -base64 756 > secrets/mongo_replica_key.txt
+
 echo "Accounts created! Starting IoT weather app..."
 
 # Run Docker Compose to start up the containers
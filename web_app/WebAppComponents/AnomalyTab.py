@@ -1,6 +1,7 @@
 import streamlit as st
 from typing import Union
 from datetime import datetime, timedelta
+import pandas as pd
 from .Constants import FRAGMENT_RERUN_SPEED
 
 
@@ -123,16 +124,32 @@ def create_anomaly_settings() -> None:
         )
 
 
-def check_metric_for_anomalies(historical_data: [dict[str, list]], metric_name: str, metric_title: str) -> None:
+def check_metric_for_anomalies(anomaly_data: dict[str, dict], metric_name: str, metric_title: str) -> None:
     # Print a title
     st.subheader(f'{metric_title.title()} Anomalies')
 
+    # Wait for the proxy to check this measurement
+    if metric_name not in anomaly_data['readings']:
+        st.info(f'{metric_title.title()} anomalies are still loading.', icon="⏳")
+        return
+
+    # Summarize where the anomalies happened
+    anomaly_readings: list[dict] = anomaly_data['readings'][metric_name]
+    anomaly_counts: dict = anomaly_data['counts'][metric_name]
+    if anomaly_counts['total'] > 0:
+        city_counts: list[tuple[str, int]] = sorted(
+            anomaly_counts['by_city'].items(), key=lambda city_count: city_count[1], reverse=True
+        )
+        st.text('Anomalies by city: ' + ', '.join(f'{city} ({count})' for city, count in city_counts))
+    if len(anomaly_readings) < anomaly_counts['total']:
+        st.text(f'Showing the latest {len(anomaly_readings)} of {anomaly_counts["total"]} anomalies.')
+
     # Check for humidity anomalies
     warning_count: int = 0
     minimum_metric: Union[int, float] = st.session_state[f'min_{metric_name}']
     maximum_metric: Union[int, float] = st.session_state[f'max_{metric_name}']
 
-    for document in historical_data[metric_name]:
+    for document in anomaly_readings:
         below_min: bool = document['metric'] < minimum_metric
         above_max: bool = document['metric'] > maximum_metric
         if below_min or above_max:
@@ -165,44 +182,102 @@ def check_metric_for_anomalies(historical_data: [dict[str, list]], metric_name:
 
 @st.fragment(run_every=FRAGMENT_RERUN_SPEED)
 def display_any_anomolies() -> None:
-    # Get the historical data
-    historical_data: Union[dict[str, list], None] = st.session_state.get('HISTORICAL_DATA', None)
-    if historical_data is not None:
+    # Get the out-of-range readings found by the proxy
+    anomaly_data: Union[dict[str, dict], None] = st.session_state.get('ANOMALY_DATA', None)
+    if anomaly_data is not None:
         # Check for humidity anomalies
-        check_metric_for_anomalies(historical_data, 'humidity_perc', 'Humidity Percentage')
+        check_metric_for_anomalies(anomaly_data, 'humidity_perc', 'Humidity Percentage')
 
         # Check for precipitation anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             precip_params = ['precip_mm', 'Precipitation (Millimeters)']
         else:
             precip_params = ['precip_in', 'Precipitation (Inches)']
-        check_metric_for_anomalies(historical_data, *precip_params)
+        check_metric_for_anomalies(anomaly_data, *precip_params)
 
         # Check for air pressure anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             pressure_params = ['pressure_mb', 'Air Pressure (Millibars)']
         else:
             pressure_params = ['pressure_in', 'Air Pressure (Inches)']
-        check_metric_for_anomalies(historical_data, *pressure_params)
+        check_metric_for_anomalies(anomaly_data, *pressure_params)
 
         # Check for temperature anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             temp_params = ['temp_c', 'Temperature (Celsius)']
         else:
             temp_params = ['temp_f', 'Temperature (Fahrenheit)']
-        check_metric_for_anomalies(historical_data, *temp_params)
+        check_metric_for_anomalies(anomaly_data, *temp_params)
 
         # Check for UV Index anomalies
-        check_metric_for_anomalies(historical_data, 'uv_index_score', 'UV Index Score')
+        check_metric_for_anomalies(anomaly_data, 'uv_index_score', 'UV Index Score')
 
         # Check for wind speed anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             wind_params = ['wind_kph', 'Wind Speed (KPH)']
         else:
             wind_params = ['wind_mph', 'Wind Speed (MPH)']
-        check_metric_for_anomalies(historical_data, *wind_params)
+        check_metric_for_anomalies(anomaly_data, *wind_params)
     else:
-        st.info('Historical Data is still loading.', icon="⏳")
+        st.info('Anomaly Data is still loading.', icon="⏳")
+
+
+@st.fragment(run_every=FRAGMENT_RERUN_SPEED)
+def display_alerts() -> None:
+    st.subheader('Live Alerts')
+    st.text('Alerts are raised by the proxy server as readings arrive, using its configured thresholds.')
+
+    # Get the alerts
+    alert_data: Union[dict[str, dict], None] = st.session_state.get('ALERT_DATA', None)
+    if alert_data is None:
+        st.info('Alert Data is still loading.', icon="⏳")
+        return
+
+    # Only show alerts for the sensors being examined
+    alerts: list[dict] = list(alert_data.values())
+    if st.session_state['all_or_selected'] != 'All':
+        alerts = [alert for alert in alerts if alert['sensor_name'] in st.session_state['selected_sensors']]
+
+    if len(alerts) == 0:
+        st.success('No alerts have been raised.', icon='✅')
+        return
+
+    # Show open alerts first, newest first
+    alerts.sort(key=lambda alert: alert['raised_at'], reverse=True)
+    alerts.sort(key=lambda alert: alert['cleared_at'] is not None)
+    alert_df: pd.DataFrame = pd.DataFrame(alerts, columns=[
+        'sensor_name', 'city', 'county', 'measurement', 'rule', 'direction', 'threshold', 'value', 'peak_value',
+        'breach_count', 'raised_at', 'cleared_at'
+    ])
+    st.dataframe(alert_df, hide_index=True)
+
+
+@st.fragment(run_every=FRAGMENT_RERUN_SPEED)
+def display_baselines() -> None:
+    st.subheader('Sensor Baselines')
+    st.text('Each sensor\'s recent average and spread. Readings far from their baseline are raised as ewma alerts.')
+
+    # Get the baselines
+    baseline_data: Union[dict[str, list], None] = st.session_state.get('BASELINE_DATA', None)
+    if baseline_data is None:
+        st.info('Baseline Data is still loading.', icon="⏳")
+        return
+
+    # Flatten the baselines into one table, furthest from baseline first
+    baselines: list[dict] = [
+        {'measurement': measurement, **baseline}
+        for measurement, measurement_baselines in baseline_data.items()
+        for baseline in measurement_baselines
+    ]
+    if len(baselines) == 0:
+        st.info('No baselines have been learned yet.', icon="⏳")
+        return
+
+    baseline_df: pd.DataFrame = pd.DataFrame(baselines, columns=[
+        'sensor_name', 'measurement', 'mean', 'stddev', 'last_z_score', 'count', 'warmed_up'
+    ])
+    baseline_df = baseline_df.sort_values('last_z_score', key=lambda z_scores: z_scores.abs(), ascending=False)
+    st.dataframe(baseline_df, hide_index=True)
 
 
 def create_anomaly_tab() -> None:
@@ -210,6 +285,10 @@ def create_anomaly_tab() -> None:
     st.text('This section scans historical data for anomalies based on settings below.')
     st.text('Ranges you select are inclusive of edge numbers.')
 
+    # Show alerts raised as readings arrived and the baselines behind them
+    display_alerts()
+    display_baselines()
+
     # Create settings to look for anomalies
     create_anomaly_settings()
 
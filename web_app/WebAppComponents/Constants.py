@@ -1,4 +1,5 @@
 from os import getenv
+from datetime import timedelta
 
 # Get core database environmental variables
 DEFAULTS: dict[str, str] = {
@@ -16,3 +17,25 @@ PROXY_PORT: str = getenv('PROXY_PORT', DEFAULTS['PROXY_PORT'])
 # Reload speed
 FRAGMENT_RERUN_SPEED: int = 5
 DATA_UPDATE_SPEED: int = 3
+
+# Sliding window the real-time trend deltas are taken from, out of the proxy's 1m, 5m and 15m windows
+TREND_WINDOW: str = '5m'
+
+# Time ranges longer than these are charted from hourly and daily rollups instead of raw readings
+HOURLY_ROLLUP_SPAN: timedelta = timedelta(days=1)
+DAILY_ROLLUP_SPAN: timedelta = timedelta(days=14)
+
+# Historical charts average each county instead of drawing a line per city once there are more cities than this
+CITY_CHART_LIMIT: int = 25
+
+# Percentiles charted as a band and a middle line for ranges long enough to read from rollups
+PERCENTILE_BANDS: list[int] = [10, 50, 90]
+
+# Sensor map viewport before the map reports its own, as [west, south, east, north]
+DEFAULT_MAP_BOUNDS: list[float] = [-79.5, 37.7, -75.0, 40.1]
+
+# Measurements with anomaly thresholds for each measurement system
+ANOMALY_MEASUREMENTS: dict[str, list[str]] = {
+    'Metric': ['humidity_perc', 'precip_mm', 'pressure_mb', 'temp_c', 'uv_index_score', 'wind_kph'],
+    'Customary': ['humidity_perc', 'precip_in', 'pressure_in', 'temp_f', 'uv_index_score', 'wind_mph']
+}
@@ -3,7 +3,9 @@ from typing import Union
 from datetime import datetime, timedelta
 from requests import get, Response
 from hashlib import sha256
-from .Constants import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD_FILE, PROXY_HOST, PROXY_PORT, DATA_UPDATE_SPEED
+from .Constants import (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD_FILE, PROXY_HOST, PROXY_PORT, DATA_UPDATE_SPEED,
+                        HOURLY_ROLLUP_SPAN, DAILY_ROLLUP_SPAN, ANOMALY_MEASUREMENTS, DEFAULT_MAP_BOUNDS,
+                        CITY_CHART_LIMIT, PERCENTILE_BANDS)
 
 
 def load_data(content: dict[str, str]) -> Union[dict[str, list], list[dict], None]:
@@ -23,16 +25,55 @@ def load_sensor_data() -> Union[list[dict], None]:
     # Create password hash
     hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
 
+    # Get the version of the catalog that is already cached
+    cached_sensor_data: Union[list[dict], None] = st.session_state.get('SENSOR_DATA', None)
+    if cached_sensor_data is not None:
+        catalog_etag: Union[str, None] = st.session_state.get('SENSOR_CATALOG_ETAG', None)
+        catalog_version: int = st.session_state.get('SENSOR_CATALOG_VERSION', 0)
+        catalog_epoch: str = st.session_state.get('SENSOR_CATALOG_EPOCH', '')
+    else:
+        catalog_etag: Union[str, None] = None
+        catalog_version: int = 0
+        catalog_epoch: str = ''
+
     # Create message content
     content: dict = {
         'purpose': 0,
         'username': DB_USER,
         'password': hashed_data_gen_password,
         'host': DB_HOST,
-        'port': DB_PORT
+        'port': DB_PORT,
+        'catalog_version': catalog_version,
+        'catalog_epoch': catalog_epoch
     }
 
-    return load_data(content)
+    # Send a conditional get request to the proxy server
+    headers: dict[str, str] = {'If-None-Match': catalog_etag} if catalog_etag is not None else {}
+    response: Response = get(f'http://{PROXY_HOST}:{PROXY_PORT}/web_app', json=content, headers=headers, timeout=10)
+
+    # Keep the cached catalog if nothing changed
+    if response.status_code == 304:
+        return cached_sensor_data
+
+    # Get json result
+    response_json = response.json()
+    if response_json['status'] != 'Success':
+        st.error(response_json['message'])
+        return None
+
+    # Merge the changes into the cached catalog
+    catalog_result: dict = response_json['result']
+    if catalog_result['full'] or cached_sensor_data is None:
+        sensor_data: list[dict] = catalog_result['sensors']
+    else:
+        sensor_data: list[dict] = cached_sensor_data + catalog_result['sensors']
+
+    # Save the version of the catalog for the next request
+    st.session_state['SENSOR_CATALOG_ETAG'] = response.headers.get('ETag', None)
+    st.session_state['SENSOR_CATALOG_VERSION'] = catalog_result['catalog_version']
+    st.session_state['SENSOR_CATALOG_EPOCH'] = catalog_result['catalog_epoch']
+
+    return sensor_data
 
 
 def load_real_time_data() -> Union[dict[str, list], None]:
@@ -61,6 +102,48 @@ def load_real_time_data() -> Union[dict[str, list], None]:
     return load_data(content)
 
 
+def load_window_data() -> Union[dict[str, dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Obtain filters with default handling
+    all_or_selected_filter: str = st.session_state.get('all_or_selected', 'Empty')
+    selected_sensors_filter: str = st.session_state.get('selected_sensors', ['Empty'])
+    metric_or_customary_filter: str = st.session_state.get('metric_or_customary', 'Empty')
+
+    # Stop asking once the proxy has said it does not keep the windows, which it only does with a single worker
+    if st.session_state.get('WINDOWS_UNSUPPORTED', False):
+        return None
+
+    # Create message content
+    content: dict = {
+        'purpose': 7,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'filters': {
+            'metric_or_customary': metric_or_customary_filter,
+            'all_or_selected': all_or_selected_filter,
+            'selected_sensors': selected_sensors_filter
+        }
+    }
+
+    # Send a get request to the proxy server
+    response: Response = get(f'http://{PROXY_HOST}:{PROXY_PORT}/web_app', json=content, timeout=10)
+
+    # The real-time tab simply shows no trends when the windows are not kept
+    response_json = response.json()
+    if response_json['status'] == 'Unsupported':
+        st.session_state['WINDOWS_UNSUPPORTED'] = True
+        return None
+    if response_json['status'] != 'Success':
+        st.error(response_json['message'])
+        return None
+
+    return response_json['result']
+
+
 def load_historical_data() -> Union[dict[str, list], None]:
     # Create password hash
     hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
@@ -76,6 +159,24 @@ def load_historical_data() -> Union[dict[str, list], None]:
         'start_date_time', end_date_time_filter - timedelta(minutes=5)
     )
 
+    # Ask for rollups when the range is too long to chart every reading
+    time_span: timedelta = end_date_time_filter - start_date_time_filter
+    if time_span > DAILY_ROLLUP_SPAN:
+        resolution: int = 86400
+    elif time_span > HOURLY_ROLLUP_SPAN:
+        resolution: int = 3600
+    else:
+        resolution: int = 0
+
+    # Let the proxy average each county once there are too many cities to chart a line for each
+    sensor_data: list[dict] = st.session_state.get('SENSOR_DATA', None) or []
+    chart_cities: set[str] = {
+        document['city'] for document in sensor_data
+        if all_or_selected_filter in ['All', 'Empty'] or 'Empty' in selected_sensors_filter
+        or document['sensor_name'] in selected_sensors_filter
+    }
+    spatial_level: str = 'county' if len(chart_cities) > CITY_CHART_LIMIT else 'sensor'
+
     end_date_time_filter = end_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
     start_date_time_filter = start_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
 
@@ -91,17 +192,148 @@ def load_historical_data() -> Union[dict[str, list], None]:
             'all_or_selected': all_or_selected_filter,
             'selected_sensors': selected_sensors_filter
         },
+        'time_range': {
+            'start_date_time': start_date_time_filter,
+            'end_date_time': end_date_time_filter,
+            'resolution': resolution,
+            'spatial_level': spatial_level,
+            'percentiles': PERCENTILE_BANDS if resolution > 0 else []
+        }
+    }
+
+    return load_data(content)
+
+
+def load_anomaly_data() -> Union[dict[str, dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Obtain filters with default handling
+    all_or_selected_filter: str = st.session_state.get('all_or_selected', 'Empty')
+    selected_sensors_filter: str = st.session_state.get('selected_sensors', ['Empty'])
+    metric_or_customary_filter: str = st.session_state.get('metric_or_customary', 'Empty')
+
+    # Obtain thresholds from the anomaly settings, waiting until they have been created
+    measurement_system: str = 'Customary' if metric_or_customary_filter == 'Customary' else 'Metric'
+    anomaly_measurements: list[str] = ANOMALY_MEASUREMENTS[measurement_system]
+    thresholds: dict[str, dict] = {
+        measurement: {'min': st.session_state[f'min_{measurement}'], 'max': st.session_state[f'max_{measurement}']}
+        for measurement in anomaly_measurements
+        if f'min_{measurement}' in st.session_state and f'max_{measurement}' in st.session_state
+    }
+    if len(thresholds) == 0:
+        return None
+
+    # Obtain time range with default handling (5 minute default)
+    end_date_time_filter: Union[datetime, str] = st.session_state.get('end_date_time', datetime.now())
+    start_date_time_filter: Union[datetime, str] = st.session_state.get(
+        'start_date_time', end_date_time_filter - timedelta(minutes=5)
+    )
+
+    end_date_time_filter = end_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
+    start_date_time_filter = start_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Create message content
+    content: dict = {
+        'purpose': 3,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'filters': {
+            'metric_or_customary': metric_or_customary_filter,
+            'all_or_selected': all_or_selected_filter,
+            'selected_sensors': selected_sensors_filter
+        },
         'time_range': {
             'start_date_time': start_date_time_filter,
             'end_date_time': end_date_time_filter
+        },
+        'thresholds': thresholds
+    }
+
+    return load_data(content)
+
+
+def load_alert_data() -> Union[dict[str, dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Create message content, only asking for alerts changed since the last request
+    cached_alert_data: Union[dict[str, dict], None] = st.session_state.get('ALERT_DATA', None)
+    content: dict = {
+        'purpose': 4,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'alerts_since': st.session_state.get('ALERTS_SINCE', None) if cached_alert_data is not None else None
+    }
+
+    # Get the changed alerts
+    alert_result: Union[dict, None] = load_data(content)
+    if alert_result is None:
+        return cached_alert_data
+
+    # Merge the changes into the cached alerts, replacing alerts that have since cleared
+    alert_data: dict[str, dict] = dict(cached_alert_data) if cached_alert_data is not None else {}
+    for alert in alert_result['alerts']:
+        alert_data[alert['_id']] = alert
+    st.session_state['ALERTS_SINCE'] = alert_result['latest_update']
+
+    return alert_data
+
+
+def load_baseline_data() -> Union[dict[str, list], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Obtain filters with default handling
+    all_or_selected_filter: str = st.session_state.get('all_or_selected', 'Empty')
+    selected_sensors_filter: str = st.session_state.get('selected_sensors', ['Empty'])
+    metric_or_customary_filter: str = st.session_state.get('metric_or_customary', 'Empty')
+
+    # Create message content
+    content: dict = {
+        'purpose': 5,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'filters': {
+            'metric_or_customary': metric_or_customary_filter,
+            'all_or_selected': all_or_selected_filter,
+            'selected_sensors': selected_sensors_filter
         }
     }
 
     return load_data(content)
 
 
+def load_sensors_in_view() -> Union[list[dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Create message content, only asking for the sensors inside the map's last viewport
+    content: dict = {
+        'purpose': 6,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'area': {'bbox': st.session_state.get('SENSOR_MAP_BOUNDS', DEFAULT_MAP_BOUNDS)}
+    }
+
+    return load_data(content)
+
+
 @st.fragment(run_every=DATA_UPDATE_SPEED)
 def pass_data_updates() -> None:
     st.session_state['SENSOR_DATA'] = load_sensor_data()
+    st.session_state['SENSORS_IN_VIEW'] = load_sensors_in_view()
     st.session_state['REAL_TIME_DATA'] = load_real_time_data()
+    st.session_state['WINDOW_DATA'] = load_window_data()
     st.session_state['HISTORICAL_DATA'] = load_historical_data()
+    st.session_state['ANOMALY_DATA'] = load_anomaly_data()
+    st.session_state['ALERT_DATA'] = load_alert_data()
+    st.session_state['BASELINE_DATA'] = load_baseline_data()
@@ -2,7 +2,27 @@ import streamlit as st
 from typing import Union
 from datetime import datetime, timedelta
 import pandas as pd
-from .Constants import FRAGMENT_RERUN_SPEED
+import altair as alt
+from .Constants import FRAGMENT_RERUN_SPEED, PERCENTILE_BANDS
+
+
+def create_percentile_chart(historical_df: pd.DataFrame, location_field: str, metric_name: str,
+                            metric_modifier: str) -> None:
+    # Spread each bucket's percentiles into columns next to its location and time
+    percentile_df: pd.DataFrame = pd.concat(
+        [historical_df[[location_field, 'time_recorded_est']], pd.json_normalize(historical_df['percentiles'])], axis=1
+    )
+    low_field, middle_field, high_field = [f'p{percentile}' for percentile in PERCENTILE_BANDS]
+
+    # Shade from the lowest to the highest percentile and draw the middle one as a line, one color per location
+    percentile_base: alt.Chart = alt.Chart(percentile_df).encode(
+        x=alt.X('time_recorded_est:T', title='Date & Time'), color=alt.Color(f'{location_field}:N')
+    )
+    percentile_band: alt.Chart = percentile_base.mark_area(opacity=0.2).encode(
+        y=alt.Y(f'{low_field}:Q', title=f'{metric_name} ({metric_modifier})'), y2=f'{high_field}:Q'
+    )
+    percentile_line: alt.Chart = percentile_base.mark_line().encode(y=f'{middle_field}:Q')
+    st.altair_chart(percentile_band + percentile_line, use_container_width=True)
 
 
 def create_time_charts(historical_data: dict[str, list], metric_package: zip) -> None:
@@ -20,7 +40,6 @@ def create_time_charts(historical_data: dict[str, list], metric_package: zip) ->
         historical_df: pd.DataFrame = pd.DataFrame(historical_data[metric_key])
         historical_df['time_recorded'] = pd.to_datetime(historical_df['time_recorded'], utc=True)
         historical_df['time_recorded_est'] = historical_df['time_recorded'].dt.tz_convert('US/Eastern')
-        city_names: list = historical_df['city'].unique().tolist()
 
         if metric_name == 'Wind Direction':
             # Create grouping table
@@ -30,11 +49,15 @@ def create_time_charts(historical_data: dict[str, list], metric_package: zip) ->
             # Create area chart
             st.area_chart(historical_df_size, stack=True, x_label='Date & Time', y_label=f'Wind Direction')
         else:
-            # Create pivot table
-            if len(city_names) > 25:
-                historical_df_grouped = historical_df.groupby(['county', 'time_recorded_est'])
-                historical_df_avg = historical_df_grouped['metric'].mean().reset_index()
-                historical_df_pivot = historical_df_avg.pivot(
+            # Create percentile bands when the proxy sent them, otherwise a line per city or county
+            if 'percentiles' in historical_df.columns:
+                location_field: str = 'city' if 'city' in historical_df.columns else 'county'
+                create_percentile_chart(historical_df, location_field, metric_name, metric_modifier)
+                continue
+
+            # Create pivot table, with a line per county when the proxy averaged the readings of each
+            if 'city' not in historical_df.columns:
+                historical_df_pivot = historical_df.pivot(
                     index='time_recorded_est', columns='county', values='metric'
                 )
             else:
@@ -1,10 +1,29 @@
 import streamlit as st
 from collections import Counter
 from typing import Union
-from .Constants import FRAGMENT_RERUN_SPEED
+from .Constants import FRAGMENT_RERUN_SPEED, TREND_WINDOW
 
 
-def create_real_time_data_container(real_time_data: dict[str, list], metric_package: zip) -> None:
+def get_window_summary(window_data: Union[dict[str, dict], None], metric_key: str,
+                       metric_modifier: str) -> tuple[Union[str, None], Union[str, None]]:
+    # Sliding windows are only kept for numeric measurements on a single proxy worker
+    if window_data is None or metric_key not in window_data:
+        return None, None
+
+    # Take the trend from the chosen window and list every window in the tooltip
+    window_overall: dict[str, dict] = window_data[metric_key]['overall']
+    trend_change: Union[float, None] = window_overall[TREND_WINDOW]['change_per_minute']
+    trend_delta: Union[str, None] = None if trend_change is None else f'{trend_change:+.2f}{metric_modifier}/min'
+    window_lines: list[str] = [
+        f'{window_name}: mean {window["mean"]:.2f}, min {window["min"]:.2f}, max {window["max"]:.2f}'
+        for window_name, window in window_overall.items() if window['count'] > 0
+    ]
+    window_help: Union[str, None] = '  \n'.join(window_lines) if len(window_lines) > 0 else None
+    return trend_delta, window_help
+
+
+def create_real_time_data_container(real_time_data: dict[str, list], window_data: Union[dict[str, dict], None],
+                                    metric_package: zip) -> None:
     # Create container
     with st.container(border=True, key='real_time_data_container'):
         # Create columns to place information in
@@ -37,8 +56,11 @@ def create_real_time_data_container(real_time_data: dict[str, list], metric_pack
                 metric_total: float = sum(document['latest_value'] for document in metric_data)
                 metric_avg: float = round(metric_total / len(metric_data), 2)
 
-                # Create metric
-                columns[column_index].metric(metric_name, f'{metric_avg}{metric_modifier}')
+                # Create metric, with its trend over the last few minutes as the delta
+                trend_delta, window_help = get_window_summary(window_data, metric_key, metric_modifier)
+                columns[column_index].metric(
+                    metric_name, f'{metric_avg}{metric_modifier}', trend_delta, help=window_help
+                )
 
             # Move to next column object
             column_index += 1
@@ -77,6 +99,9 @@ def create_real_time_tab() -> None:
             'Wind Speed'
         ]
         metric_modifiers: list[str] = list(st.session_state['unit_modifiers'])
-        create_real_time_data_container(real_time_data, zip(metric_keys, generic_metric_names, metric_modifiers))
+        create_real_time_data_container(
+            real_time_data, st.session_state.get('WINDOW_DATA', None),
+            zip(metric_keys, generic_metric_names, metric_modifiers)
+        )
     else:
         st.info('Real Time Data is still loading.', icon="⏳")
@@ -15,6 +15,12 @@ def create_sensor_table() -> None:
         st.info('Sensor Data is still loading.', icon="⏳")
         return
 
+    # Reuse the dataframe if the catalog has not changed since it was built
+    catalog_etag: Union[str, None] = st.session_state.get('SENSOR_CATALOG_ETAG', None)
+    if catalog_etag is not None and st.session_state.get('sensor_df_etag', None) == catalog_etag:
+        st.dataframe(st.session_state['sensor_df'])
+        return
+
     # Parse the data into a dataframe-friendly format
     sensor_list: list[list] = [
         [
@@ -28,56 +34,65 @@ def create_sensor_table() -> None:
     st.session_state['sensor_df']: pd.DataFrame = pd.DataFrame(sensor_list, columns=[
         'Mongo ID', 'Sensor Name', 'City', 'County', 'State', 'Latitude', 'Longitude'
     ])
+    st.session_state['sensor_df_etag'] = st.session_state.get('SENSOR_CATALOG_ETAG', None)
     st.dataframe(st.session_state['sensor_df'])
 
 
 @st.fragment(run_every=FRAGMENT_RERUN_SPEED)
 def create_sensor_map() -> None:
-    # Early return if sensor_df doesn't exist
-    if 'sensor_df' not in st.session_state:
+    # Early return if the sensors in view have not loaded yet
+    sensors_in_view: Union[list[dict], None] = st.session_state.get('SENSORS_IN_VIEW', None)
+    if sensors_in_view is None:
         return
 
+    # Drop the markers of sensors that are no longer in view
+    in_view_names: set[str] = {document['sensor_name'] for document in sensors_in_view}
+    for marker_color in ['Red', 'Blue']:
+        for sensor_name in list(st.session_state['sensor_feature_dict'][marker_color].keys()):
+            if sensor_name not in in_view_names:
+                st.session_state['sensor_feature_dict'][marker_color].pop(sensor_name)
+
     # Add new markers to the feature group
-    for index, row in st.session_state['sensor_df'].iterrows():
+    for document in sensors_in_view:
         # Check if it is in the feature dictionary and skip if it is
-        is_red_marker = row['Sensor Name'] in st.session_state['sensor_feature_dict']['Red'].keys()
-        is_blue_marker = row['Sensor Name'] in st.session_state['sensor_feature_dict']['Blue'].keys()
+        is_red_marker = document['sensor_name'] in st.session_state['sensor_feature_dict']['Red'].keys()
+        is_blue_marker = document['sensor_name'] in st.session_state['sensor_feature_dict']['Blue'].keys()
 
         # Differentiate the marker based on what is selected
         selected: bool = (
             st.session_state['all_or_selected'] == 'All' or
-            row['Sensor Name'] in st.session_state['selected_sensors']
+            document['sensor_name'] in st.session_state['selected_sensors']
         )
 
         # Marker management + Skipping Logic
         if (is_red_marker and selected) or (is_blue_marker and not selected):
             continue
         elif is_red_marker and not selected:  # Move non-selected markers to blue
-            st.session_state['sensor_feature_dict']['Red'].pop(row['Sensor Name'])
+            st.session_state['sensor_feature_dict']['Red'].pop(document['sensor_name'])
         elif is_blue_marker and selected:  # Move selected markers to red
-            st.session_state['sensor_feature_dict']['Blue'].pop(row['Sensor Name'])
+            st.session_state['sensor_feature_dict']['Blue'].pop(document['sensor_name'])
 
         # Create the popup information
-        popup_text: str = f'Sensor Name: {row["Sensor Name"]}'
+        popup_text: str = f'Sensor Name: {document["sensor_name"]}'
 
         # Create a new marker and add it to the feature dictionary
         if selected:
             new_marker: Union[FoliumMarker, FoliumCircleMarker] = FoliumMarker(
-                [row['Latitude'], row['Longitude']],
+                [document['latitude'], document['longitude']],
                 popup=popup_text,
                 icon=FoliumIcon(color='red'),
             )
-            st.session_state['sensor_feature_dict']['Red'][row['Sensor Name']] = new_marker
+            st.session_state['sensor_feature_dict']['Red'][document['sensor_name']] = new_marker
         else:
             new_marker: Union[FoliumMarker, FoliumCircleMarker] = FoliumCircleMarker(
-                [row['Latitude'], row['Longitude']],
+                [document['latitude'], document['longitude']],
                 popup=popup_text,
                 color='blue',
                 opacity=0.1,
                 fill_color='blue',
                 fill_opacity=0.1,
             )
-            st.session_state['sensor_feature_dict']['Blue'][row['Sensor Name']] = new_marker
+            st.session_state['sensor_feature_dict']['Blue'][document['sensor_name']] = new_marker
 
     # Establish a new map
     vienna_coordinates: list[float] = [38.900692, -77.270946]  # Create the map around the DMV
@@ -96,9 +111,18 @@ def create_sensor_map() -> None:
         sensor_map,
         feature_group_to_add=sensor_feature_group,
         use_container_width=True,
+        returned_objects=['bounds'],
         key='sensor_map'
     )
 
+    # Remember the viewport so the next data update only loads the sensors in it
+    map_bounds: Union[dict, None] = sensor_map_st.get('bounds', None) if sensor_map_st is not None else None
+    if map_bounds is not None and map_bounds['_southWest']['lng'] is not None:
+        st.session_state['SENSOR_MAP_BOUNDS'] = [
+            map_bounds['_southWest']['lng'], map_bounds['_southWest']['lat'],
+            map_bounds['_northEast']['lng'], map_bounds['_northEast']['lat']
+        ]
+
 
 def create_sensor_tab() -> None:
     st.header('Sensor Summary')
@@ -113,6 +137,7 @@ def create_sensor_tab() -> None:
     st.subheader('Sensor Map')
     st.text('This map provides a summary of the sensors in the database, along with their locations in Maryland.')
     st.text('Red markers represent sensors that are selected, while faint blue markers represent sensors that are not.')
+    st.text('Only the sensors inside the current view are loaded, so pan or zoom the map to see others.')
 
     # Create a persistent feature group dictionary
     if 'sensor_feature_dict' not in st.session_state:
@@ -1,4 +1,5 @@
 import pandas as pd
+import altair as alt
 import streamlit as st
 from streamlit_folium import st_folium
 from os import getenv
@@ -27,6 +28,28 @@ PROXY_PORT: str = getenv('PROXY_PORT', defaults['PROXY_PORT'])
 FRAGMENT_RERUN_SPEED: int = 5
 DATA_UPDATE_SPEED: int = 3
 
+# Sliding window the real-time trend deltas are taken from, out of the proxy's 1m, 5m and 15m windows
+TREND_WINDOW: str = '5m'
+
+# Time ranges longer than these are charted from hourly and daily rollups instead of raw readings
+HOURLY_ROLLUP_SPAN: timedelta = timedelta(days=1)
+DAILY_ROLLUP_SPAN: timedelta = timedelta(days=14)
+
+# Historical charts average each county instead of drawing a line per city once there are more cities than this
+CITY_CHART_LIMIT: int = 25
+
+# Percentiles charted as a band and a middle line for ranges long enough to read from rollups
+PERCENTILE_BANDS: list[int] = [10, 50, 90]
+
+# Sensor map viewport before the map reports its own, as [west, south, east, north]
+DEFAULT_MAP_BOUNDS: list[float] = [-79.5, 37.7, -75.0, 40.1]
+
+# Measurements with anomaly thresholds for each measurement system
+ANOMALY_MEASUREMENTS: dict[str, list[str]] = {
+    'Metric': ['humidity_perc', 'precip_mm', 'pressure_mb', 'temp_c', 'uv_index_score', 'wind_kph'],
+    'Customary': ['humidity_perc', 'precip_in', 'pressure_in', 'temp_f', 'uv_index_score', 'wind_mph']
+}
+
 
 def load_data(content: dict[str, str]) -> Union[dict[str, list], list[dict], None]:
     # Send a get request to the proxy server
@@ -45,16 +68,55 @@ def load_sensor_data() -> Union[list[dict], None]:
     # Create password hash
     hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
 
+    # Get the version of the catalog that is already cached
+    cached_sensor_data: Union[list[dict], None] = st.session_state.get('SENSOR_DATA', None)
+    if cached_sensor_data is not None:
+        catalog_etag: Union[str, None] = st.session_state.get('SENSOR_CATALOG_ETAG', None)
+        catalog_version: int = st.session_state.get('SENSOR_CATALOG_VERSION', 0)
+        catalog_epoch: str = st.session_state.get('SENSOR_CATALOG_EPOCH', '')
+    else:
+        catalog_etag: Union[str, None] = None
+        catalog_version: int = 0
+        catalog_epoch: str = ''
+
     # Create message content
     content: dict = {
         'purpose': 0,
         'username': DB_USER,
         'password': hashed_data_gen_password,
         'host': DB_HOST,
-        'port': DB_PORT
+        'port': DB_PORT,
+        'catalog_version': catalog_version,
+        'catalog_epoch': catalog_epoch
     }
 
-    return load_data(content)
+    # Send a conditional get request to the proxy server
+    headers: dict[str, str] = {'If-None-Match': catalog_etag} if catalog_etag is not None else {}
+    response: Response = get(f'http://{PROXY_HOST}:{PROXY_PORT}/web_app', json=content, headers=headers, timeout=10)
+
+    # Keep the cached catalog if nothing changed
+    if response.status_code == 304:
+        return cached_sensor_data
+
+    # Get json result
+    response_json = response.json()
+    if response_json['status'] != 'Success':
+        st.error(response_json['message'])
+        return None
+
+    # Merge the changes into the cached catalog
+    catalog_result: dict = response_json['result']
+    if catalog_result['full'] or cached_sensor_data is None:
+        sensor_data: list[dict] = catalog_result['sensors']
+    else:
+        sensor_data: list[dict] = cached_sensor_data + catalog_result['sensors']
+
+    # Save the version of the catalog for the next request
+    st.session_state['SENSOR_CATALOG_ETAG'] = response.headers.get('ETag', None)
+    st.session_state['SENSOR_CATALOG_VERSION'] = catalog_result['catalog_version']
+    st.session_state['SENSOR_CATALOG_EPOCH'] = catalog_result['catalog_epoch']
+
+    return sensor_data
 
 
 def load_real_time_data() -> Union[dict[str, list], None]:
@@ -83,6 +145,48 @@ def load_real_time_data() -> Union[dict[str, list], None]:
     return load_data(content)
 
 
+def load_window_data() -> Union[dict[str, dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Obtain filters with default handling
+    all_or_selected_filter: str = st.session_state.get('all_or_selected', 'Empty')
+    selected_sensors_filter: str = st.session_state.get('selected_sensors', ['Empty'])
+    metric_or_customary_filter: str = st.session_state.get('metric_or_customary', 'Empty')
+
+    # Stop asking once the proxy has said it does not keep the windows, which it only does with a single worker
+    if st.session_state.get('WINDOWS_UNSUPPORTED', False):
+        return None
+
+    # Create message content
+    content: dict = {
+        'purpose': 7,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'filters': {
+            'metric_or_customary': metric_or_customary_filter,
+            'all_or_selected': all_or_selected_filter,
+            'selected_sensors': selected_sensors_filter
+        }
+    }
+
+    # Send a get request to the proxy server
+    response: Response = get(f'http://{PROXY_HOST}:{PROXY_PORT}/web_app', json=content, timeout=10)
+
+    # The real-time tab simply shows no trends when the windows are not kept
+    response_json = response.json()
+    if response_json['status'] == 'Unsupported':
+        st.session_state['WINDOWS_UNSUPPORTED'] = True
+        return None
+    if response_json['status'] != 'Success':
+        st.error(response_json['message'])
+        return None
+
+    return response_json['result']
+
+
 def load_historical_data() -> Union[dict[str, list], None]:
     # Create password hash
     hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
@@ -98,6 +202,24 @@ def load_historical_data() -> Union[dict[str, list], None]:
         'start_date_time', end_date_time_filter - timedelta(minutes=5)
     )
 
+    # Ask for rollups when the range is too long to chart every reading
+    time_span: timedelta = end_date_time_filter - start_date_time_filter
+    if time_span > DAILY_ROLLUP_SPAN:
+        resolution: int = 86400
+    elif time_span > HOURLY_ROLLUP_SPAN:
+        resolution: int = 3600
+    else:
+        resolution: int = 0
+
+    # Let the proxy average each county once there are too many cities to chart a line for each
+    sensor_data: list[dict] = st.session_state.get('SENSOR_DATA', None) or []
+    chart_cities: set[str] = {
+        document['city'] for document in sensor_data
+        if all_or_selected_filter in ['All', 'Empty'] or 'Empty' in selected_sensors_filter
+        or document['sensor_name'] in selected_sensors_filter
+    }
+    spatial_level: str = 'county' if len(chart_cities) > CITY_CHART_LIMIT else 'sensor'
+
     end_date_time_filter = end_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
     start_date_time_filter = start_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
 
@@ -113,20 +235,151 @@ def load_historical_data() -> Union[dict[str, list], None]:
             'all_or_selected': all_or_selected_filter,
             'selected_sensors': selected_sensors_filter
         },
+        'time_range': {
+            'start_date_time': start_date_time_filter,
+            'end_date_time': end_date_time_filter,
+            'resolution': resolution,
+            'spatial_level': spatial_level,
+            'percentiles': PERCENTILE_BANDS if resolution > 0 else []
+        }
+    }
+
+    return load_data(content)
+
+
+def load_anomaly_data() -> Union[dict[str, dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Obtain filters with default handling
+    all_or_selected_filter: str = st.session_state.get('all_or_selected', 'Empty')
+    selected_sensors_filter: str = st.session_state.get('selected_sensors', ['Empty'])
+    metric_or_customary_filter: str = st.session_state.get('metric_or_customary', 'Empty')
+
+    # Obtain thresholds from the anomaly settings, waiting until they have been created
+    measurement_system: str = 'Customary' if metric_or_customary_filter == 'Customary' else 'Metric'
+    anomaly_measurements: list[str] = ANOMALY_MEASUREMENTS[measurement_system]
+    thresholds: dict[str, dict] = {
+        measurement: {'min': st.session_state[f'min_{measurement}'], 'max': st.session_state[f'max_{measurement}']}
+        for measurement in anomaly_measurements
+        if f'min_{measurement}' in st.session_state and f'max_{measurement}' in st.session_state
+    }
+    if len(thresholds) == 0:
+        return None
+
+    # Obtain time range with default handling (5 minute default)
+    end_date_time_filter: Union[datetime, str] = st.session_state.get('end_date_time', datetime.now())
+    start_date_time_filter: Union[datetime, str] = st.session_state.get(
+        'start_date_time', end_date_time_filter - timedelta(minutes=5)
+    )
+
+    end_date_time_filter = end_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
+    start_date_time_filter = start_date_time_filter.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Create message content
+    content: dict = {
+        'purpose': 3,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'filters': {
+            'metric_or_customary': metric_or_customary_filter,
+            'all_or_selected': all_or_selected_filter,
+            'selected_sensors': selected_sensors_filter
+        },
         'time_range': {
             'start_date_time': start_date_time_filter,
             'end_date_time': end_date_time_filter
+        },
+        'thresholds': thresholds
+    }
+
+    return load_data(content)
+
+
+def load_alert_data() -> Union[dict[str, dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Create message content, only asking for alerts changed since the last request
+    cached_alert_data: Union[dict[str, dict], None] = st.session_state.get('ALERT_DATA', None)
+    content: dict = {
+        'purpose': 4,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'alerts_since': st.session_state.get('ALERTS_SINCE', None) if cached_alert_data is not None else None
+    }
+
+    # Get the changed alerts
+    alert_result: Union[dict, None] = load_data(content)
+    if alert_result is None:
+        return cached_alert_data
+
+    # Merge the changes into the cached alerts, replacing alerts that have since cleared
+    alert_data: dict[str, dict] = dict(cached_alert_data) if cached_alert_data is not None else {}
+    for alert in alert_result['alerts']:
+        alert_data[alert['_id']] = alert
+    st.session_state['ALERTS_SINCE'] = alert_result['latest_update']
+
+    return alert_data
+
+
+def load_baseline_data() -> Union[dict[str, list], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Obtain filters with default handling
+    all_or_selected_filter: str = st.session_state.get('all_or_selected', 'Empty')
+    selected_sensors_filter: str = st.session_state.get('selected_sensors', ['Empty'])
+    metric_or_customary_filter: str = st.session_state.get('metric_or_customary', 'Empty')
+
+    # Create message content
+    content: dict = {
+        'purpose': 5,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'filters': {
+            'metric_or_customary': metric_or_customary_filter,
+            'all_or_selected': all_or_selected_filter,
+            'selected_sensors': selected_sensors_filter
         }
     }
 
     return load_data(content)
 
 
+def load_sensors_in_view() -> Union[list[dict], None]:
+    # Create password hash
+    hashed_data_gen_password: str = sha256(open(DB_PASSWORD_FILE).read().encode()).hexdigest()
+
+    # Create message content, only asking for the sensors inside the map's last viewport
+    content: dict = {
+        'purpose': 6,
+        'username': DB_USER,
+        'password': hashed_data_gen_password,
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'area': {'bbox': st.session_state.get('SENSOR_MAP_BOUNDS', DEFAULT_MAP_BOUNDS)}
+    }
+
+    return load_data(content)
+
+
 @st.fragment(run_every=DATA_UPDATE_SPEED)
 def pass_data_updates() -> None:
     st.session_state['SENSOR_DATA'] = load_sensor_data()
+    st.session_state['SENSORS_IN_VIEW'] = load_sensors_in_view()
     st.session_state['REAL_TIME_DATA'] = load_real_time_data()
+    st.session_state['WINDOW_DATA'] = load_window_data()
     st.session_state['HISTORICAL_DATA'] = load_historical_data()
+    st.session_state['ANOMALY_DATA'] = load_anomaly_data()
+    st.session_state['ALERT_DATA'] = load_alert_data()
+    st.session_state['BASELINE_DATA'] = load_baseline_data()
 
 
 def create_time_filter_settings() -> None:
@@ -238,6 +491,12 @@ def create_sensor_table() -> None:
         st.info('Sensor Data is still loading.', icon="⏳")
         return
 
+    # Reuse the dataframe if the catalog has not changed since it was built
+    catalog_etag: Union[str, None] = st.session_state.get('SENSOR_CATALOG_ETAG', None)
+    if catalog_etag is not None and st.session_state.get('sensor_df_etag', None) == catalog_etag:
+        st.dataframe(st.session_state['sensor_df'])
+        return
+
     # Parse the data into a dataframe-friendly format
     sensor_list: list[list] = [
         [
@@ -251,56 +510,65 @@ def create_sensor_table() -> None:
     st.session_state['sensor_df']: pd.DataFrame = pd.DataFrame(sensor_list, columns=[
         'Mongo ID', 'Sensor Name', 'City', 'County', 'State', 'Latitude', 'Longitude'
     ])
+    st.session_state['sensor_df_etag'] = st.session_state.get('SENSOR_CATALOG_ETAG', None)
     st.dataframe(st.session_state['sensor_df'])
 
 
 @st.fragment(run_every=FRAGMENT_RERUN_SPEED)
 def create_sensor_map() -> None:
-    # Early return if sensor_df doesn't exist
-    if 'sensor_df' not in st.session_state:
+    # Early return if the sensors in view have not loaded yet
+    sensors_in_view: Union[list[dict], None] = st.session_state.get('SENSORS_IN_VIEW', None)
+    if sensors_in_view is None:
         return
 
+    # Drop the markers of sensors that are no longer in view
+    in_view_names: set[str] = {document['sensor_name'] for document in sensors_in_view}
+    for marker_color in ['Red', 'Blue']:
+        for sensor_name in list(st.session_state['sensor_feature_dict'][marker_color].keys()):
+            if sensor_name not in in_view_names:
+                st.session_state['sensor_feature_dict'][marker_color].pop(sensor_name)
+
     # Add new markers to the feature group
-    for index, row in st.session_state['sensor_df'].iterrows():
+    for document in sensors_in_view:
         # Check if it is in the feature dictionary and skip if it is
-        is_red_marker = row['Sensor Name'] in st.session_state['sensor_feature_dict']['Red'].keys()
-        is_blue_marker = row['Sensor Name'] in st.session_state['sensor_feature_dict']['Blue'].keys()
+        is_red_marker = document['sensor_name'] in st.session_state['sensor_feature_dict']['Red'].keys()
+        is_blue_marker = document['sensor_name'] in st.session_state['sensor_feature_dict']['Blue'].keys()
 
         # Differentiate the marker based on what is selected
         selected: bool = (
             st.session_state['all_or_selected'] == 'All' or
-            row['Sensor Name'] in st.session_state['selected_sensors']
+            document['sensor_name'] in st.session_state['selected_sensors']
         )
 
         # Marker management + Skipping Logic
         if (is_red_marker and selected) or (is_blue_marker and not selected):
             continue
         elif is_red_marker and not selected:  # Move non-selected markers to blue
-            st.session_state['sensor_feature_dict']['Red'].pop(row['Sensor Name'])
+            st.session_state['sensor_feature_dict']['Red'].pop(document['sensor_name'])
         elif is_blue_marker and selected:  # Move selected markers to red
-            st.session_state['sensor_feature_dict']['Blue'].pop(row['Sensor Name'])
+            st.session_state['sensor_feature_dict']['Blue'].pop(document['sensor_name'])
 
         # Create the popup information
-        popup_text: str = f'Sensor Name: {row["Sensor Name"]}'
+        popup_text: str = f'Sensor Name: {document["sensor_name"]}'
 
         # Create a new marker and add it to the feature dictionary
         if selected:
             new_marker: Union[FoliumMarker, FoliumCircleMarker] = FoliumMarker(
-                [row['Latitude'], row['Longitude']],
+                [document['latitude'], document['longitude']],
                 popup=popup_text,
                 icon=FoliumIcon(color='red'),
             )
-            st.session_state['sensor_feature_dict']['Red'][row['Sensor Name']] = new_marker
+            st.session_state['sensor_feature_dict']['Red'][document['sensor_name']] = new_marker
         else:
             new_marker: Union[FoliumMarker, FoliumCircleMarker] = FoliumCircleMarker(
-                [row['Latitude'], row['Longitude']],
+                [document['latitude'], document['longitude']],
                 popup=popup_text,
                 color='blue',
                 opacity=0.1,
                 fill_color='blue',
                 fill_opacity=0.1,
             )
-            st.session_state['sensor_feature_dict']['Blue'][row['Sensor Name']] = new_marker
+            st.session_state['sensor_feature_dict']['Blue'][document['sensor_name']] = new_marker
 
     # Establish a new map
     vienna_coordinates: list[float] = [38.900692, -77.270946]  # Create the map around the DMV
@@ -319,9 +587,18 @@ def create_sensor_map() -> None:
         sensor_map,
         feature_group_to_add=sensor_feature_group,
         use_container_width=True,
+        returned_objects=['bounds'],
         key='sensor_map'
     )
 
+    # Remember the viewport so the next data update only loads the sensors in it
+    map_bounds: Union[dict, None] = sensor_map_st.get('bounds', None) if sensor_map_st is not None else None
+    if map_bounds is not None and map_bounds['_southWest']['lng'] is not None:
+        st.session_state['SENSOR_MAP_BOUNDS'] = [
+            map_bounds['_southWest']['lng'], map_bounds['_southWest']['lat'],
+            map_bounds['_northEast']['lng'], map_bounds['_northEast']['lat']
+        ]
+
 
 def create_sensor_tab() -> None:
     st.header('Sensor Summary')
@@ -336,6 +613,7 @@ def create_sensor_tab() -> None:
     st.subheader('Sensor Map')
     st.text('This map provides a summary of the sensors in the database, along with their locations in Maryland.')
     st.text('Red markers represent sensors that are selected, while faint blue markers represent sensors that are not.')
+    st.text('Only the sensors inside the current view are loaded, so pan or zoom the map to see others.')
 
     # Create a persistent feature group dictionary
     if 'sensor_feature_dict' not in st.session_state:
@@ -347,7 +625,26 @@ def create_sensor_tab() -> None:
     create_sensor_map()
 
 
-def create_real_time_data_container(real_time_data: dict[str, list], metric_package: zip) -> None:
+def get_window_summary(window_data: Union[dict[str, dict], None], metric_key: str,
+                       metric_modifier: str) -> tuple[Union[str, None], Union[str, None]]:
+    # Sliding windows are only kept for numeric measurements on a single proxy worker
+    if window_data is None or metric_key not in window_data:
+        return None, None
+
+    # Take the trend from the chosen window and list every window in the tooltip
+    window_overall: dict[str, dict] = window_data[metric_key]['overall']
+    trend_change: Union[float, None] = window_overall[TREND_WINDOW]['change_per_minute']
+    trend_delta: Union[str, None] = None if trend_change is None else f'{trend_change:+.2f}{metric_modifier}/min'
+    window_lines: list[str] = [
+        f'{window_name}: mean {window["mean"]:.2f}, min {window["min"]:.2f}, max {window["max"]:.2f}'
+        for window_name, window in window_overall.items() if window['count'] > 0
+    ]
+    window_help: Union[str, None] = '  \n'.join(window_lines) if len(window_lines) > 0 else None
+    return trend_delta, window_help
+
+
+def create_real_time_data_container(real_time_data: dict[str, list], window_data: Union[dict[str, dict], None],
+                                    metric_package: zip) -> None:
     # Create container
     with st.container(border=True, key='real_time_data_container'):
         # Create columns to place information in
@@ -380,8 +677,11 @@ def create_real_time_data_container(real_time_data: dict[str, list], metric_pack
                 metric_total: float = sum(document['latest_value'] for document in metric_data)
                 metric_avg: float = round(metric_total / len(metric_data), 2)
 
-                # Create metric
-                columns[column_index].metric(metric_name, f'{metric_avg}{metric_modifier}')
+                # Create metric, with its trend over the last few minutes as the delta
+                trend_delta, window_help = get_window_summary(window_data, metric_key, metric_modifier)
+                columns[column_index].metric(
+                    metric_name, f'{metric_avg}{metric_modifier}', trend_delta, help=window_help
+                )
 
             # Move to next column object
             column_index += 1
@@ -420,11 +720,33 @@ def create_real_time_tab() -> None:
             'Wind Speed'
         ]
         metric_modifiers: list[str] = list(st.session_state['unit_modifiers'])
-        create_real_time_data_container(real_time_data, zip(metric_keys, generic_metric_names, metric_modifiers))
+        create_real_time_data_container(
+            real_time_data, st.session_state.get('WINDOW_DATA', None),
+            zip(metric_keys, generic_metric_names, metric_modifiers)
+        )
     else:
         st.info('Real Time Data is still loading.', icon="⏳")
 
 
+def create_percentile_chart(historical_df: pd.DataFrame, location_field: str, metric_name: str,
+                            metric_modifier: str) -> None:
+    # Spread each bucket's percentiles into columns next to its location and time
+    percentile_df: pd.DataFrame = pd.concat(
+        [historical_df[[location_field, 'time_recorded_est']], pd.json_normalize(historical_df['percentiles'])], axis=1
+    )
+    low_field, middle_field, high_field = [f'p{percentile}' for percentile in PERCENTILE_BANDS]
+
+    # Shade from the lowest to the highest percentile and draw the middle one as a line, one color per location
+    percentile_base: alt.Chart = alt.Chart(percentile_df).encode(
+        x=alt.X('time_recorded_est:T', title='Date & Time'), color=alt.Color(f'{location_field}:N')
+    )
+    percentile_band: alt.Chart = percentile_base.mark_area(opacity=0.2).encode(
+        y=alt.Y(f'{low_field}:Q', title=f'{metric_name} ({metric_modifier})'), y2=f'{high_field}:Q'
+    )
+    percentile_line: alt.Chart = percentile_base.mark_line().encode(y=f'{middle_field}:Q')
+    st.altair_chart(percentile_band + percentile_line, use_container_width=True)
+
+
 def create_time_charts(historical_data: dict[str, list], metric_package: zip) -> None:
     for metric_key, metric_name, metric_modifier in metric_package:
         # Create time-zone aware dates
@@ -440,7 +762,6 @@ def create_time_charts(historical_data: dict[str, list], metric_package: zip) ->
         historical_df: pd.DataFrame = pd.DataFrame(historical_data[metric_key])
         historical_df['time_recorded'] = pd.to_datetime(historical_df['time_recorded'], utc=True)
         historical_df['time_recorded_est'] = historical_df['time_recorded'].dt.tz_convert('US/Eastern')
-        city_names: list = historical_df['city'].unique().tolist()
 
         if metric_name == 'Wind Direction':
             # Create grouping table
@@ -450,11 +771,15 @@ def create_time_charts(historical_data: dict[str, list], metric_package: zip) ->
             # Create area chart
             st.area_chart(historical_df_size, stack=True, x_label='Date & Time', y_label=f'Wind Direction')
         else:
-            # Create pivot table
-            if len(city_names) > 25:
-                historical_df_grouped = historical_df.groupby(['county', 'time_recorded_est'])
-                historical_df_avg = historical_df_grouped['metric'].mean().reset_index()
-                historical_df_pivot = historical_df_avg.pivot(
+            # Create percentile bands when the proxy sent them, otherwise a line per city or county
+            if 'percentiles' in historical_df.columns:
+                location_field: str = 'city' if 'city' in historical_df.columns else 'county'
+                create_percentile_chart(historical_df, location_field, metric_name, metric_modifier)
+                continue
+
+            # Create pivot table, with a line per county when the proxy averaged the readings of each
+            if 'city' not in historical_df.columns:
+                historical_df_pivot = historical_df.pivot(
                     index='time_recorded_est', columns='county', values='metric'
                 )
             else:
@@ -622,16 +947,32 @@ def create_anomaly_settings() -> None:
         )
 
 
-def check_metric_for_anomalies(historical_data: [dict[str, list]], metric_name: str, metric_title: str) -> None:
+def check_metric_for_anomalies(anomaly_data: dict[str, dict], metric_name: str, metric_title: str) -> None:
     # Print a title
     st.subheader(f'{metric_title.title()} Anomalies')
 
+    # Wait for the proxy to check this measurement
+    if metric_name not in anomaly_data['readings']:
+        st.info(f'{metric_title.title()} anomalies are still loading.', icon="⏳")
+        return
+
+    # Summarize where the anomalies happened
+    anomaly_readings: list[dict] = anomaly_data['readings'][metric_name]
+    anomaly_counts: dict = anomaly_data['counts'][metric_name]
+    if anomaly_counts['total'] > 0:
+        city_counts: list[tuple[str, int]] = sorted(
+            anomaly_counts['by_city'].items(), key=lambda city_count: city_count[1], reverse=True
+        )
+        st.text('Anomalies by city: ' + ', '.join(f'{city} ({count})' for city, count in city_counts))
+    if len(anomaly_readings) < anomaly_counts['total']:
+        st.text(f'Showing the latest {len(anomaly_readings)} of {anomaly_counts["total"]} anomalies.')
+
     # Check for humidity anomalies
     warning_count: int = 0
     minimum_metric: Union[int, float] = st.session_state[f'min_{metric_name}']
     maximum_metric: Union[int, float] = st.session_state[f'max_{metric_name}']
 
-    for document in historical_data[metric_name]:
+    for document in anomaly_readings:
         below_min: bool = document['metric'] < minimum_metric
         above_max: bool = document['metric'] > maximum_metric
         if below_min or above_max:
@@ -664,44 +1005,102 @@ def check_metric_for_anomalies(historical_data: [dict[str, list]], metric_name:
 
 @st.fragment(run_every=FRAGMENT_RERUN_SPEED)
 def display_any_anomolies() -> None:
-    # Get the historical data
-    historical_data: Union[dict[str, list], None] = st.session_state.get('HISTORICAL_DATA', None)
-    if historical_data is not None:
+    # Get the out-of-range readings found by the proxy
+    anomaly_data: Union[dict[str, dict], None] = st.session_state.get('ANOMALY_DATA', None)
+    if anomaly_data is not None:
         # Check for humidity anomalies
-        check_metric_for_anomalies(historical_data, 'humidity_perc', 'Humidity Percentage')
+        check_metric_for_anomalies(anomaly_data, 'humidity_perc', 'Humidity Percentage')
 
         # Check for precipitation anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             precip_params = ['precip_mm', 'Precipitation (Millimeters)']
         else:
             precip_params = ['precip_in', 'Precipitation (Inches)']
-        check_metric_for_anomalies(historical_data, *precip_params)
+        check_metric_for_anomalies(anomaly_data, *precip_params)
 
         # Check for air pressure anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             pressure_params = ['pressure_mb', 'Air Pressure (Millibars)']
         else:
             pressure_params = ['pressure_in', 'Air Pressure (Inches)']
-        check_metric_for_anomalies(historical_data, *pressure_params)
+        check_metric_for_anomalies(anomaly_data, *pressure_params)
 
         # Check for temperature anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             temp_params = ['temp_c', 'Temperature (Celsius)']
         else:
             temp_params = ['temp_f', 'Temperature (Fahrenheit)']
-        check_metric_for_anomalies(historical_data, *temp_params)
+        check_metric_for_anomalies(anomaly_data, *temp_params)
 
         # Check for UV Index anomalies
-        check_metric_for_anomalies(historical_data, 'uv_index_score', 'UV Index Score')
+        check_metric_for_anomalies(anomaly_data, 'uv_index_score', 'UV Index Score')
 
         # Check for wind speed anomalies
         if st.session_state['metric_or_customary'] == 'Metric':
             wind_params = ['wind_kph', 'Wind Speed (KPH)']
         else:
             wind_params = ['wind_mph', 'Wind Speed (MPH)']
-        check_metric_for_anomalies(historical_data, *wind_params)
+        check_metric_for_anomalies(anomaly_data, *wind_params)
     else:
-        st.info('Historical Data is still loading.', icon="⏳")
+        st.info('Anomaly Data is still loading.', icon="⏳")
+
+
+@st.fragment(run_every=FRAGMENT_RERUN_SPEED)
+def display_alerts() -> None:
+    st.subheader('Live Alerts')
+    st.text('Alerts are raised by the proxy server as readings arrive, using its configured thresholds.')
+
+    # Get the alerts
+    alert_data: Union[dict[str, dict], None] = st.session_state.get('ALERT_DATA', None)
+    if alert_data is None:
+        st.info('Alert Data is still loading.', icon="⏳")
+        return
+
+    # Only show alerts for the sensors being examined
+    alerts: list[dict] = list(alert_data.values())
+    if st.session_state['all_or_selected'] != 'All':
+        alerts = [alert for alert in alerts if alert['sensor_name'] in st.session_state['selected_sensors']]
+
+    if len(alerts) == 0:
+        st.success('No alerts have been raised.', icon='✅')
+        return
+
+    # Show open alerts first, newest first
+    alerts.sort(key=lambda alert: alert['raised_at'], reverse=True)
+    alerts.sort(key=lambda alert: alert['cleared_at'] is not None)
+    alert_df: pd.DataFrame = pd.DataFrame(alerts, columns=[
+        'sensor_name', 'city', 'county', 'measurement', 'rule', 'direction', 'threshold', 'value', 'peak_value',
+        'breach_count', 'raised_at', 'cleared_at'
+    ])
+    st.dataframe(alert_df, hide_index=True)
+
+
+@st.fragment(run_every=FRAGMENT_RERUN_SPEED)
+def display_baselines() -> None:
+    st.subheader('Sensor Baselines')
+    st.text('Each sensor\'s recent average and spread. Readings far from their baseline are raised as ewma alerts.')
+
+    # Get the baselines
+    baseline_data: Union[dict[str, list], None] = st.session_state.get('BASELINE_DATA', None)
+    if baseline_data is None:
+        st.info('Baseline Data is still loading.', icon="⏳")
+        return
+
+    # Flatten the baselines into one table, furthest from baseline first
+    baselines: list[dict] = [
+        {'measurement': measurement, **baseline}
+        for measurement, measurement_baselines in baseline_data.items()
+        for baseline in measurement_baselines
+    ]
+    if len(baselines) == 0:
+        st.info('No baselines have been learned yet.', icon="⏳")
+        return
+
+    baseline_df: pd.DataFrame = pd.DataFrame(baselines, columns=[
+        'sensor_name', 'measurement', 'mean', 'stddev', 'last_z_score', 'count', 'warmed_up'
+    ])
+    baseline_df = baseline_df.sort_values('last_z_score', key=lambda z_scores: z_scores.abs(), ascending=False)
+    st.dataframe(baseline_df, hide_index=True)
 
 
 def create_anomaly_tab() -> None:
@@ -709,6 +1108,10 @@ def create_anomaly_tab() -> None:
     st.text('This section scans historical data for anomalies based on settings below.')
     st.text('Ranges you select are inclusive of edge numbers.')
 
+    # Show alerts raised as readings arrived and the baselines behind them
+    display_alerts()
+    display_baselines()
+
     # Create settings to look for anomalies
     create_anomaly_settings()
 